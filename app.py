@@ -8,7 +8,6 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).resolve().parent))
 
 import streamlit as st
-import cv2
 import os
 
 # 导入后端API
@@ -23,9 +22,11 @@ from frontend.components.score_card import render_score_card
 from frontend.components.video_uploader import (
     render_video_uploader,
     render_analysis_mode_selector,
+    render_profile_selector,
     render_visualization_selector
 )
 from frontend.components.welcome_page import render_welcome_page
+from frontend.components.job_status import track_job, poll_job, rerun_while_jobs_running
 from frontend.components.tactics_quiz import render_tactics_quiz
 
 # 导入配置
@@ -66,9 +67,6 @@ def main():
     if 'page' not in st.session_state:
         st.session_state.page = 'welcome'
     
-    if 'api' not in st.session_state:
-        st.session_state.api = VolleyballAPI()
-    
     if 'welcomed' not in st.session_state:
         st.session_state.welcomed = False
     
@@ -94,9 +92,22 @@ def main():
         render_tactics_quiz_page()
 
 
+@st.cache_resource(show_spinner=False)
+def get_api():
+    """
+    获取进程级共享的API实例
+    
+    所有浏览器会话共用同一个实例（检测器、评分器只加载一份），
+    session_state 中只保存各自的结果和任务ID。实例在第一次进入训练页面时创建；
+    欢迎页、战术问答等页面不会加载分析相关的依赖，
+    姿态检测等重量级模块要等到第一次分析时才导入。
+    """
+    return VolleyballAPI()
+
+
 def render_training_page():
     """渲染训练页面（垫球练习）"""
-    api = st.session_state.api
+    api = get_api()
     
     # 返回按钮
     if st.button("← 返回练习选择", key="back_to_practice"):
@@ -114,6 +125,9 @@ def render_training_page():
     
     with tab2:
         render_visualization_tab(api)
+    
+    # 两个标签页都渲染完后再刷新，轮询进度不会挡住另一个标签页
+    rerun_while_jobs_running()
 
 
 def render_analysis_tab(api):
@@ -142,79 +156,117 @@ def render_analysis_tab(api):
             # 选择分析模式
             analysis_mode = render_analysis_mode_selector()
             
+            # 选择检测精度
+            profile = render_profile_selector()
+            
             st.markdown("")
             
             # 分析按钮
             if st.button("🚀 开始AI分析", key="analyze_btn", use_container_width=True, type="primary"):
-                with st.spinner("🔍 AI正在分析中，请稍候..."):
-                    # 调用API分析
-                    result = api.analyze_uploaded_video(
-                        uploaded_file,
-                        analysis_mode=analysis_mode
-                    )
-                    
-                    # 保存结果到session state
-                    st.session_state.analysis_result = result
-                    st.rerun()
+                # 提交后台任务，页面只负责轮询进度
+                job_id = api.submit_analysis(
+                    uploaded_file,
+                    analysis_mode=analysis_mode,
+                    profile=profile
+                )
+                track_job("analysis_job", job_id)
+                st.session_state.pop('analysis_result', None)
+                st.rerun()
         
         st.markdown("---")
+    
+    # 跟踪后台分析任务（刷新页面后凭URL中的任务ID找回）
+    track_analysis_job(api)
+    
+    # 显示分析结果
+    if 'analysis_result' in st.session_state:
+        result = st.session_state.analysis_result
         
-        # 显示分析结果
-        if 'analysis_result' in st.session_state:
-            result = st.session_state.analysis_result
+        if result.get("success"):
+            st.success("✅ 分析完成！")
+            
+            # 显示分析模式
+            mode_name = "单帧快速分析" if result.get("analysis_mode") == "single_frame" else "连续帧深度分析"
+            st.info(f"📊 分析模式: {mode_name}")
             
-            if result.get("success"):
-                st.success("✅ 分析完成！")
+            # 显示推理耗时
+            inference = result.get("inference")
+            if inference:
+                caption = (
+                    f"⏱️ 检测档位 {inference['profile']}（模型复杂度 {inference['model_complexity']}）："
+                    f"总耗时 {inference['elapsed_ms'] / 1000:.1f} 秒，"
+                )
+                if inference.get("cached"):
+                    caption += "命中分析缓存，未重新推理"
+                elif inference.get("inference_count"):
+                    caption += (
+                        f"单帧推理 {inference.get('avg_inference_ms') or 0.0:.1f} ms × "
+                        f"{inference['inference_count']} 帧"
+                    )
+                else:
+                    caption += "复用已检测的关键点，未重新推理"
+                st.caption(caption)
+            
+            # 显示评分结果
+            score_result = result.get("score")
+            if score_result:
+                # 获取评分摘要
+                score_summary = api.get_score_summary(score_result)
                 
-                # 显示分析模式
-                mode_name = "单帧快速分析" if result.get("analysis_mode") == "single_frame" else "连续帧深度分析"
-                st.info(f"📊 分析模式: {mode_name}")
+                # 渲染评分卡片
+                render_score_card(score_summary)
                 
-                # 显示评分结果
-                score_result = result.get("score")
-                if score_result:
-                    # 获取评分摘要
-                    score_summary = api.get_score_summary(score_result)
-                    
-                    # 渲染评分卡片
-                    render_score_card(score_summary)
-                    
-                    col1, col2 = st.columns(2)
+                col1, col2 = st.columns(2)
+                
+                # 显示姿态图像
+                with col1:
+                    if result.get("pose_image") is not None:
+                        st.markdown("### 🎨 姿态检测结果")
+                        st.image(result["pose_image"], channels="BGR",
+                                caption="姿态关键点标注", use_container_width=True)
+                
+                # 如果是序列分析，显示额外信息
+                with col2:
+                    if result.get("analysis_mode") == "sequence":
+                        if result.get("trajectory_plot"):
+                            st.markdown("### 📈 运动轨迹分析")
+                            st.image(result["trajectory_plot"], use_container_width=True)
+                
+                if result.get("sequence_scores"):
+                    st.markdown("### 📊 序列评分详情")
+                    seq_scores = result["sequence_scores"]
                     
-                    # 显示姿态图像
+                    col1, col2, col3 = st.columns(3)
                     with col1:
-                        if result.get("pose_image") is not None:
-                            st.markdown("### 🎨 姿态检测结果")
-                            pose_img_rgb = cv2.cvtColor(result["pose_image"], cv2.COLOR_BGR2RGB)
-                            st.image(pose_img_rgb, caption="姿态关键点标注", use_container_width=True)
-                    
-                    # 如果是序列分析，显示额外信息
+                        st.metric("流畅度", f"{seq_scores.get('smoothness', 0):.1f}/100", 
+                                 help="动作的连贯性和平滑程度")
                     with col2:
-                        if result.get("analysis_mode") == "sequence":
-                            if result.get("trajectory_plot"):
-                                st.markdown("### 📈 运动轨迹分析")
-                                st.image(result["trajectory_plot"], use_container_width=True)
-                    
-                    if result.get("sequence_scores"):
-                        st.markdown("### 📊 序列评分详情")
-                        seq_scores = result["sequence_scores"]
-                        
-                        col1, col2, col3 = st.columns(3)
-                        with col1:
-                            st.metric("流畅度", f"{seq_scores.get('smoothness', 0):.1f}/100", 
-                                     help="动作的连贯性和平滑程度")
-                        with col2:
-                            st.metric("完整性", f"{seq_scores.get('completeness', 0):.1f}/100",
-                                     help="动作的完整程度")
-                        with col3:
-                            st.metric("一致性", f"{seq_scores.get('consistency', 0):.1f}/100",
-                                     help="各帧动作的一致性")
-                
-                else:
-                    st.warning("未能获取评分结果")
+                        st.metric("完整性", f"{seq_scores.get('completeness', 0):.1f}/100",
+                                 help="动作的完整程度")
+                    with col3:
+                        st.metric("一致性", f"{seq_scores.get('consistency', 0):.1f}/100",
+                                 help="各帧动作的一致性")
+            
             else:
-                error_msg = result.get("error", "未知错误")
-                st.error(f"❌ 分析失败: {error_msg}")
+                st.warning("未能获取评分结果")
+        else:
+            error_msg = result.get("error", "未知错误")
+            st.error(f"❌ 分析失败: {error_msg}")
+
+
+def track_analysis_job(api):
+    """跟踪后台分析任务，完成后把分析结果保存到session state"""
+    job_id, status = poll_job(api, "analysis_job")
+    if status is None or st.session_state.get('analysis_result_job') == job_id:
+        return
+    
+    st.session_state.analysis_result_job = job_id
+    if status["status"] == "done":
+        st.session_state.analysis_result = api.get_job_result(job_id) or {
+            "success": False, "error": "任务结果已过期"
+        }
+    else:
+        st.session_state.analysis_result = {"success": False, "error": status.get("error")}
 
 
 def render_visualization_tab(api):
@@ -225,6 +277,9 @@ def render_visualization_tab(api):
     # 上传视频
     uploaded_file = render_video_uploader("vis_uploader")
     
+    # 跟踪后台可视化任务（刷新页面后凭URL中的任务ID找回）
+    track_visualization_job(api)
+    
     if uploaded_file:
         # 验证文件
         is_valid, error_msg = api.validate_video_file(uploaded_file)
@@ -245,36 +300,75 @@ def render_visualization_tab(api):
             
             # 生成按钮
             if st.button("🎬 生成可视化视频", key="generate_btn", use_container_width=True, type="primary"):
-                with st.spinner("🎨 正在生成可视化视频，请稍候..."):
-                    success, output_path, error = api.generate_visualization(
-                        uploaded_file,
-                        vis_type=vis_type
-                    )
-                    
-                    if success:
-                        st.session_state.generated_video = output_path
-                        st.rerun()
-                    else:
-                        st.error(f"❌ 生成失败: {error}")
+                job_id = api.submit_visualization(
+                    uploaded_file,
+                    vis_type=vis_type
+                )
+                track_job("vis_job", job_id)
+                st.session_state.pop('generated_video', None)
+                st.rerun()
         
         with col2:
-            # 显示生成的视频
-            if 'generated_video' in st.session_state:
-                output_path = st.session_state.generated_video
-                
-                st.markdown("#### ✅ 生成结果")
-                if os.path.exists(output_path):
-                    st.video(output_path)
-                    
-                    # 下载按钮
-                    with open(output_path, 'rb') as f:
-                        st.download_button(
-                            label="⬇️ 下载视频",
-                            data=f,
-                            file_name=os.path.basename(output_path),
-                            mime="video/mp4",
-                            use_container_width=True
-                        )
+            render_generated_video()
+    else:
+        # 刷新页面后上传框为空，仍然显示找回的任务结果
+        render_generated_video()
+
+
+def track_visualization_job(api):
+    """跟踪后台可视化任务，完成后把输出视频路径保存到session state"""
+    job_id, status = poll_job(api, "vis_job")
+    if status is None or st.session_state.get('generated_video_job') == job_id:
+        return
+    
+    st.session_state.generated_video_job = job_id
+    output_path = api.get_job_result(job_id) if status["status"] == "done" else None
+    if output_path:
+        st.session_state.generated_video = output_path
+    else:
+        st.session_state.generated_video_error = status.get("error") or "任务结果已过期"
+
+
+def render_generated_video():
+    """显示生成的视频"""
+    if 'generated_video_error' in st.session_state:
+        st.error(f"❌ 生成失败: {st.session_state.pop('generated_video_error')}")
+    
+    if 'generated_video' in st.session_state:
+        generated = st.session_state.generated_video
+        
+        st.markdown("#### ✅ 生成结果")
+        if isinstance(generated, dict):
+            # 一次生成了多种视频
+            vis_names = {
+                "overlay": "🎥 骨架叠加",
+                "skeleton": "🦴 纯骨架",
+                "comparison": "📊 左右对比",
+                "trajectory": "📈 轨迹追踪"
+            }
+            tabs = st.tabs([vis_names.get(vis_type, vis_type) for vis_type in generated])
+            for tab, (vis_type, output_path) in zip(tabs, generated.items()):
+                with tab:
+                    render_video_with_download(output_path, key=f"download_{vis_type}")
+        else:
+            render_video_with_download(generated)
+
+
+def render_video_with_download(output_path, key=None):
+    """显示视频和下载按钮"""
+    if os.path.exists(output_path):
+        st.video(output_path)
+        
+        # 下载按钮
+        with open(output_path, 'rb') as f:
+            st.download_button(
+                label="⬇️ 下载视频",
+                data=f,
+                file_name=os.path.basename(output_path),
+                mime="video/mp4",
+                use_container_width=True,
+                key=key
+            )
 
 
 def render_tactics_quiz_page():
@@ -0,0 +1,422 @@
+"""
+排球动作识别HTTP服务
+独立于Streamlit的HTTP接口，供移动端和批处理工具直接调用
+
+接口:
+    GET  /health                              服务状态与检测器池指标
+    POST /analyze?mode=single|sequence[&profile=preview|standard|final]
+                                              请求体为视频文件原始字节，返回JSON分析结果
+    POST /visualize?type=overlay|skeleton|comparison|trajectory
+                                              请求体为视频文件原始字节，返回生成的mp4
+    POST /score                               请求体为JSON关键点（{"landmarks": {...}} 或
+                                              {"sequence": [...]}），或图片原始字节，返回评分
+
+启动:
+    python -m backend.api.http_server [--host HOST] [--port PORT] [--workers N]
+
+主进程监听端口后预先fork出多个工作进程，每个进程各自加载并预热一个检测器，
+由内核在工作进程之间分配连接；不支持fork的平台上以单进程运行。
+"""
+import argparse
+import base64
+import hashlib
+import json
+import os
+import shutil
+import signal
+import sys
+import tempfile
+import traceback
+from collections.abc import Mapping
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from pathlib import Path
+from urllib.parse import urlparse, parse_qs
+
+import cv2
+import numpy as np
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+from config.settings import API_CONFIG, VIDEO_CONFIG
+
+
+# 读取请求体时每次拷贝的字节数
+COPY_CHUNK_SIZE = 1024 * 1024
+
+# 工作进程初始化失败时的退出码（主进程据此停止重启，避免无限循环）
+WORKER_INIT_FAILED = 3
+
+# JSON结果中不返回的大对象（逐帧数据和图像）
+EXCLUDED_RESULT_KEYS = {'frames_data', 'landmark_sequence', 'annotated_frames', 'pose_image', 'trajectory_plot'}
+
+
+def to_jsonable(value):
+    """把分析结果转换为可JSON序列化的对象（numpy标量/数组、关键点视图等）"""
+    if isinstance(value, Mapping):
+        return {str(key): to_jsonable(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_jsonable(item) for item in value]
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, Path):
+        return str(value)
+    return value
+
+
+def encode_image(image, ext='.jpg'):
+    """把BGR图像或PIL图像编码为base64字符串"""
+    if hasattr(image, 'convert'):
+        image = cv2.cvtColor(np.array(image.convert('RGB')), cv2.COLOR_RGB2BGR)
+    ok, buf = cv2.imencode(ext, image)
+    if not ok:
+        return None
+    return base64.b64encode(buf.tobytes()).decode('ascii')
+
+
+class AnalysisRequestHandler(BaseHTTPRequestHandler):
+    """处理单个HTTP请求（服务实例挂在 self.server.service 上）"""
+    
+    server_version = "VolleyballAI/1.0"
+    
+    def do_OPTIONS(self):
+        """CORS预检请求"""
+        self.send_response(204)
+        self._send_cors_headers()
+        self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+    
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == '/health':
+            self._send_json(200, {
+                'status': 'ok',
+                'pid': os.getpid(),
+                'detector': self.server.service.get_detector_stats()
+            })
+        else:
+            self._send_json(404, {'success': False, 'error': f"未知接口: {path}"})
+    
+    def do_POST(self):
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        routes = {
+            '/analyze': self._handle_analyze,
+            '/visualize': self._handle_visualize,
+            '/score': self._handle_score
+        }
+        handler = routes.get(url.path)
+        if handler is None:
+            self._drain_body()
+            self._send_json(404, {'success': False, 'error': f"未知接口: {url.path}"})
+            return
+        
+        try:
+            handler(params)
+        except ValueError as e:
+            self._send_json(400, {'success': False, 'error': str(e)})
+        except Exception as e:
+            error = {'success': False, 'error': f"服务器内部错误: {str(e)}"}
+            if API_CONFIG.get('debug'):
+                error['traceback'] = traceback.format_exc()
+            self._send_json(500, error)
+    
+    def _handle_analyze(self, params):
+        """POST /analyze：分析上传的视频"""
+        mode = params.get('mode', 'single')
+        if mode not in ('single', 'sequence'):
+            raise ValueError(f"未知的分析模式: {mode}")
+        profile = self.server.service.resolve_profile(params.get('profile'))
+        
+        video_path, content_hash = self._save_body_to_file(params)
+        try:
+            result = self.server.service.analyze_video(video_path, mode=mode, profile=profile,
+                                                       content_hash=content_hash)
+        finally:
+            os.remove(video_path)
+        
+        self._send_json(200 if result.get('success') else 422,
+                        self._result_to_json(result, params))
+    
+    def _handle_visualize(self, params):
+        """POST /visualize：生成可视化视频并直接返回mp4"""
+        vis_type = params.get('type', 'overlay')
+        if vis_type not in ('overlay', 'skeleton', 'comparison', 'trajectory'):
+            raise ValueError(f"未知的可视化类型: {vis_type}")
+        
+        video_path, content_hash = self._save_body_to_file(params)
+        fd, output_path = tempfile.mkstemp(suffix='.mp4', prefix='vis_')
+        os.close(fd)
+        try:
+            result = self.server.service.generate_visualization_video(
+                video_path=video_path,
+                output_path=output_path,
+                vis_type=vis_type,
+                content_hash=content_hash
+            )
+            if not result['success']:
+                self._send_json(422, {'success': False, 'error': result.get('error', '未知错误')})
+                return
+            
+            self.send_response(200)
+            self._send_cors_headers()
+            self.send_header('Content-Type', 'video/mp4')
+            self.send_header('Content-Length', str(os.path.getsize(output_path)))
+            self.end_headers()
+            with open(output_path, 'rb') as f:
+                shutil.copyfileobj(f, self.wfile, COPY_CHUNK_SIZE)
+        finally:
+            os.remove(video_path)
+            if os.path.exists(output_path):
+                os.remove(output_path)
+    
+    def _handle_score(self, params):
+        """POST /score：对关键点JSON或单张图片评分"""
+        service = self.server.service
+        content_type = self.headers.get('Content-Type', '')
+        
+        if content_type.startswith('application/json'):
+            try:
+                payload = json.loads(self._read_body())
+            except (UnicodeDecodeError, json.JSONDecodeError) as e:
+                raise ValueError(f"JSON格式错误: {str(e)}")
+            if not isinstance(payload, dict):
+                raise ValueError("请求体必须是JSON对象")
+            
+            if 'sequence' in payload:
+                if not hasattr(service.scorer, 'score_sequence'):
+                    raise ValueError("当前评分器不支持序列评分")
+                result = service.scorer.score_sequence(payload['sequence'])
+            elif 'landmarks' in payload:
+                result = service.scorer.score_pose(payload['landmarks'])
+            else:
+                raise ValueError("请求体需要包含 landmarks 或 sequence 字段")
+            
+            self._send_json(200, {'success': True, 'score': to_jsonable(result)})
+            return
+        
+        # 图片：解码后走单帧分析
+        data = np.frombuffer(self._read_body(), dtype=np.uint8)
+        image = cv2.imdecode(data, cv2.IMREAD_COLOR)
+        if image is None:
+            raise ValueError("无法解码图片")
+        
+        result = service.analyze_single_frame(image)
+        self._send_json(200 if result.get('success') else 422,
+                        self._result_to_json(result, params))
+    
+    @staticmethod
+    def _result_to_json(result, params):
+        """去掉大对象；include_images=1 时附带base64编码的标注图和轨迹图"""
+        response = {key: to_jsonable(value) for key, value in result.items()
+                    if key not in EXCLUDED_RESULT_KEYS}
+        
+        if params.get('include_images') in ('1', 'true'):
+            if result.get('pose_image') is not None:
+                response['pose_image'] = encode_image(result['pose_image'], '.jpg')
+            if result.get('trajectory_plot') is not None:
+                response['trajectory_plot'] = encode_image(result['trajectory_plot'], '.png')
+        
+        return response
+    
+    def _content_length(self):
+        """校验并返回请求体长度"""
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+        except ValueError:
+            raise ValueError("Content-Length 无效")
+        if length <= 0:
+            raise ValueError("请求体为空")
+        
+        max_bytes = VIDEO_CONFIG['max_file_size_mb'] * 1024 * 1024
+        if length > max_bytes:
+            # 不读取超大请求体，直接断开连接
+            self.close_connection = True
+            raise ValueError(f"文件太大，请上传小于 {VIDEO_CONFIG['max_file_size_mb']}MB 的文件")
+        return length
+    
+    def _read_body(self):
+        return self.rfile.read(self._content_length())
+    
+    def _drain_body(self):
+        """丢弃未处理的请求体，保持连接可复用"""
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+        except ValueError:
+            length = 0
+        if length > 0:
+            self.rfile.read(length)
+    
+    def _save_body_to_file(self, params):
+        """
+        把请求体分块写入临时文件（不在内存中保留整个视频），同时计算内容哈希
+        
+        Returns:
+            tuple: (临时文件路径, sha256内容哈希)，调用方负责删除文件；
+                内容哈希用于在请求之间复用同一视频的帧存储
+        """
+        ext = os.path.splitext(params.get('filename', ''))[1].lower() or '.mp4'
+        if ext not in VIDEO_CONFIG['supported_formats']:
+            raise ValueError(f"不支持的文件格式: {ext}")
+        
+        remaining = self._content_length()
+        digest = hashlib.sha256()
+        fd, temp_path = tempfile.mkstemp(suffix=ext, prefix='upload_')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                while remaining > 0:
+                    chunk = self.rfile.read(min(COPY_CHUNK_SIZE, remaining))
+                    if not chunk:
+                        raise ValueError("请求体不完整")
+                    f.write(chunk)
+                    digest.update(chunk)
+                    remaining -= len(chunk)
+        except Exception:
+            os.remove(temp_path)
+            raise
+        return temp_path, digest.hexdigest()
+    
+    def _send_cors_headers(self):
+        origins = API_CONFIG.get('cors_origins') or []
+        if '*' in origins:
+            self.send_header('Access-Control-Allow-Origin', '*')
+        else:
+            origin = self.headers.get('Origin')
+            if origin in origins:
+                self.send_header('Access-Control-Allow-Origin', origin)
+                self.send_header('Vary', 'Origin')
+    
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self._send_cors_headers()
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        if API_CONFIG.get('debug'):
+            sys.stderr.write(f"[{os.getpid()}] {self.address_string()} - {format % args}\n")
+
+
+def _init_worker(server):
+    """在工作进程中创建服务并预热检测器（MediaPipe图必须在fork之后加载）"""
+    from backend.services import VolleyballService
+    
+    server.service = VolleyballService()
+    with server.service.detector_pool.detector() as detector:
+        detector.detect_landmarks(np.zeros((64, 64, 3), dtype=np.uint8))
+    print(f"✅ 工作进程 {os.getpid()} 已就绪")
+
+
+def _serve_worker(server):
+    """工作进程主循环（不会返回）"""
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    try:
+        _init_worker(server)
+    except Exception as e:
+        print(f"❌ 工作进程初始化失败: {str(e)}")
+        os._exit(WORKER_INIT_FAILED)
+    
+    exit_code = 0
+    try:
+        server.serve_forever()
+    except SystemExit:
+        pass
+    except Exception:
+        traceback.print_exc()
+        exit_code = 1
+    finally:
+        os._exit(exit_code)
+
+
+def run_server(host=None, port=None, workers=None):
+    """
+    启动HTTP服务（阻塞直到收到退出信号）
+    
+    Args:
+        host: 监听地址（默认 API_CONFIG["host"]）
+        port: 监听端口（默认 API_CONFIG["port"]）
+        workers: 工作进程数（默认 API_CONFIG["workers"]）
+    """
+    host = host or API_CONFIG['host']
+    port = port or API_CONFIG['port']
+    workers = max(1, workers or API_CONFIG.get('workers', 1))
+    
+    # 主进程负责监听端口，工作进程继承同一个socket并行accept
+    server = HTTPServer((host, port), AnalysisRequestHandler)
+    print(f"🚀 排球AI分析服务: http://{host}:{port} ({workers} 个工作进程)")
+    
+    if workers == 1 or not hasattr(os, 'fork'):
+        _init_worker(server)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+        return
+    
+    children = set()
+    
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            _serve_worker(server)
+        children.add(pid)
+    
+    for _ in range(workers):
+        spawn()
+    
+    stopping = False
+    
+    def stop(*_):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+    
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    
+    try:
+        # 工作进程异常退出时自动补充
+        while children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            except InterruptedError:
+                continue
+            children.discard(pid)
+            if os.WIFEXITED(status) and os.WEXITSTATUS(status) == WORKER_INIT_FAILED:
+                print("❌ 工作进程无法初始化，服务退出")
+                stop()
+            elif not stopping:
+                print(f"⚠️ 工作进程 {pid} 退出，重新启动")
+                spawn()
+    finally:
+        server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="排球AI分析HTTP服务")
+    parser.add_argument('--host', default=API_CONFIG['host'], help="监听地址")
+    parser.add_argument('--port', type=int, default=API_CONFIG['port'], help="监听端口")
+    parser.add_argument('--workers', type=int, default=API_CONFIG.get('workers', 1), help="工作进程数")
+    args = parser.parse_args()
+    
+    run_server(args.host, args.port, args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,49 +5,169 @@
 import os
 import sys
 from pathlib import Path
-import tempfile
-import cv2
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager, nullcontext
 import numpy as np
 
 # 添加项目根目录到路径
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
 
-from backend.services import VolleyballService
-from config.settings import OUTPUT_DIR
+from backend.services import AnalysisCache, get_job_queue, get_upload_store, scale_progress
+from backend.services.upload_store import hash_upload
+from config.settings import (
+    OUTPUT_DIR, CACHE_CONFIG, MEDIAPIPE_CONFIG, MEDIAPIPE_PROFILES, DEFAULT_MEDIAPIPE_PROFILE,
+    POSE_INPUT_CONFIG, SEQUENCE_CONFIG, JOB_CONFIG, UPLOAD_CONFIG, INFERENCE_CONFIG, FRAME_STORE_CONFIG
+)
+
+
+# 支持的可视化类型
+VIS_TYPES = ("overlay", "skeleton", "comparison", "trajectory")
 
 
 class VolleyballAPI:
-    """排球动作识别API类"""
+    """
+    排球动作识别API类
     
-    def __init__(self):
-        """初始化API"""
-        self.service = VolleyballService()
+    线程安全，Streamlit中所有会话共用一个实例（检测器、评分器、缓存和任务队列
+    都只有一份），会话里只保存各自的分析结果和任务ID。
+    """
     
-    def analyze_uploaded_video(self, uploaded_file, analysis_mode="single"):
+    def __init__(self, use_v2_scorer=True, max_concurrent_inference=None):
+        """
+        初始化API
+        
+        分析服务在第一次用到时才创建（见 service 属性），创建API本身
+        不会加载MediaPipe、OpenCV和matplotlib。
+        
+        Args:
+            use_v2_scorer: 是否使用优化版评分器
+            max_concurrent_inference: 同时进行推理的调用数上限（默认取 INFERENCE_CONFIG）
+        """
+        self.use_v2_scorer = use_v2_scorer
+        self._service = None
+        self._service_lock = threading.Lock()
+        
+        # 限制同时进行的姿态检测/视频生成，超出的调用排队等待
+        self.max_concurrent_inference = max_concurrent_inference or INFERENCE_CONFIG["max_concurrent"]
+        self._inference_slots = threading.BoundedSemaphore(self.max_concurrent_inference)
+        
+        # 按视频内容缓存分析结果，重复上传同一视频时跳过解码和姿态检测
+        self.cache = None
+        if CACHE_CONFIG["enabled"]:
+            self.cache = AnalysisCache(
+                CACHE_CONFIG["cache_dir"],
+                max_size_mb=CACHE_CONFIG["max_size_mb"],
+                config={
+                    "mediapipe": MEDIAPIPE_CONFIG,
+                    "mediapipe_profiles": MEDIAPIPE_PROFILES,
+                    "pose_input": POSE_INPUT_CONFIG,
+                    "sequence": SEQUENCE_CONFIG,
+                    # 帧存储的采样帧数和分辨率决定序列分析看到哪些帧、多大的帧
+                    "frame_store": {
+                        key: FRAME_STORE_CONFIG[key]
+                        for key in ("max_frames", "max_long_edge", "jpeg_quality")
+                    },
+                    "scorer": "v2" if self.use_v2_scorer else "v1"
+                }
+            )
+        
+        # 上传视频按内容落盘一次，分析和可视化共用同一个文件
+        self.uploads = get_upload_store(
+            UPLOAD_CONFIG["upload_dir"],
+            max_files=UPLOAD_CONFIG["max_files"]
+        )
+        
+        # 进程级共享的后台任务队列，限制整机同时执行的分析/可视化任务数
+        self.jobs = get_job_queue(
+            JOB_CONFIG["jobs_dir"],
+            max_workers=JOB_CONFIG["max_workers"],
+            retention_hours=JOB_CONFIG["retention_hours"]
+        )
+    
+    @property
+    def service(self):
+        """分析服务（第一次访问时创建）"""
+        if self._service is None:
+            with self._service_lock:
+                if self._service is None:
+                    from backend.services import VolleyballService
+                    self._service = VolleyballService(use_v2_scorer=self.use_v2_scorer)
+        return self._service
+    
+    @contextmanager
+    def _inference(self):
+        """占用一个推理名额（名额用完时阻塞等待）"""
+        if not self._inference_slots.acquire(blocking=False):
+            print(f"⏳ 推理并发已达上限（{self.max_concurrent_inference}），等待空闲名额")
+            self._inference_slots.acquire()
+        try:
+            yield
+        finally:
+            self._inference_slots.release()
+    
+    def analyze_uploaded_video(self, uploaded_file, analysis_mode="single", profile=None, progress=None):
         """
         分析上传的视频文件
         
         Args:
             uploaded_file: Streamlit上传的文件对象
             analysis_mode: 分析模式 ("single" 或 "sequence")
+            profile: MediaPipe配置档位（"preview" 快速预览 / "standard" / "final" 最终报告，
+                     None表示默认档位）
+            progress: 进度回调 progress(fraction, message)（0~1）
             
         Returns:
             dict: 分析结果
         """
-        # 保存上传的文件到临时目录
-        temp_path = self._save_uploaded_file(uploaded_file)
+        # 内容哈希只算一次，同时用于缓存键和上传文件去重
+        content_hash = hash_upload(uploaded_file)
+        return self._analyze_video(
+            content_hash, lambda: self.uploads.open(uploaded_file, content_hash),
+            analysis_mode, profile, progress
+        )
+    
+    def _analyze_video(self, content_hash, open_video, analysis_mode, profile, progress):
+        """
+        按内容哈希查缓存，未命中时打开视频文件分析
         
-        try:
+        Args:
+            content_hash: 视频内容哈希
+            open_video: 返回视频路径上下文管理器的函数（只在缓存未命中时调用）
+        """
+        profile = profile or DEFAULT_MEDIAPIPE_PROFILE
+        if profile not in MEDIAPIPE_PROFILES:
+            return {"success": False, "error": f"未知的MediaPipe配置档位: {profile}"}
+        
+        # 先查缓存
+        started = time.perf_counter()
+        cache_key = self.cache.key_for(content_hash) if self.cache else None
+        cache_name = f"analysis_{analysis_mode}_{profile}"
+        if cache_key:
+            cached = self.cache.get(cache_key, cache_name)
+            if cached is not None:
+                print("⚡ 命中分析缓存，跳过视频解码和姿态检测")
+                # 缓存里是首次分析时的推理信息，换成本次请求的（没有推理）
+                cached["inference"] = {
+                    **(cached.get("inference") or {}),
+                    "elapsed_ms": (time.perf_counter() - started) * 1000,
+                    "avg_inference_ms": 0.0,
+                    "inference_count": 0,
+                    "cached": True
+                }
+                return cached
+        
+        with open_video() as video_path, self._inference():
             # 调用服务层分析视频
-            result = self.service.analyze_video(temp_path, mode=analysis_mode)
-            return result
-        finally:
-            # 清理临时文件
-            if os.path.exists(temp_path):
-                try:
-                    os.remove(temp_path)
-                except:
-                    pass
+            result = self.service.analyze_video(video_path, mode=analysis_mode, profile=profile,
+                                                content_hash=content_hash, progress=progress)
+        
+        if cache_key and result.get("success"):
+            self._cache_put(cache_key, cache_name, self._cacheable_result(result))
+        
+        return result
     
     def analyze_image(self, image):
         """
@@ -64,48 +184,183 @@ class VolleyballAPI:
             image = np.array(image.convert('RGB'))
         
         # 调用服务层分析图像
-        return self.service.analyze_single_frame(image)
+        with self._inference():
+            return self.service.analyze_single_frame(image)
     
-    def generate_visualization(self, uploaded_file, vis_type="overlay"):
+    def generate_visualization(self, uploaded_file, vis_type="overlay", progress=None):
         """
         生成可视化视频
         
         Args:
             uploaded_file: 上传的视频文件
             vis_type: 可视化类型
+            progress: 进度回调 progress(fraction, message)（0~1）
             
         Returns:
             tuple: (success: bool, output_path: str, error: str)
         """
-        # 保存上传的文件
-        temp_input_path = self._save_uploaded_file(uploaded_file)
+        success, outputs, error = self.generate_visualizations(uploaded_file, [vis_type], progress)
+        if not success:
+            return False, None, error
+        return True, outputs[vis_type], None
+    
+    def generate_visualizations(self, uploaded_file, vis_types=None, progress=None):
+        """
+        一次生成多种可视化视频（解码和姿态检测只做一次）
         
-        # 生成输出文件路径
-        output_filename = f"vis_{vis_type}_{uploaded_file.name}"
-        output_path = OUTPUT_DIR / output_filename
+        Args:
+            uploaded_file: 上传的视频文件
+            vis_types: 可视化类型列表（None表示全部四种）
+            progress: 进度回调 progress(fraction, message)（0~1）
+            
+        Returns:
+            tuple: (success: bool, outputs: {可视化类型: 输出路径}, error: str)
+        """
+        content_hash = hash_upload(uploaded_file)
+        return self._generate_visualizations(
+            content_hash, lambda: self.uploads.open(uploaded_file, content_hash),
+            uploaded_file.name, vis_types, progress
+        )
+    
+    def _generate_visualizations(self, content_hash, open_video, upload_name, vis_types, progress):
+        """
+        按内容哈希查缓存，只为未命中的可视化类型打开视频文件生成
+        
+        Args:
+            content_hash: 视频内容哈希
+            open_video: 返回视频路径上下文管理器的函数（只在有类型未命中缓存时调用）
+            upload_name: 上传文件名（用于输出文件命名）
+        """
+        vis_types = list(vis_types or VIS_TYPES)
+        cache_key = self.cache.key_for(content_hash) if self.cache else None
+        
+        # 生成输出文件路径（每次请求唯一，同名上传不会互相覆盖）
+        request_id = uuid.uuid4().hex[:8]
+        upload_name = Path(upload_name).name
+        output_paths = {
+            vis_type: str(OUTPUT_DIR / f"vis_{vis_type}_{request_id}_{upload_name}")
+            for vis_type in vis_types
+        }
+        
+        # 先查缓存，只生成未命中的类型
+        missing = {}
+        for vis_type, output_path in output_paths.items():
+            cached_path = self.cache.get_file(cache_key, f"vis_{vis_type}.mp4") if cache_key else None
+            if cached_path is not None:
+                print(f"⚡ 命中可视化缓存（{vis_type}），跳过视频解码和姿态检测")
+                shutil.copyfile(cached_path, output_path)
+            else:
+                missing[vis_type] = output_path
+        
+        if not missing:
+            return True, output_paths, None
         
         try:
-            # 调用服务层生成可视化
-            result = self.service.generate_visualization_video(
-                video_path=str(temp_input_path),
-                output_path=str(output_path),
-                vis_type=vis_type
-            )
+            with open_video() as video_path, self._inference():
+                # 调用服务层生成可视化
+                result = self.service.generate_visualization_videos(
+                    video_path=video_path,
+                    output_paths=missing,
+                    content_hash=content_hash,
+                    progress=progress
+                )
             
             if result["success"]:
-                return True, str(output_path), None
+                if cache_key:
+                    for vis_type, output_path in missing.items():
+                        self._cache_put_file(cache_key, f"vis_{vis_type}.mp4", output_path)
+                return True, output_paths, None
             else:
                 return False, None, result.get("error", "未知错误")
                 
         except Exception as e:
             return False, None, str(e)
+    
+    def submit_analysis(self, uploaded_file, analysis_mode="single", profile=None):
+        """
+        提交后台分析任务（立即返回）
+        
+        Args:
+            uploaded_file: Streamlit上传的文件对象
+            analysis_mode: 分析模式 ("single" 或 "sequence")
+            profile: MediaPipe配置档位（见 analyze_uploaded_video）
+            
+        Returns:
+            str: 任务ID，结果通过 get_job / get_job_result 获取
+        """
+        return self._submit_upload_job("analysis", self._run_analysis_job, uploaded_file,
+                                       analysis_mode, profile)
+    
+    def submit_visualization(self, uploaded_file, vis_type="overlay"):
+        """
+        提交后台可视化任务（立即返回）
+        
+        Args:
+            uploaded_file: 上传的视频文件
+            vis_type: 可视化类型；"all" 表示一次生成全部四种
+            
+        Returns:
+            str: 任务ID，任务完成后结果为输出视频路径（"all" 时为 {可视化类型: 输出路径}）
+        """
+        return self._submit_upload_job("visualization", self._run_visualization_job, uploaded_file,
+                                       vis_type)
+    
+    def get_job(self, job_id):
+        """
+        查询后台任务状态
+        
+        Returns:
+            dict: 包含 status（queued/running/done/failed）、progress、message、error，
+                  任务不存在时返回None
+        """
+        return self.jobs.get_status(job_id)
+    
+    def get_job_result(self, job_id):
+        """获取已完成任务的结果（未完成时返回None）"""
+        return self.jobs.get_result(job_id)
+    
+    def _submit_upload_job(self, kind, func, uploaded_file, *args):
+        """
+        提交时把上传文件落盘并占用，任务只持有内容哈希和文件路径
+        
+        页面重跑释放UploadedFile也不影响任务，任务结束（成功或失败）后释放文件。
+        """
+        content_hash, video_path = self.uploads.acquire(uploaded_file)
+        upload = (content_hash, video_path, uploaded_file.name)
+        try:
+            return self.jobs.submit(kind, func, upload, *args)
+        except Exception:
+            self.uploads.release(content_hash)
+            raise
+    
+    def _run_analysis_job(self, progress, upload, analysis_mode, profile=None):
+        """后台执行视频分析"""
+        content_hash, video_path, _ = upload
+        try:
+            progress(0.0, "🔍 AI正在分析中")
+            result = self._analyze_video(
+                content_hash, lambda: nullcontext(video_path), analysis_mode, profile,
+                scale_progress(progress, 0.0, 0.95)
+            )
+        finally:
+            self.uploads.release(content_hash)
+        return self._cacheable_result(result)
+    
+    def _run_visualization_job(self, progress, upload, vis_type):
+        """后台生成可视化视频"""
+        content_hash, video_path, upload_name = upload
+        try:
+            progress(0.0, "🎨 正在生成可视化视频")
+            vis_types = None if vis_type == "all" else [vis_type]
+            success, result, error = self._generate_visualizations(
+                content_hash, lambda: nullcontext(video_path), upload_name, vis_types,
+                scale_progress(progress, 0.0, 0.95)
+            )
         finally:
-            # 清理临时文件
-            if os.path.exists(temp_input_path):
-                try:
-                    os.remove(temp_input_path)
-                except:
-                    pass
+            self.uploads.release(content_hash)
+        if not success:
+            raise RuntimeError(error or "未知错误")
+        return result if vis_type == "all" else result[vis_type]
     
     def get_score_summary(self, score_result):
         """
@@ -143,41 +398,31 @@ class VolleyballAPI:
         Returns:
             numpy.ndarray: 关键帧图像
         """
-        temp_path = self._save_uploaded_file(uploaded_file)
-        
-        try:
+        with self.uploads.open(uploaded_file) as video_path, self._inference():
             frame = self.service.video_processor.extract_key_frame(
-                temp_path, 
+                video_path, 
                 method=method
             )
             return frame
-        finally:
-            if os.path.exists(temp_path):
-                try:
-                    os.remove(temp_path)
-                except:
-                    pass
     
-    def _save_uploaded_file(self, uploaded_file):
-        """
-        保存上传的文件到临时目录
-        
-        Args:
-            uploaded_file: Streamlit的UploadedFile对象
-            
-        Returns:
-            str: 临时文件路径
-        """
-        temp_dir = tempfile.gettempdir()
-        temp_path = os.path.join(temp_dir, uploaded_file.name)
-        
-        with open(temp_path, 'wb') as f:
-            f.write(uploaded_file.read())
-        
-        # 重置文件指针，以便后续可以再次读取
-        uploaded_file.seek(0)
-        
-        return temp_path
+    @staticmethod
+    def _cacheable_result(result):
+        """去掉不需要缓存的大对象（逐帧标注图像）"""
+        return {key: value for key, value in result.items() if key != "annotated_frames"}
+    
+    def _cache_put(self, cache_key, name, value):
+        """写入缓存（失败只打印警告，不影响分析结果）"""
+        try:
+            self.cache.put(cache_key, name, value)
+        except Exception as e:
+            print(f"⚠️ 写入分析缓存失败: {str(e)}")
+    
+    def _cache_put_file(self, cache_key, filename, path):
+        """把生成的文件写入缓存（失败只打印警告）"""
+        try:
+            self.cache.put_file(cache_key, filename, path)
+        except Exception as e:
+            print(f"⚠️ 写入可视化缓存失败: {str(e)}")
     
     @staticmethod
     def validate_video_file(uploaded_file, max_size_mb=50):
@@ -1,10 +1,30 @@
-"""核心功能模块"""
-from .pose_detector import PoseDetector
-from .video_processor import VideoProcessor
-from .scorer import VolleyballScorer
-from .sequence_analyzer import SequenceAnalyzer
-from .trajectory_visualizer import TrajectoryVisualizer
-from .video_generator import VideoGenerator
+"""核心功能模块
+
+子模块在第一次访问其中的名称时才导入：mediapipe、cv2、matplotlib 等依赖
+只在真正用到姿态检测、视频处理或绘图时加载，页面冷启动不为它们付出导入时间。
+"""
+import importlib
+
+# 导出名称 -> 所在子模块
+_EXPORTS = {
+    'PoseDetector': '.pose_detector',
+    'VideoProcessor': '.video_processor',
+    'VolleyballScorer': '.scorer',
+    'SequenceAnalyzer': '.sequence_analyzer',
+    'TrajectoryVisualizer': '.trajectory_visualizer',
+    'VideoGenerator': '.video_generator',
+    'VideoEncoder': '.video_encoder',
+    'LandmarkSequence': '.landmarks',
+    'LandmarkFrame': '.landmarks',
+    'PoseLandmarks': '.landmarks',
+    'DetectorPool': '.detector_pool',
+    'get_default_pool': '.detector_pool',
+    'record_inference': '.detector_pool',
+    'iter_sampled_frames': '.frame_reader',
+    'FrameSource': '.frame_source',
+    'select_keyframes': '.keyframes',
+    'interpolate_landmarks': '.keyframes'
+}
 
 __all__ = [
     'PoseDetector', 
@@ -12,6 +32,29 @@ __all__ = [
     'VolleyballScorer',
     'SequenceAnalyzer',
     'TrajectoryVisualizer',
-    'VideoGenerator'
+    'VideoGenerator',
+    'VideoEncoder',
+    'LandmarkSequence',
+    'LandmarkFrame',
+    'PoseLandmarks',
+    'DetectorPool',
+    'get_default_pool',
+    'record_inference',
+    'iter_sampled_frames',
+    'FrameSource',
+    'select_keyframes',
+    'interpolate_landmarks'
 ]
 
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    # 缓存到模块全局，之后的访问不再经过 __getattr__
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
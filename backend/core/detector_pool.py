@@ -0,0 +1,191 @@
+"""
+检测器池模块 - 复用已加载MediaPipe图的PoseDetector实例
+"""
+import contextvars
+import threading
+from contextlib import contextmanager
+
+from .pose_detector import PoseDetector
+
+
+# 当前上下文中正在进行的推理统计（见 record_inference）
+_recorders = contextvars.ContextVar("inference_recorders", default=())
+
+
+@contextmanager
+def record_inference():
+    """
+    统计当前线程在with块内完成的推理（只含本次调用，不含并发的其他请求）
+    
+    检测器归还到池时，以及并行检测的工作进程返回结果时，把推理次数和耗时
+    计入当前上下文中所有进行中的统计。
+    
+    用法:
+        with record_inference() as stats:
+            service.analyze_video(video_path)
+        print(stats["inference_count"], stats["inference_seconds"])
+    
+    Yields:
+        dict: inference_count(推理次数)、inference_seconds(推理总耗时秒数)，with块结束后为最终值
+    """
+    stats = {"inference_count": 0, "inference_seconds": 0.0}
+    token = _recorders.set(_recorders.get() + (stats,))
+    try:
+        yield stats
+    finally:
+        _recorders.reset(token)
+
+
+class DetectorPool:
+    """
+    PoseDetector 池
+    
+    加载MediaPipe图是冷启动和单次请求延迟的主要开销，
+    池中的检测器在不同视频之间复用，归还时重置跟踪状态。
+    """
+    
+    def __init__(self, max_size=None, detector_options=None):
+        """
+        Args:
+            max_size: 最多同时存在的检测器数量（None表示不限制）；
+                      达到上限时 acquire 会等待其他调用归还
+            detector_options: 创建 PoseDetector 时的参数（如 pose_options、max_long_edge）
+        """
+        self.max_size = max_size
+        self.detector_options = dict(detector_options or {})
+        self._idle = []
+        self._created = 0
+        self._in_use = 0
+        self._acquired_total = 0
+        self._inference_count = 0
+        self._inference_seconds = 0.0
+        self._condition = threading.Condition()
+    
+    def acquire(self):
+        """
+        取出一个预热好的检测器（没有空闲的则新建）
+        
+        Returns:
+            PoseDetector: 检测器实例，用完后必须调用 release 归还
+        """
+        with self._condition:
+            while not self._idle and self.max_size is not None and self._created >= self.max_size:
+                self._condition.wait()
+            
+            if self._idle:
+                detector = self._idle.pop()
+            else:
+                detector = None
+                self._created += 1
+            self._in_use += 1
+            self._acquired_total += 1
+        
+        if detector is None:
+            try:
+                detector = PoseDetector(**self.detector_options)
+            except Exception:
+                with self._condition:
+                    self._created -= 1
+                    self._in_use -= 1
+                    self._condition.notify()
+                raise
+        
+        return detector
+    
+    def release(self, detector):
+        """归还检测器，并清空其跟踪状态以便处理下一段视频"""
+        inference_count, inference_seconds = detector.pop_inference_stats()
+        try:
+            detector.reset()
+        except Exception as e:
+            # 重置失败的检测器直接丢弃，下次按需重建
+            print(f"⚠️ 重置检测器失败，已丢弃: {str(e)}")
+            detector = None
+        
+        self.record(inference_count, inference_seconds)
+        with self._condition:
+            self._in_use -= 1
+            if detector is None:
+                self._created -= 1
+            else:
+                self._idle.append(detector)
+            self._condition.notify()
+    
+    def record(self, inference_count, inference_seconds):
+        """
+        记入一批推理统计（池内检测器归还时自动调用；工作进程中的推理由调用方记入）
+        
+        同时计入池的累计统计和当前上下文中进行中的 record_inference 统计。
+        """
+        with self._condition:
+            self._inference_count += inference_count
+            self._inference_seconds += inference_seconds
+        for stats in _recorders.get():
+            stats["inference_count"] += inference_count
+            stats["inference_seconds"] += inference_seconds
+    
+    @contextmanager
+    def detector(self):
+        """
+        以上下文管理器方式借用检测器
+        
+        用法:
+            with pool.detector() as detector:
+                landmarks = detector.detect_landmarks(frame)
+        """
+        detector = self.acquire()
+        try:
+            yield detector
+        finally:
+            self.release(detector)
+    
+    def stats(self):
+        """
+        池的运行指标
+        
+        Returns:
+            dict: pool_size(池内检测器数)、idle、in_use、acquired_total(累计借出次数)、
+                  loaded_graphs(当前进程已加载的MediaPipe图总数)、
+                  inference_count(累计推理次数，含并行检测工作进程)、avg_inference_ms(平均单帧推理耗时)
+        """
+        with self._condition:
+            avg_ms = self._inference_seconds / self._inference_count * 1000 if self._inference_count else None
+            return {
+                'pool_size': self._created,
+                'idle': len(self._idle),
+                'in_use': self._in_use,
+                'acquired_total': self._acquired_total,
+                'loaded_graphs': PoseDetector.loaded_graphs,
+                'inference_count': self._inference_count,
+                'avg_inference_ms': avg_ms
+            }
+    
+    def close(self):
+        """释放所有空闲的检测器"""
+        with self._condition:
+            idle, self._idle = self._idle, []
+            self._created -= len(idle)
+        for detector in idle:
+            detector.close()
+
+
+_default_pools = {}
+_default_pool_lock = threading.Lock()
+
+
+def get_default_pool(max_size=None, detector_options=None, name="default"):
+    """
+    获取进程级共享的检测器池
+    
+    不同MediaPipe配置的检测器不能混用，每种配置按名称各有一个池。
+    
+    Args:
+        max_size, detector_options: 仅在该名称的池第一次创建时生效
+        name: 池的名称（如MediaPipe配置档位名）
+    """
+    with _default_pool_lock:
+        pool = _default_pools.get(name)
+        if pool is None:
+            pool = DetectorPool(max_size=max_size, detector_options=detector_options)
+            _default_pools[name] = pool
+        return pool
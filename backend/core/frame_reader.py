@@ -0,0 +1,54 @@
+"""
+帧读取模块 - 按间隔采样读取视频帧
+"""
+import cv2
+
+
+# 采样间隔达到该帧数时改用seek跳转，而不是逐帧grab
+SEEK_INTERVAL_THRESHOLD = 120
+
+
+def iter_sampled_frames(cap, frame_interval=1, max_frames=None,
+                        seek_threshold=SEEK_INTERVAL_THRESHOLD):
+    """
+    按固定间隔读取视频帧（生成器）
+    
+    只有保留的帧才会解码为BGR图像（read = grab + retrieve），
+    跳过的帧只调用 grab() 推进解码器，不做颜色转换和拷贝；
+    间隔很大时直接 seek 到下一个采样位置。
+    
+    Args:
+        cap: 已打开的 cv2.VideoCapture
+        frame_interval: 采样间隔（每隔多少帧取一帧）
+        max_frames: 最多读取的帧数（None表示读到结尾）
+        seek_threshold: 间隔不小于该值时使用seek跳转
+    
+    Yields:
+        numpy.ndarray: BGR格式的帧
+    """
+    frame_interval = max(1, int(frame_interval))
+    use_seek = frame_interval >= seek_threshold
+    position = int(cap.get(cv2.CAP_PROP_POS_FRAMES) or 0)
+    yielded = 0
+    
+    while max_frames is None or yielded < max_frames:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        
+        if frame is not None:
+            yield frame
+            yielded += 1
+        
+        if max_frames is not None and yielded >= max_frames:
+            break
+        
+        # 跳过中间的帧
+        position += frame_interval
+        if use_seek:
+            if not cap.set(cv2.CAP_PROP_POS_FRAMES, position):
+                break
+        else:
+            for _ in range(frame_interval - 1):
+                if not cap.grab():
+                    return
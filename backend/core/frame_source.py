@@ -0,0 +1,374 @@
+"""
+帧来源模块 - 视频只解码一次，分析和各类可视化共用同一份帧与关键点
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from .frame_reader import iter_sampled_frames
+from .landmarks import LandmarkSequence
+
+
+# 同一份关键点文件的读写锁（同进程内的并发请求不会重复检测同一批帧）
+_landmarks_locks = {}
+_landmarks_locks_guard = threading.Lock()
+
+
+def _landmarks_lock(path):
+    with _landmarks_locks_guard:
+        return _landmarks_locks.setdefault(str(path), threading.Lock())
+
+
+class FrameSource:
+    """
+    解码一次、多处读取的视频帧存储
+    
+    视频按固定间隔（最多 max_frames 帧）解码一次，每帧编码为JPEG后顺序写入磁盘上的
+    一个文件，读取时按偏移解码；存储目录按视频内容哈希命名，同一段视频重复上传也只解码一次。
+    
+    关键点按需检测：序列分析只检测它采样的帧，可视化需要全部帧时再补齐其余帧。
+    不同检测配置（模型档位、稀疏推理）的关键点分别保存在同一存储目录下的不同文件中。
+    """
+    
+    FRAMES_FILE = "frames.jpg"
+    META_FILE = "meta.json"
+    LANDMARKS_PREFIX = "landmarks_"
+    
+    # 每次交给检测函数的帧数下限（一段连续帧按此切批，每批不超过它的两倍，
+    # 解码后的帧在内存中只保留这么多）
+    DETECT_CHUNK_FRAMES = 32
+    
+    # 两段待检测帧之间只隔着不超过这么多个已检测帧时合并为一段一起检测，
+    # 保持跟踪连续（这些帧的结果丢弃，不覆盖已有关键点）
+    BRIDGE_FRAMES = 2
+    
+    # 存储格式有不兼容改动时递增
+    STORE_VERSION = 4
+    
+    def __init__(self, store_dir, blob, offsets, shape, fps, frame_interval, total_frames,
+                 landmarks_key=None):
+        """
+        Args:
+            store_dir: 存储目录
+            blob: 所有帧JPEG数据拼接成的只读uint8数组
+            offsets: (帧数+1,) 每帧JPEG数据在 blob 中的起止偏移
+            shape: (帧数, 高, 宽, 3)
+            fps: 原视频帧率
+            frame_interval: 存储的相邻两帧在原视频中的间隔
+            total_frames: 原视频总帧数
+            landmarks_key: 描述关键点检测配置的可JSON序列化对象（决定读写哪个关键点文件）
+        """
+        self.store_dir = Path(store_dir)
+        self.blob = blob
+        self.offsets = offsets
+        self.shape = tuple(shape)
+        self.fps = fps
+        self.frame_interval = frame_interval
+        self.total_frames = total_frames
+        self.landmarks_path = self.store_dir / self._landmarks_file(landmarks_key)
+        
+        num_frames = self.shape[0]
+        self.landmarks = LandmarkSequence.empty(num_frames)
+        self.inferred = np.zeros(num_frames, dtype=bool)  # 实际做了姿态检测的帧
+        self.detected = np.zeros(num_frames, dtype=bool)  # 关键点已就绪的帧（检测或插值）
+        self._load_landmarks()
+    
+    @classmethod
+    def load_or_build(cls, video_path, store_root, max_frames=300, max_long_edge=None,
+                      max_stores=4, jpeg_quality=90, content_hash=None, landmarks_key=None,
+                      progress=None):
+        """
+        打开视频对应的帧存储，不存在时解码后创建（不做姿态检测）
+        
+        Args:
+            video_path: 视频文件路径
+            store_root: 所有帧存储的根目录
+            max_frames: 最多存储的帧数（超出时按间隔采样）
+            max_long_edge: 存储帧的长边上限（None表示保持原分辨率）
+            max_stores: 根目录下最多保留的帧存储数，超出后删除最久未使用的
+            jpeg_quality: 存储帧的JPEG质量（0~100）
+            content_hash: 视频内容哈希（给出时按内容而不是文件路径复用存储）
+            landmarks_key: 关键点检测配置（见 __init__）
+            progress: 解码进度回调 progress(fraction)（0~1，只在需要解码时调用）
+        
+        Returns:
+            FrameSource
+        """
+        store_root = Path(store_root)
+        store_root.mkdir(parents=True, exist_ok=True)
+        store_dir = store_root / cls._store_key(video_path, max_frames, max_long_edge, jpeg_quality,
+                                                content_hash)
+        
+        source = cls.open(store_dir, landmarks_key)
+        if source is None:
+            temp_dir = Path(tempfile.mkdtemp(dir=store_root, prefix='.building_'))
+            try:
+                cls._build(video_path, temp_dir, max_frames, max_long_edge, jpeg_quality, progress)
+                try:
+                    os.rename(temp_dir, store_dir)
+                except OSError:
+                    # 其他线程已经建好了同一份存储
+                    shutil.rmtree(temp_dir, ignore_errors=True)
+            except Exception:
+                shutil.rmtree(temp_dir, ignore_errors=True)
+                raise
+            source = cls.open(store_dir, landmarks_key)
+            if source is None:
+                raise RuntimeError(f"帧存储创建失败: {store_dir}")
+        
+        cls._evict(store_root, keep=store_dir.name, max_stores=max_stores)
+        return source
+    
+    @classmethod
+    def open(cls, store_dir, landmarks_key=None):
+        """
+        打开已有的帧存储
+        
+        Returns:
+            FrameSource: 存储不存在或不完整时返回None
+        """
+        store_dir = Path(store_dir)
+        try:
+            with open(store_dir / cls.META_FILE, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            if meta.get('version') != cls.STORE_VERSION:
+                return None
+            
+            offsets = np.asarray(meta['offsets'], dtype=np.int64)
+            if offsets[-1] > 0:
+                blob = np.memmap(store_dir / cls.FRAMES_FILE, dtype=np.uint8, mode='r')
+            else:
+                blob = np.zeros(0, dtype=np.uint8)
+        except (OSError, ValueError, KeyError):
+            return None
+        
+        # 更新访问时间（用于LRU）
+        try:
+            os.utime(store_dir, None)
+        except OSError:
+            pass
+        
+        return cls(store_dir, blob, offsets, meta['shape'], meta['fps'], meta['frame_interval'],
+                   meta['total_frames'], landmarks_key=landmarks_key)
+    
+    @classmethod
+    def _store_key(cls, video_path, max_frames, max_long_edge, jpeg_quality, content_hash=None):
+        """由视频内容（或文件身份）和存储参数得到存储目录名"""
+        if content_hash:
+            identity = ['content', content_hash]
+        else:
+            stat = os.stat(video_path)
+            identity = ['file', os.path.abspath(video_path), stat.st_size, stat.st_mtime_ns]
+        key = json.dumps([cls.STORE_VERSION, identity, max_frames, max_long_edge, jpeg_quality])
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()[:32]
+    
+    @classmethod
+    def _landmarks_file(cls, landmarks_key):
+        """关键点检测配置对应的文件名"""
+        identity = json.dumps(landmarks_key, sort_keys=True, default=str)
+        return f"{cls.LANDMARKS_PREFIX}{hashlib.sha256(identity.encode('utf-8')).hexdigest()[:16]}.npz"
+    
+    @classmethod
+    def _build(cls, video_path, store_dir, max_frames, max_long_edge, jpeg_quality, progress=None):
+        """解码视频、逐帧编码为JPEG并写入存储目录"""
+        cap = cv2.VideoCapture(str(video_path))
+        if not cap.isOpened():
+            raise ValueError(f"无法打开视频: {video_path}")
+        
+        try:
+            total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            fps = cap.get(cv2.CAP_PROP_FPS) or 10
+            # 向上取整，存储的帧覆盖整段视频（向下取整时只会存到视频的前 max_frames 帧）
+            frame_interval = -(-total_frames // max_frames) if total_frames > max_frames else 1
+            capacity = min(max_frames, -(-total_frames // frame_interval)) if total_frames > 0 else max_frames
+            
+            print(f"📦 解码视频到帧存储: {total_frames} 帧, 每 {frame_interval} 帧取一帧")
+            
+            frame_shape = None
+            offsets = [0]
+            encode_params = [cv2.IMWRITE_JPEG_QUALITY, int(jpeg_quality)]
+            with open(store_dir / cls.FRAMES_FILE, 'wb') as f:
+                for frame in iter_sampled_frames(cap, frame_interval, capacity):
+                    frame = cls._fit_long_edge(frame, max_long_edge)
+                    if frame_shape is None:
+                        frame_shape = frame.shape
+                    elif frame.shape != frame_shape:
+                        frame = cv2.resize(frame, (frame_shape[1], frame_shape[0]), interpolation=cv2.INTER_AREA)
+                    
+                    ok, encoded = cv2.imencode('.jpg', frame, encode_params)
+                    if not ok:
+                        raise ValueError("帧编码失败")
+                    f.write(encoded.tobytes())
+                    offsets.append(offsets[-1] + len(encoded))
+                    if progress is not None:
+                        progress(min(1.0, (len(offsets) - 1) / capacity))
+        finally:
+            cap.release()
+        
+        if frame_shape is None:
+            raise ValueError("无法从视频中提取帧")
+        
+        # meta最后写入，存在即表示存储完整
+        meta = {
+            'version': cls.STORE_VERSION,
+            'shape': [len(offsets) - 1] + list(frame_shape),
+            'offsets': offsets,
+            'fps': fps,
+            'frame_interval': frame_interval,
+            'total_frames': total_frames
+        }
+        with open(store_dir / cls.META_FILE, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+    
+    def ensure_landmarks(self, indices, detect, progress=None, min_chunk_frames=None):
+        """
+        确保指定帧的关键点已经就绪，缺少的帧调用 detect 检测后写回存储
+        
+        缺少关键点的帧按 indices 中的顺序切成连续的段（只隔着少量已检测帧的段合并），
+        每段再切成不少于 min_chunk_frames 帧的批次交给 detect，不会把不相邻的帧拼在一起检测。
+        
+        Args:
+            indices: 需要关键点的帧索引（升序）
+            detect: 检测函数 detect(frames) -> (LandmarkSequence, inferred)，
+                inferred 标记每帧是否实际做了检测（其余帧为插值）
+            progress: 检测进度回调 progress(fraction)（0~1，每检测完一批帧调用一次）
+            min_chunk_frames: 每批至少的帧数（如并行检测需要的最少帧数），
+                与 DETECT_CHUNK_FRAMES 取较大者
+        
+        Returns:
+            int: 本次新检测的帧数
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        chunk_frames = max(self.DETECT_CHUNK_FRAMES, min_chunk_frames or 0)
+        with _landmarks_lock(self.landmarks_path):
+            # 其他请求（或其他进程）可能已经补齐了部分帧
+            self._load_landmarks()
+            missing = int(np.count_nonzero(~self.detected[indices]))
+            
+            done = 0
+            for chunk in self._detect_chunks(indices, chunk_frames):
+                sequence, inferred = detect([self.frame(idx) for idx in chunk])
+                # 为保持连续而一起检测的已检测帧不覆盖
+                new = ~self.detected[chunk]
+                target = chunk[new]
+                self.landmarks.data[target] = sequence.data[new]
+                self.landmarks.present[target] = sequence.present[new]
+                self.inferred[target] = inferred[new]
+                self.detected[target] = True
+                done += len(target)
+                if progress is not None:
+                    progress(done / missing)
+            
+            if missing:
+                self._save_landmarks()
+        return missing
+    
+    def _detect_chunks(self, indices, chunk_frames):
+        """
+        把需要检测的帧切成连续的批次
+        
+        Returns:
+            list: 帧索引数组的列表，每个数组是 indices 中连续的一段
+        """
+        positions = np.flatnonzero(~self.detected[indices])
+        if not len(positions):
+            return []
+        
+        # 相邻两个待检测帧之间隔着超过 BRIDGE_FRAMES 个已检测帧时断开
+        breaks = np.flatnonzero(np.diff(positions) > self.BRIDGE_FRAMES + 1) + 1
+        chunks = []
+        for run in np.split(positions, breaks):
+            run = indices[run[0]:run[-1] + 1]
+            # 均分成若干批，每批帧数在 [chunk_frames, 2 * chunk_frames) 之间（整段不足时为一批）
+            chunks.extend(np.array_split(run, max(1, len(run) // chunk_frames)))
+        return chunks
+    
+    def _load_landmarks(self):
+        """从磁盘读取已检测的关键点（文件不存在或损坏时保持当前状态）"""
+        try:
+            with np.load(self.landmarks_path) as data:
+                if data['data'].shape != self.landmarks.data.shape:
+                    return
+                self.landmarks = LandmarkSequence(data['data'], data['present'])
+                self.inferred = data['inferred']
+                self.detected = data['detected']
+        except (OSError, ValueError, KeyError):
+            pass
+    
+    def _save_landmarks(self):
+        """原子地写回关键点文件"""
+        fd, temp_path = tempfile.mkstemp(dir=self.store_dir, suffix='.npz.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, data=self.landmarks.data, present=self.landmarks.present,
+                         inferred=self.inferred, detected=self.detected)
+            os.replace(temp_path, self.landmarks_path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+    
+    @staticmethod
+    def _fit_long_edge(frame, max_long_edge):
+        """把帧缩小到长边不超过 max_long_edge"""
+        if not max_long_edge:
+            return frame
+        height, width = frame.shape[:2]
+        scale = max_long_edge / max(height, width)
+        if scale >= 1:
+            return frame
+        size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        return cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+    
+    @staticmethod
+    def _evict(store_root, keep, max_stores):
+        """帧存储数量超过上限时，按最近访问时间删除旧的存储"""
+        stores = []
+        for store_dir in Path(store_root).iterdir():
+            if not store_dir.is_dir() or store_dir.name.startswith('.') or store_dir.name == keep:
+                continue
+            try:
+                stores.append((store_dir.stat().st_mtime, store_dir))
+            except OSError:
+                continue
+        
+        stores.sort()
+        for _, store_dir in stores[:max(0, len(stores) - (max_stores - 1))]:
+            shutil.rmtree(store_dir, ignore_errors=True)
+    
+    def __len__(self):
+        return self.shape[0]
+    
+    def frame(self, idx):
+        """解码第idx帧（每次返回新的可写数组）"""
+        start, end = self.offsets[idx], self.offsets[idx + 1]
+        frame = cv2.imdecode(self.blob[start:end], cv2.IMREAD_COLOR)
+        if frame is None:
+            raise ValueError(f"帧存储损坏: 第 {idx} 帧无法解码")
+        return frame
+    
+    def sample_indices(self, sample_fps):
+        """
+        按目标采样率挑选存储帧的索引
+        
+        Args:
+            sample_fps: 每秒需要的帧数
+        
+        Returns:
+            list: 存储帧索引
+        """
+        source_interval = max(1, int(self.fps / sample_fps))
+        step = max(1, round(source_interval / self.frame_interval))
+        return list(range(0, len(self), step))
+    
+    def iter_pose_frames(self):
+        """逐帧产出 (帧, 关键点)；帧是新解码的可写数组，关键点需先用 ensure_landmarks 补齐"""
+        for idx in range(len(self)):
+            yield self.frame(idx), self.landmarks[idx]
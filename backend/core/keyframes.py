@@ -0,0 +1,71 @@
+"""
+关键帧模块 - 按画面运动挑选需要做姿态检测的帧，其余帧由相邻关键帧插值
+"""
+import numpy as np
+
+from .landmarks import LandmarkSequence
+
+
+def select_keyframes(motion, max_gap=6, motion_step=8.0):
+    """
+    按运动量挑选关键帧
+    
+    从上一个关键帧开始累计帧差，累计值达到 motion_step 或间隔达到 max_gap 时
+    取一个关键帧：动作剧烈的片段几乎逐帧检测，静止片段每 max_gap 帧检测一次。
+    首帧和末帧总是关键帧。
+    
+    Args:
+        motion: 每帧与前一帧的帧差，形状 (帧数,)（见 VideoProcessor.motion_signal）
+        max_gap: 相邻关键帧的最大间隔
+        motion_step: 相邻关键帧之间允许累计的帧差
+    
+    Returns:
+        np.ndarray: 升序排列的关键帧索引
+    """
+    num_frames = len(motion)
+    if num_frames == 0:
+        return np.zeros(0, dtype=np.int64)
+    
+    max_gap = max(1, int(max_gap))
+    keyframes = [0]
+    accumulated = 0.0
+    for idx in range(1, num_frames):
+        accumulated += float(motion[idx])
+        if accumulated >= motion_step or idx - keyframes[-1] >= max_gap:
+            keyframes.append(idx)
+            accumulated = 0.0
+    
+    if keyframes[-1] != num_frames - 1:
+        keyframes.append(num_frames - 1)
+    return np.asarray(keyframes, dtype=np.int64)
+
+
+def interpolate_landmarks(keyframes, keyframe_landmarks, num_frames):
+    """
+    由关键帧的检测结果得到每一帧的关键点
+    
+    两个相邻关键帧都检测到人体时，中间帧的坐标和可见度按时间线性插值；
+    任一侧没有人体时，中间帧也视为没有人体。
+    
+    Args:
+        keyframes: 关键帧索引（升序）
+        keyframe_landmarks: 关键帧上的检测结果（LandmarkSequence，与 keyframes 一一对应）
+        num_frames: 总帧数
+    
+    Returns:
+        LandmarkSequence: 全部帧的关键点
+    """
+    sequence = LandmarkSequence.empty(num_frames)
+    keyframes = np.asarray(keyframes, dtype=np.int64)
+    sequence.data[keyframes] = keyframe_landmarks.data
+    sequence.present[keyframes] = keyframe_landmarks.present
+    
+    for start, end in zip(keyframes[:-1], keyframes[1:]):
+        if end - start < 2 or not (sequence.present[start] and sequence.present[end]):
+            continue
+        t = (np.arange(start + 1, end, dtype=np.float32) - start) / (end - start)
+        t = t[:, None, None]
+        sequence.data[start + 1:end] = sequence.data[start] * (1 - t) + sequence.data[end] * t
+        sequence.present[start + 1:end] = True
+    
+    return sequence
@@ -0,0 +1,304 @@
+"""
+关键点数据模块 - 基于NumPy数组的紧凑关键点表示
+"""
+from collections.abc import Mapping
+from itertools import chain
+
+import numpy as np
+
+
+# MediaPipe Pose 的全部33个关键点名称（顺序即MediaPipe关键点编号）
+POSE_LANDMARK_NAMES = (
+    'nose',
+    'left_eye_inner', 'left_eye', 'left_eye_outer',
+    'right_eye_inner', 'right_eye', 'right_eye_outer',
+    'left_ear', 'right_ear',
+    'mouth_left', 'mouth_right',
+    'left_shoulder', 'right_shoulder',
+    'left_elbow', 'right_elbow',
+    'left_wrist', 'right_wrist',
+    'left_pinky', 'right_pinky',
+    'left_index', 'right_index',
+    'left_thumb', 'right_thumb',
+    'left_hip', 'right_hip',
+    'left_knee', 'right_knee',
+    'left_ankle', 'right_ankle',
+    'left_heel', 'right_heel',
+    'left_foot_index', 'right_foot_index',
+)
+
+# 关键点名称 -> MediaPipe关键点编号
+POSE_LANDMARK_INDEX = {name: idx for idx, name in enumerate(POSE_LANDMARK_NAMES)}
+
+# 评分使用的关键点名称（顺序即数组中的关节索引）
+JOINT_NAMES = (
+    'nose',
+    'left_shoulder', 'right_shoulder',
+    'left_elbow', 'right_elbow',
+    'left_wrist', 'right_wrist',
+    'left_hip', 'right_hip',
+    'left_knee', 'right_knee',
+    'left_ankle', 'right_ankle',
+)
+
+# 关键点名称 -> 数组中的关节索引
+JOINT_INDEX = {name: idx for idx, name in enumerate(JOINT_NAMES)}
+
+# 每个关节对应的MediaPipe关键点编号
+MEDIAPIPE_INDEX = tuple(POSE_LANDMARK_INDEX[name] for name in JOINT_NAMES)
+
+# 每个关节保存的字段（数组最后一维的顺序）
+FIELDS = ('x', 'y', 'z', 'visibility')
+FIELD_INDEX = {name: idx for idx, name in enumerate(FIELDS)}
+
+# 一层完整关键点的数值个数，以及评分关节在完整关键点中的行号
+_POSE_VALUES = len(POSE_LANDMARK_NAMES) * len(FIELDS)
+_JOINT_ROWS = np.array(MEDIAPIPE_INDEX, dtype=np.intp)
+
+
+class JointView(Mapping):
+    """单个关节的字典兼容视图：joint['x'] / joint.get('visibility', 0)"""
+
+    __slots__ = ('_row',)
+
+    def __init__(self, row):
+        self._row = row
+
+    def __getitem__(self, key):
+        return float(self._row[FIELD_INDEX[key]])
+
+    def __iter__(self):
+        return iter(FIELDS)
+
+    def __len__(self):
+        return len(FIELDS)
+
+    def __contains__(self, key):
+        return key in FIELD_INDEX
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class PoseLandmarks(Mapping):
+    """
+    单帧MediaPipe完整关键点：全部33个点的图像坐标和世界坐标
+
+    底层是一个 (2, 33, 4) 的float32数组：第0层为归一化图像坐标，
+    第1层为以髋部中点为原点、单位为米的世界坐标（没有世界坐标时全为0）。
+    按名称访问：pose['left_heel']['y'] / pose.point('left_heel', world=True)。
+    """
+
+    __slots__ = ('data', 'has_world')
+
+    def __init__(self, data, has_world=True):
+        """
+        Args:
+            data: (2, 33, 4) 的float32数组
+            has_world: 第1层是否为有效的世界坐标
+        """
+        self.data = data
+        self.has_world = has_world
+
+    @classmethod
+    def from_results(cls, pose_landmarks, pose_world_landmarks=None):
+        """
+        从MediaPipe的结果一次性拷贝全部关键点
+
+        Args:
+            pose_landmarks: results.pose_landmarks
+            pose_world_landmarks: results.pose_world_landmarks（可为None）
+        """
+        has_world = pose_world_landmarks is not None
+        layers = (pose_landmarks.landmark, pose_world_landmarks.landmark) if has_world \
+            else (pose_landmarks.landmark,)
+
+        # 按已知长度一次性填充到float32数组，不生成中间的逐点列表
+        values = chain.from_iterable(
+            (lm.x, lm.y, lm.z, lm.visibility) for layer in layers for lm in layer
+        )
+        data = np.fromiter(values, dtype=np.float32, count=len(layers) * _POSE_VALUES)
+        if not has_world:
+            data = np.concatenate([data, np.zeros(_POSE_VALUES, dtype=np.float32)])
+        return cls(data.reshape(2, len(POSE_LANDMARK_NAMES), len(FIELDS)), has_world=has_world)
+
+    @property
+    def image(self):
+        """归一化图像坐标，形状 (33, 4)"""
+        return self.data[0]
+
+    @property
+    def world(self):
+        """世界坐标（米），形状 (33, 4)；没有世界坐标时为None"""
+        return self.data[1] if self.has_world else None
+
+    def point(self, name, world=False):
+        """某个关键点的 (x, y, z, visibility) 数组"""
+        layer = self.world if world else self.image
+        if layer is None:
+            raise ValueError("结果中没有世界坐标")
+        return layer[POSE_LANDMARK_INDEX[name]]
+
+    def points(self, names, world=False):
+        """多个关键点的数组，形状 (len(names), 4)"""
+        layer = self.world if world else self.image
+        if layer is None:
+            raise ValueError("结果中没有世界坐标")
+        return layer[[POSE_LANDMARK_INDEX[name] for name in names]]
+
+    def joints(self):
+        """评分使用的关键点（LandmarkFrame，附带本对象作为 full）"""
+        return LandmarkFrame(self.image.take(_JOINT_ROWS, axis=0), full=self)
+
+    def __getitem__(self, name):
+        return JointView(self.image[POSE_LANDMARK_INDEX[name]])
+
+    def __iter__(self):
+        return iter(POSE_LANDMARK_NAMES)
+
+    def __len__(self):
+        return len(POSE_LANDMARK_NAMES)
+
+    def __contains__(self, name):
+        return name in POSE_LANDMARK_INDEX
+
+    def __repr__(self):
+        return f"PoseLandmarks(has_world={self.has_world})"
+
+
+class LandmarkFrame(Mapping):
+    """
+    单帧关键点的字典兼容视图
+
+    底层是一个 (关节数, 4) 的float32数组（通常是LandmarkSequence缓冲区的一行），
+    旧代码仍可以按 landmarks['left_wrist']['x'] 的方式访问。
+    检测器提取了完整关键点时（detect_full_landmarks 或 full_landmarks=True），
+    full 为包含全部33个点和世界坐标的 PoseLandmarks，否则为None。
+    """
+
+    __slots__ = ('array', 'full')
+
+    def __init__(self, array, full=None):
+        self.array = array
+        self.full = full
+
+    @classmethod
+    def from_dict(cls, landmarks):
+        """从旧的嵌套字典格式构造（缺失的关节和字段记为0，完整性可用 is_complete 检查）"""
+        array = np.zeros((len(JOINT_NAMES), len(FIELDS)), dtype=np.float32)
+        for name, joint in landmarks.items():
+            if name in JOINT_INDEX:
+                array[JOINT_INDEX[name]] = [joint.get(field, 0) for field in FIELDS]
+        return cls(array)
+
+    @staticmethod
+    def is_complete(landmarks):
+        """
+        关键点是否包含所有关节的全部字段
+
+        LandmarkFrame 总是完整的；旧格式字典缺少关节或字段时，数组化后补0的结果
+        与按字典逐帧计算的结果不一致，调用方需要按字典单独处理。
+        """
+        if isinstance(landmarks, LandmarkFrame):
+            return True
+        for name in JOINT_NAMES:
+            joint = landmarks.get(name)
+            if joint is None or not all(field in joint for field in FIELDS):
+                return False
+        return True
+
+    def __getitem__(self, name):
+        return JointView(self.array[JOINT_INDEX[name]])
+
+    def __iter__(self):
+        return iter(JOINT_NAMES)
+
+    def __len__(self):
+        return len(JOINT_NAMES)
+
+    def __contains__(self, name):
+        return name in JOINT_INDEX
+
+    def to_dict(self):
+        """转换为普通的嵌套字典（用于序列化）"""
+        return {name: dict(self[name]) for name in JOINT_NAMES}
+
+    def __repr__(self):
+        return f"LandmarkFrame({self.to_dict()!r})"
+
+
+class LandmarkSequence:
+    """
+    整段视频的关键点序列
+
+    所有帧的关键点存放在一个连续的 (帧数, 关节数, 4) float32 数组中，
+    present 标记每帧是否检测到人体；按帧索引取出的是 LandmarkFrame 视图（无人体时为None）。
+    """
+
+    def __init__(self, data, present):
+        """
+        Args:
+            data: (帧数, 关节数, 4) 的float32数组
+            present: (帧数,) 的bool数组
+        """
+        self.data = np.asarray(data, dtype=np.float32)
+        self.present = np.asarray(present, dtype=bool)
+
+    @classmethod
+    def empty(cls, num_frames):
+        """创建指定帧数的空序列（所有帧均无人体）"""
+        data = np.zeros((num_frames, len(JOINT_NAMES), len(FIELDS)), dtype=np.float32)
+        present = np.zeros(num_frames, dtype=bool)
+        return cls(data, present)
+
+    @classmethod
+    def from_frames(cls, landmarks_list):
+        """
+        从逐帧关键点列表构造
+
+        Args:
+            landmarks_list: 每个元素为 LandmarkFrame、旧格式字典或 None
+        """
+        sequence = cls.empty(len(landmarks_list))
+        for idx, landmarks in enumerate(landmarks_list):
+            sequence.set_frame(idx, landmarks)
+        return sequence
+
+    def set_frame(self, idx, landmarks):
+        """写入第idx帧的关键点（None表示未检测到人体）"""
+        if landmarks is None:
+            self.data[idx] = 0
+            self.present[idx] = False
+            return
+        if not isinstance(landmarks, LandmarkFrame):
+            landmarks = LandmarkFrame.from_dict(landmarks)
+        self.data[idx] = landmarks.array
+        self.present[idx] = True
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, idx):
+        if not self.present[idx]:
+            return None
+        return LandmarkFrame(self.data[idx])
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield self[idx]
+
+    def take(self, indices):
+        """按帧索引取出子序列（拷贝）"""
+        return LandmarkSequence(self.data[indices], self.present[indices])
+
+    def joint(self, name):
+        """取出某个关节在所有帧上的数据，形状 (帧数, 4)"""
+        return self.data[:, JOINT_INDEX[name]]
+
+    def field(self, name, field):
+        """取出某个关节某个字段在所有帧上的数据，形状 (帧数,)"""
+        return self.data[:, JOINT_INDEX[name], FIELD_INDEX[field]]
+
+    def to_list(self):
+        """转换为旧格式的逐帧字典列表"""
+        return [None if landmarks is None else landmarks.to_dict() for landmarks in self]
@@ -1,39 +1,121 @@
 """
 姿态识别模块 - 使用MediaPipe提取人体关键点
 """
+import threading
+import time
+
 import cv2
 import mediapipe as mp
 import numpy as np
+from .landmarks import LandmarkFrame, MEDIAPIPE_INDEX, PoseLandmarks
 
 
 class PoseDetector:
-    def __init__(self):
+    # 当前进程中已加载（未关闭）的MediaPipe图数量
+    loaded_graphs = 0
+    _graphs_lock = threading.Lock()
+    
+    # 计算人体包围框时使用的关键点可见度阈值
+    ROI_VISIBILITY_THRESHOLD = 0.3
+    
+    # MediaPipe Pose 的默认参数（pose_options 中未给出的项使用这些值）
+    DEFAULT_POSE_OPTIONS = {
+        "static_image_mode": False,
+        "model_complexity": 1,
+        "smooth_landmarks": True,
+        "min_detection_confidence": 0.5,
+        "min_tracking_confidence": 0.5
+    }
+    
+    def __init__(self, pose_options=None, max_long_edge=None, roi_crop=False, roi_padding=0.3,
+                 full_landmarks=False):
+        """
+        Args:
+            pose_options: MediaPipe Pose 参数（model_complexity、static_image_mode、
+                smooth_landmarks 等），覆盖 DEFAULT_POSE_OPTIONS 中的同名项
+            max_long_edge: 送入MediaPipe前把输入缩小到的长边上限（None表示不缩放）
+            roi_crop: 检测到人体后，下一帧只把上一帧人体周围的区域送入MediaPipe
+            roi_padding: 裁剪区域在人体包围框四周外扩的比例（相对包围框的长边）
+            full_landmarks: 每次检测都提取全部33个点及世界坐标（附在结果的 full 属性上）；
+                默认只拷贝评分用的关节，需要完整关键点时调用 detect_full_landmarks
+        """
         self.mp_pose = mp.solutions.pose
         self.mp_drawing = mp.solutions.drawing_utils
-        self.pose = self.mp_pose.Pose(
-            static_image_mode=False,
-            model_complexity=1,
-            smooth_landmarks=True,
-            min_detection_confidence=0.5,
-            min_tracking_confidence=0.5
-        )
+        self.pose_options = {**self.DEFAULT_POSE_OPTIONS, **(pose_options or {})}
+        self.max_long_edge = max_long_edge
+        self.roi_crop = roi_crop
+        self.roi_padding = roi_padding
+        self.full_landmarks = full_landmarks
+        self._roi = None  # 当前裁剪区域 (x0, y0, x1, y1)，None表示整帧
+        self._inference_count = 0
+        self._inference_seconds = 0.0
+        self.pose = None
+        self.pose = self._create_pose()
+    
+    def _create_pose(self):
+        """创建MediaPipe Pose实例"""
+        pose = self.mp_pose.Pose(**self.pose_options)
+        with PoseDetector._graphs_lock:
+            PoseDetector.loaded_graphs += 1
+        return pose
+    
+    def reset(self):
+        """清空跟踪与平滑状态（切换到不相关的帧序列前调用）"""
+        self._roi = None
+        self._reset_tracking()
+    
+    def _reset_tracking(self):
+        """清空MediaPipe的跟踪与平滑状态（不支持reset时重建实例）"""
+        if hasattr(self.pose, 'reset'):
+            self.pose.reset()
+        else:
+            self.close()
+            self.pose = self._create_pose()
+    
+    def detect_landmarks(self, image):
+        """
+        只检测关键点，不拷贝图像、不绘制骨架
+        
+        Args:
+            image: BGR格式的图像（只读）
+            
+        Returns:
+            LandmarkFrame: 关键点，未检测到人体时为None
+        """
+        return self._extract_landmarks(self._process(image))
+    
+    def detect_full_landmarks(self, image):
+        """
+        检测MediaPipe的全部33个关键点（含手、脚跟、脚尖）及世界坐标
+        
+        Args:
+            image: BGR格式的图像（只读）
+            
+        Returns:
+            PoseLandmarks: 完整关键点，未检测到人体时为None
+        """
+        landmarks = self._extract_landmarks(self._process(image), full=True)
+        return None if landmarks is None else landmarks.full
     
-    def detect_pose(self, image):
+    def detect_pose(self, image, annotate=True):
         """
-        检测图像中的人体姿态
+        检测图像中的人体姿态，并在图像拷贝上绘制骨架
+        
+        只需要关键点时请使用 detect_landmarks。
         
         Args:
             image: BGR格式的图像
+            annotate: 是否拷贝图像并绘制骨架（False时等同于 detect_landmarks）
             
         Returns:
             landmarks: 关键点坐标字典
-            annotated_image: 标注后的图像
+            annotated_image: 标注后的图像（annotate=False时为None）
         """
-        # 转换为RGB
-        image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        if not annotate:
+            return self.detect_landmarks(image), None
         
-        # 检测姿态
-        results = self.pose.process(image_rgb)
+        results = self._process(image)
+        landmarks = self._extract_landmarks(results)
         
         # 绘制骨架
         annotated_image = image.copy()
@@ -46,46 +128,158 @@ class PoseDetector:
                 self.mp_drawing.DrawingSpec(color=(0, 0, 255), thickness=2)
             )
         
-        # 提取关键点
-        landmarks = self._extract_landmarks(results)
-        
         return landmarks, annotated_image
     
-    def _extract_landmarks(self, results):
-        """提取关键点坐标"""
+    def _process(self, image):
+        """
+        运行MediaPipe，返回关键点已换算为整帧坐标的原始结果
+        
+        Args:
+            image: BGR格式的图像
+        """
+        # 裁剪、缩小后转换为RGB
+        input_image, roi = self._prepare_input(image)
+        image_rgb = cv2.cvtColor(input_image, cv2.COLOR_BGR2RGB)
+        
+        # 检测姿态
+        start = time.perf_counter()
+        results = self.pose.process(image_rgb)
+        self._inference_seconds += time.perf_counter() - start
+        self._inference_count += 1
+        
+        # 关键点换算回整帧坐标，并确定下一帧的裁剪区域
+        if results.pose_landmarks and roi is not None:
+            self._remap_landmarks(results.pose_landmarks, roi, image.shape)
+        if self.roi_crop:
+            roi = self._next_roi(results.pose_landmarks, image.shape)
+            # 裁剪区域变化后输入坐标系随之改变，上一帧的跟踪框和平滑状态都已失效，
+            # 不清空会让MediaPipe沿用旧坐标系的结果
+            if roi != self._roi and not self.pose_options["static_image_mode"]:
+                self._reset_tracking()
+            self._roi = roi
+        
+        return results
+    
+    def pop_inference_stats(self):
+        """
+        取出并清零上次调用以来的推理统计
+        
+        Returns:
+            tuple: (推理次数, 推理总耗时秒数)
+        """
+        stats = (self._inference_count, self._inference_seconds)
+        self._inference_count = 0
+        self._inference_seconds = 0.0
+        return stats
+    
+    def _prepare_input(self, image):
+        """
+        取出送入MediaPipe的图像：按当前ROI裁剪，再缩小到长边上限
+        
+        归一化坐标与图像尺寸无关，缩放不需要换算；只有裁剪需要。
+        
+        Returns:
+            tuple: (输入图像, 裁剪区域或None)
+        """
+        roi = self._roi
+        if roi is not None:
+            x0, y0, x1, y1 = roi
+            image = image[y0:y1, x0:x1]
+        
+        if self.max_long_edge:
+            height, width = image.shape[:2]
+            scale = self.max_long_edge / max(height, width)
+            if scale < 1:
+                size = (max(1, round(width * scale)), max(1, round(height * scale)))
+                image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+        
+        return image, roi
+    
+    @staticmethod
+    def _remap_landmarks(pose_landmarks, roi, shape):
+        """把裁剪区域内的归一化坐标原地换算为整帧归一化坐标"""
+        height, width = shape[:2]
+        x0, y0, x1, y1 = roi
+        sx, sy = (x1 - x0) / width, (y1 - y0) / height
+        ox, oy = x0 / width, y0 / height
+        for lm in pose_landmarks.landmark:
+            lm.x = ox + lm.x * sx
+            lm.y = oy + lm.y * sy
+            # z与x同尺度（按输入图像宽度归一化）
+            lm.z = lm.z * sx
+    
+    def _next_roi(self, pose_landmarks, shape):
+        """
+        根据本帧的关键点确定下一帧的裁剪区域
+        
+        人体仍在当前区域内时保持区域不变，减少MediaPipe跟踪坐标系的跳变；
+        人体接近边缘时重新框选，跟丢时恢复整帧检测。
+        
+        Returns:
+            tuple: (x0, y0, x1, y1) 像素坐标，None表示下一帧使用整帧
+        """
+        if not pose_landmarks:
+            return None
+        
+        height, width = shape[:2]
+        points = np.array([(lm.x, lm.y, lm.visibility) for lm in pose_landmarks.landmark],
+                          dtype=np.float32)
+        visible = points[points[:, 2] > self.ROI_VISIBILITY_THRESHOLD]
+        if len(visible) < 2:
+            return None
+        
+        # 人体包围框（像素）
+        bx0, by0 = visible[:, 0].min() * width, visible[:, 1].min() * height
+        bx1, by1 = visible[:, 0].max() * width, visible[:, 1].max() * height
+        pad = max(bx1 - bx0, by1 - by0) * self.roi_padding
+        
+        # 当前区域留有一半外扩余量时继续使用
+        roi = self._roi
+        if roi is not None:
+            margin = pad / 2
+            x0, y0, x1, y1 = roi
+            if (bx0 - margin >= x0 or x0 == 0) and (by0 - margin >= y0 or y0 == 0) \
+                    and (bx1 + margin <= x1 or x1 == width) and (by1 + margin <= y1 or y1 == height):
+                return roi
+        
+        x0 = max(0, int(bx0 - pad))
+        y0 = max(0, int(by0 - pad))
+        x1 = min(width, int(np.ceil(bx1 + pad)))
+        y1 = min(height, int(np.ceil(by1 + pad)))
+        
+        # 区域几乎是整帧时不再裁剪
+        if (x1 - x0) * (y1 - y0) >= 0.8 * width * height or x1 - x0 < 2 or y1 - y0 < 2:
+            return None
+        return (x0, y0, x1, y1)
+    
+    def _extract_landmarks(self, results, full=False):
+        """
+        提取关键点坐标
+        
+        Args:
+            full: 同时提取全部33个点及世界坐标（full_landmarks=True 时总是提取）
+        
+        Returns:
+            LandmarkFrame: 基于 (关节数, 4) 数组的关键点，可按字典方式访问，
+                提取了完整关键点时 full 属性为 PoseLandmarks，否则为None；未检测到时为None
+        """
         if not results.pose_landmarks:
             return None
         
-        landmarks = {}
-        h, w = 1.0, 1.0  # 归一化坐标
+        if full or self.full_landmarks:
+            # 全部关键点和世界坐标一次性拷贝到float32数组，评分用的关节从中切出
+            return PoseLandmarks.from_results(
+                results.pose_landmarks, getattr(results, 'pose_world_landmarks', None)
+            ).joints()
         
-        # 提取关键点
+        # 热路径只拷贝评分用的关节（归一化坐标）
         lm = results.pose_landmarks.landmark
+        array = np.array(
+            [(lm[i].x, lm[i].y, lm[i].z, lm[i].visibility) for i in MEDIAPIPE_INDEX],
+            dtype=np.float32
+        )
         
-        landmarks = {
-            # 躯干
-            'nose': {'x': lm[0].x, 'y': lm[0].y, 'z': lm[0].z, 'visibility': lm[0].visibility},
-            'left_shoulder': {'x': lm[11].x, 'y': lm[11].y, 'z': lm[11].z, 'visibility': lm[11].visibility},
-            'right_shoulder': {'x': lm[12].x, 'y': lm[12].y, 'z': lm[12].z, 'visibility': lm[12].visibility},
-            
-            # 手臂
-            'left_elbow': {'x': lm[13].x, 'y': lm[13].y, 'z': lm[13].z, 'visibility': lm[13].visibility},
-            'right_elbow': {'x': lm[14].x, 'y': lm[14].y, 'z': lm[14].z, 'visibility': lm[14].visibility},
-            'left_wrist': {'x': lm[15].x, 'y': lm[15].y, 'z': lm[15].z, 'visibility': lm[15].visibility},
-            'right_wrist': {'x': lm[16].x, 'y': lm[16].y, 'z': lm[16].z, 'visibility': lm[16].visibility},
-            
-            # 髋部
-            'left_hip': {'x': lm[23].x, 'y': lm[23].y, 'z': lm[23].z, 'visibility': lm[23].visibility},
-            'right_hip': {'x': lm[24].x, 'y': lm[24].y, 'z': lm[24].z, 'visibility': lm[24].visibility},
-            
-            # 腿部
-            'left_knee': {'x': lm[25].x, 'y': lm[25].y, 'z': lm[25].z, 'visibility': lm[25].visibility},
-            'right_knee': {'x': lm[26].x, 'y': lm[26].y, 'z': lm[26].z, 'visibility': lm[26].visibility},
-            'left_ankle': {'x': lm[27].x, 'y': lm[27].y, 'z': lm[27].z, 'visibility': lm[27].visibility},
-            'right_ankle': {'x': lm[28].x, 'y': lm[28].y, 'z': lm[28].z, 'visibility': lm[28].visibility},
-        }
-        
-        return landmarks
+        return LandmarkFrame(array)
     
     @staticmethod
     def calculate_angle(point1, point2, point3):
@@ -114,6 +308,14 @@ class PoseDetector:
         
         return np.degrees(angle)
     
+    def close(self):
+        """释放MediaPipe图"""
+        pose, self.pose = getattr(self, 'pose', None), None
+        if pose is not None:
+            pose.close()
+            with PoseDetector._graphs_lock:
+                PoseDetector.loaded_graphs -= 1
+    
     def __del__(self):
-        self.pose.close()
+        self.close()
 
@@ -10,7 +10,6 @@ class VolleyballScorer:
     def __init__(self, template_path='template.json'):
         """初始化评分器"""
         self.template = self._load_template(template_path)
-        self.detector = PoseDetector()
     
     def _load_template(self, path):
         """加载标准动作模板"""
@@ -82,21 +81,21 @@ class VolleyballScorer:
         
         try:
             # 左臂角度（肩-肘-腕）
-            left_angle = self.detector.calculate_angle(
+            left_angle = PoseDetector.calculate_angle(
                 landmarks['left_shoulder'],
                 landmarks['left_elbow'],
                 landmarks['left_wrist']
             )
             
             # 右臂角度
-            right_angle = self.detector.calculate_angle(
+            right_angle = PoseDetector.calculate_angle(
                 landmarks['right_shoulder'],
                 landmarks['right_elbow'],
                 landmarks['right_wrist']
             )
             
             # 双臂夹角（左腕-左肩-右腕）
-            arm_gap = self.detector.calculate_angle(
+            arm_gap = PoseDetector.calculate_angle(
                 landmarks['left_wrist'],
                 {'x': (landmarks['left_shoulder']['x'] + landmarks['right_shoulder']['x']) / 2,
                  'y': (landmarks['left_shoulder']['y'] + landmarks['right_shoulder']['y']) / 2},
@@ -150,14 +149,14 @@ class VolleyballScorer:
         
         try:
             # 左膝角度（髋-膝-踝）
-            left_knee_angle = self.detector.calculate_angle(
+            left_knee_angle = PoseDetector.calculate_angle(
                 landmarks['left_hip'],
                 landmarks['left_knee'],
                 landmarks['left_ankle']
             )
             
             # 右膝角度
-            right_knee_angle = self.detector.calculate_angle(
+            right_knee_angle = PoseDetector.calculate_angle(
                 landmarks['right_hip'],
                 landmarks['right_knee'],
                 landmarks['right_ankle']
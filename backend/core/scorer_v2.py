@@ -9,13 +9,13 @@
 import numpy as np
 import json
 from .pose_detector import PoseDetector
+from .landmarks import LandmarkFrame, LandmarkSequence, JOINT_INDEX
 
 
 class VolleyballScorerV2:
     def __init__(self, template_path='template.json'):
         """初始化评分器"""
         self.template = self._load_template(template_path)
-        self.detector = PoseDetector()
         
         # 优化后的标准值（更宽松、更科学）
         self.standards = {
@@ -164,17 +164,11 @@ class VolleyballScorerV2:
                 'feedback': ['未检测到有效的动作序列']
             }
         
-        # 1. 评估每一帧
-        frame_scores = []
-        for landmarks in landmarks_sequence:
-            if landmarks is not None:
-                score_result = self.score_pose(landmarks)
-                frame_scores.append(score_result['total_score'])
-            else:
-                frame_scores.append(0)
+        # 1. 批量评估每一帧（数组运算，不生成反馈文本）
+        frame_scores = self.score_frames(landmarks_sequence)['total_score'].tolist()
         
         # 2. 找到最佳帧
-        best_frame_idx = np.argmax(frame_scores)
+        best_frame_idx = int(np.argmax(frame_scores))
         best_frame_score = frame_scores[best_frame_idx]
         
         # 3. 评估流畅度（相邻帧的变化率）
@@ -192,12 +186,13 @@ class VolleyballScorerV2:
             (completeness_score * 100) * 0.15
         )
         
-        # 6. 获取最佳帧的详细反馈
+        # 6. 获取最佳帧的详细反馈（只有这一帧需要生成反馈文本）
         best_landmarks = landmarks_sequence[best_frame_idx]
         if best_landmarks:
             best_frame_result = self.score_pose(best_landmarks)
             detailed_feedback = best_frame_result.get('feedback', [])
         else:
+            best_frame_result = None
             detailed_feedback = []
         
         # 7. 生成综合反馈（包含详细反馈 + 序列反馈）
@@ -230,23 +225,158 @@ class VolleyballScorerV2:
             'smoothness': smoothness_score,
             'completeness': completeness_score,
             'frame_scores': frame_scores,
+            'best_frame_detail': best_frame_result,
             'feedback': feedback
         }
     
+    def score_frames(self, landmarks_sequence):
+        """
+        批量评分：用数组运算一次算出所有帧的各项得分（不生成反馈文本）
+        
+        与逐帧调用 score_pose 的得分一致。
+        
+        Args:
+            landmarks_sequence: LandmarkSequence 或逐帧关键点列表（元素可为None）
+            
+        Returns:
+            dict: 'total_score'(int数组) 以及 'arm_score'、'body_score'、
+                  'position_score'、'stability_score'（float数组），未检测到人体的帧全部为0
+        """
+        # 缺少关节或字段的旧格式字典帧交给 score_pose 逐帧评分，保证与单帧结果一致
+        incomplete = {}
+        if not isinstance(landmarks_sequence, LandmarkSequence):
+            landmarks_list = list(landmarks_sequence)
+            incomplete = {
+                idx: landmarks for idx, landmarks in enumerate(landmarks_list)
+                if landmarks is not None and not LandmarkFrame.is_complete(landmarks)
+            }
+            landmarks_sequence = LandmarkSequence.from_frames(landmarks_list)
+        
+        present = landmarks_sequence.present
+        data = landmarks_sequence.data[present].astype(np.float64)
+        
+        def joint(name):
+            return data[:, JOINT_INDEX[name], :2]
+        
+        def mean_y(left, right):
+            return (joint(left)[:, 1] + joint(right)[:, 1]) / 2
+        
+        # 身高与自适应标准
+        nose_y = joint('nose')[:, 1]
+        ankle_y = mean_y('left_ankle', 'right_ankle')
+        shoulder_y = mean_y('left_shoulder', 'right_shoulder')
+        body_height = (np.abs(ankle_y - nose_y) + np.abs(ankle_y - shoulder_y) * 1.15) / 2
+        
+        height_factor = body_height / 0.7
+        tall = height_factor > 1.1
+        short = height_factor < 0.9
+        arm_min = np.where(tall, 145, self.standards["arm_angle_range"][0])
+        arm_min = np.where(short, 150, arm_min)
+        arm_max = np.where(tall | short, 180, self.standards["arm_angle_range"][1])
+        knee_min = np.where(tall, 65, np.where(short, 55, self.standards["knee_angle_range"][0]))
+        knee_max = np.where(tall, 125, np.where(short, 115, self.standards["knee_angle_range"][1]))
+        gap_min, gap_max = self.standards["arm_gap_range"]
+        
+        # 手臂
+        left_angle = self._angle_array(joint('left_shoulder'), joint('left_elbow'), joint('left_wrist'))
+        right_angle = self._angle_array(joint('right_shoulder'), joint('right_elbow'), joint('right_wrist'))
+        shoulder_center = (joint('left_shoulder') + joint('right_shoulder')) / 2
+        arm_gap = self._angle_array(joint('left_wrist'), shoulder_center, joint('right_wrist'))
+        arm_score = np.minimum(35, (
+            self._soft_range_score_array(left_angle, arm_min, arm_max, 12)
+            + self._soft_range_score_array(right_angle, arm_min, arm_max, 12)
+            + self._soft_range_score_array(arm_gap, gap_min, gap_max, 11)
+        ))
+        
+        # 身体重心
+        left_knee = self._angle_array(joint('left_hip'), joint('left_knee'), joint('left_ankle'))
+        right_knee = self._angle_array(joint('right_hip'), joint('right_knee'), joint('right_ankle'))
+        balance_score = np.maximum(0, 6 - np.abs(left_knee - right_knee) / 10)
+        body_score = np.minimum(30, (
+            self._soft_range_score_array(left_knee, knee_min, knee_max, 12)
+            + self._soft_range_score_array(right_knee, knee_min, knee_max, 12)
+            + balance_score
+        ))
+        
+        # 触球位置
+        wrist_y = mean_y('left_wrist', 'right_wrist')
+        hip_y = mean_y('left_hip', 'right_hip')
+        knee_y = mean_y('left_knee', 'right_knee')
+        shoulder_knee_range = np.abs(knee_y - shoulder_y)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            wrist_position = np.where(
+                shoulder_knee_range > 0, (wrist_y - shoulder_y) / shoulder_knee_range, 0
+            )
+            above_hip = np.maximum(0, 10 - (hip_y - wrist_y) / body_height * 50)
+            relative_below = (wrist_y - hip_y) / body_height
+        below_hip = np.where(relative_below < 0.3, 10, np.maximum(0, 10 - (relative_below - 0.3) * 30))
+        height_score = np.where(wrist_y < hip_y, above_hip, below_hip)
+        position_score = np.minimum(25, (
+            self._soft_range_score_array(wrist_position, 0.5, 1.3, 15) + height_score
+        ))
+        # 身高为0时逐帧算法会因除零异常得0分
+        position_score = np.where(body_height == 0, 0, position_score)
+        
+        # 稳定性
+        stability_rows = [JOINT_INDEX[name] for name in (
+            'left_shoulder', 'right_shoulder', 'left_elbow', 'right_elbow',
+            'left_wrist', 'right_wrist', 'left_hip', 'right_hip',
+            'left_knee', 'right_knee')]
+        visibility = np.ascontiguousarray(landmarks_sequence.data[present][:, stability_rows, 3], dtype=np.float64)
+        stability_score = np.minimum(10, visibility.mean(axis=1) * 10)
+        
+        num_frames = len(landmarks_sequence)
+        scores = {}
+        for key, values in (('arm_score', arm_score), ('body_score', body_score),
+                            ('position_score', position_score), ('stability_score', stability_score)):
+            scores[key] = np.zeros(num_frames, dtype=np.float64)
+            scores[key][present] = values
+        
+        total = np.zeros(num_frames, dtype=int)
+        total[present] = (arm_score + body_score + position_score + stability_score).astype(int)
+        scores['total_score'] = total
+        
+        for idx, landmarks in incomplete.items():
+            frame_result = self.score_pose(landmarks)
+            for key in scores:
+                scores[key][idx] = frame_result[key]
+        
+        return scores
+    
+    @staticmethod
+    def _angle_array(p1, p2, p3):
+        """批量计算三点夹角（p2为顶点），输入形状 (N, 2)，与 calculate_angle 一致"""
+        v1 = p1 - p2
+        v2 = p3 - p2
+        # 用逐行matmul计算点积和模长，与单帧的 np.dot / np.linalg.norm 结果逐位一致
+        dot = np.matmul(v1[:, None, :], v2[:, :, None])[:, 0, 0]
+        norm1 = np.sqrt(np.matmul(v1[:, None, :], v1[:, :, None])[:, 0, 0])
+        norm2 = np.sqrt(np.matmul(v2[:, None, :], v2[:, :, None])[:, 0, 0])
+        cos_angle = dot / (norm1 * norm2 + 1e-6)
+        return np.degrees(np.arccos(np.clip(cos_angle, -1.0, 1.0)))
+    
+    @staticmethod
+    def _soft_range_score_array(values, min_val, max_val, max_score):
+        """_soft_range_score 的数组版本（min_val/max_val 可以是逐帧数组）"""
+        tolerance = (np.asarray(max_val) - min_val) * 0.5
+        below = np.maximum(0, max_score * (1 - (min_val - values) / tolerance))
+        above = np.maximum(0, max_score * (1 - (values - max_val) / tolerance))
+        return np.where(values < min_val, below, np.where(values > max_val, above, max_score))
+    
     def _score_arms_v2(self, landmarks, standards):
         """评分手臂姿态（优化版）"""
         feedback = []
         
         try:
             # 左臂角度
-            left_angle = self.detector.calculate_angle(
+            left_angle = PoseDetector.calculate_angle(
                 landmarks['left_shoulder'],
                 landmarks['left_elbow'],
                 landmarks['left_wrist']
             )
             
             # 右臂角度
-            right_angle = self.detector.calculate_angle(
+            right_angle = PoseDetector.calculate_angle(
                 landmarks['right_shoulder'],
                 landmarks['right_elbow'],
                 landmarks['right_wrist']
@@ -257,7 +387,7 @@ class VolleyballScorerV2:
                 'x': (landmarks['left_shoulder']['x'] + landmarks['right_shoulder']['x']) / 2,
                 'y': (landmarks['left_shoulder']['y'] + landmarks['right_shoulder']['y']) / 2
             }
-            arm_gap = self.detector.calculate_angle(
+            arm_gap = PoseDetector.calculate_angle(
                 landmarks['left_wrist'],
                 shoulder_center,
                 landmarks['right_wrist']
@@ -308,13 +438,13 @@ class VolleyballScorerV2:
         
         try:
             # 膝盖角度
-            left_knee_angle = self.detector.calculate_angle(
+            left_knee_angle = PoseDetector.calculate_angle(
                 landmarks['left_hip'],
                 landmarks['left_knee'],
                 landmarks['left_ankle']
             )
             
-            right_knee_angle = self.detector.calculate_angle(
+            right_knee_angle = PoseDetector.calculate_angle(
                 landmarks['right_hip'],
                 landmarks['right_knee'],
                 landmarks['right_ankle']
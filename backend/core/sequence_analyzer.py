@@ -1,29 +1,118 @@
 """
 序列分析模块 - 连续帧动作分析
 """
+import json
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
 import numpy as np
 import cv2
 from .pose_detector import PoseDetector
+from .detector_pool import get_default_pool
+from .landmarks import LandmarkSequence, JOINT_INDEX
+from .frame_reader import iter_sampled_frames
+from .frame_source import FrameSource
+from .keyframes import select_keyframes, interpolate_landmarks
+from .video_processor import VideoProcessor
+
+
+# 进程池工作进程内常驻的检测器（每个进程各自持有一个MediaPipe Pose实例）
+_worker_detector = None
+
+
+def _init_pose_worker(detector_options=None):
+    """进程池初始化：在工作进程中预热检测器（参数与主进程的检测器池一致）"""
+    global _worker_detector
+    _worker_detector = PoseDetector(**(detector_options or {}))
+
+
+def _detect_shard(warmup_frames, frames, annotate=False):
+    """
+    在工作进程中检测一个分片的所有帧
+    
+    Args:
+        warmup_frames: 分片前的若干帧，只用于重新建立跟踪状态，结果丢弃
+        frames: 分片内需要检测的帧
+        annotate: 是否返回标注图像
+        
+    Returns:
+        tuple: ([(landmarks, annotated_image), ...], (推理次数, 推理总耗时秒数))，
+               annotate=False时标注图像为None
+    """
+    # 同一进程可能先后处理不相邻的分片，先清空上一分片留下的跟踪状态
+    _worker_detector.reset()
+    _worker_detector.pop_inference_stats()
+    for frame in warmup_frames:
+        _worker_detector.detect_landmarks(frame)
+    detections = [_worker_detector.detect_pose(frame, annotate=annotate) for frame in frames]
+    return detections, _worker_detector.pop_inference_stats()
 
 
 class SequenceAnalyzer:
     """分析视频序列中的动作连贯性和轨迹"""
     
-    def __init__(self):
-        self.detector = PoseDetector()
+    # 每个工作进程至少分到的帧数，帧数太少时并行不划算
+    MIN_FRAMES_PER_WORKER = 8
+    
+    # 序列分析的采样率（每秒帧数）
+    SAMPLE_FPS = 2
     
-    def analyze_sequence(self, video_path_or_frames):
+    def __init__(self, pose_workers=0, shard_warmup_frames=2, detector_pool=None,
+                 sparse_inference=False, keyframe_max_gap=6, keyframe_motion_step=8.0):
+        """
+        Args:
+            pose_workers: 姿态检测进程数（0或1表示串行检测）
+            shard_warmup_frames: 每个分片开头用于重建跟踪的前序帧数
+            detector_pool: 共享的检测器池（默认使用进程级共享池）
+            sparse_inference: 只在按运动量挑选的关键帧上检测，其余帧插值
+            keyframe_max_gap: 稀疏模式下相邻关键帧的最大间隔
+            keyframe_motion_step: 稀疏模式下相邻关键帧之间允许累计的帧差（灰度0~255）
+        """
+        self.detector_pool = detector_pool or get_default_pool()
+        self.pose_workers = pose_workers
+        self.shard_warmup_frames = shard_warmup_frames
+        self.sparse_inference = sparse_inference
+        self.keyframe_max_gap = keyframe_max_gap
+        self.keyframe_motion_step = keyframe_motion_step
+        self.video_processor = VideoProcessor()
+        self._pools = {}  # 检测器参数(JSON) -> 进程池，不同配置档位各用一个
+        self._pool_lock = threading.Lock()
+    
+    def analyze_sequence(self, video_path_or_frames, keep_annotated_frames=False, detector_pool=None,
+                         progress=None):
         """
         分析连续帧序列
         
+        默认只检测关键点，不为每一帧拷贝图像和绘制骨架；需要展示的帧
+        （如 best_frame_idx）由调用方在评分后单独标注。
+        
         Args:
-            video_path_or_frames: 视频文件路径(str) 或 视频帧列表(list)
+            video_path_or_frames: 视频文件路径(str)、视频帧列表(list)
+                或 FrameSource（只检测采样到的、存储中还没有关键点的帧，结果写回存储）
+            keep_annotated_frames: 是否保留每一帧的标注图像（annotated_frames），
+                输入为FrameSource时无效；保留标注图像时不使用稀疏推理
+            detector_pool: 本次检测使用的检测器池（None表示 self.detector_pool）
+            progress: 输入为FrameSource时的检测进度回调 progress(fraction)（0~1）
             
         Returns:
-            dict: 包含所有帧的分析结果
+            dict: 包含所有帧的分析结果；inferred_frames 列出实际做了姿态检测的帧，
+                  其余帧的关键点由插值得到（frames_data 中 interpolated 为True）；
+                  输入为FrameSource时，frame_indices 给出每个分析帧在FrameSource中的索引
         """
+        frame_indices = None
+        
         # 判断输入类型
-        if isinstance(video_path_or_frames, str):
+        if isinstance(video_path_or_frames, FrameSource):
+            source = video_path_or_frames
+            frame_indices = source.sample_indices(self.SAMPLE_FPS)
+            if not frame_indices:
+                return {
+                    "success": False,
+                    "error": "无法从视频中提取帧"
+                }
+        elif isinstance(video_path_or_frames, str):
             # 如果是字符串，认为是视频路径
             frames = self._extract_frames_from_video(video_path_or_frames)
             if frames is None or len(frames) == 0:
@@ -41,176 +130,273 @@ class SequenceAnalyzer:
             'completeness_score': 0,  # 完整性得分
             'consistency_score': 0,  # 一致性得分
             'best_frame_idx': 0,  # 最佳帧索引
+            'landmark_sequence': None,  # 关键点数组 (帧数, 关节数, 4)
         }
         
-        # 分析每一帧
-        all_landmarks = []
-        annotated_frames = []
+        if frame_indices is not None:
+            # 只检测采样帧中存储里还没有关键点的帧
+            source.ensure_landmarks(
+                frame_indices, lambda frames: self.detect_sequence(frames, detector_pool), progress,
+                min_chunk_frames=self.min_parallel_frames
+            )
+            annotated_frames = None
+            landmark_sequence = source.landmarks.take(frame_indices)
+            inferred = source.inferred[frame_indices]
+            results['frame_indices'] = frame_indices
+        elif self.sparse_inference and not keep_annotated_frames:
+            # 只检测关键帧，其余帧插值
+            annotated_frames = None
+            landmark_sequence, inferred = self._detect_frames_sparse(frames, detector_pool)
+        else:
+            # 分析每一帧
+            detections = self._detect_frames(frames, annotate=keep_annotated_frames,
+                                             detector_pool=detector_pool)
+            if keep_annotated_frames:
+                annotated_frames = [annotated for _, annotated in detections]
+            else:
+                annotated_frames = None
+            
+            # 整段视频的关键点放进一个连续数组，逐帧数据只是其中的视图
+            landmark_sequence = LandmarkSequence.from_frames(
+                [landmarks for landmarks, _ in detections]
+            )
+            inferred = np.ones(len(landmark_sequence), dtype=bool)
         
-        for idx, frame in enumerate(frames):
-            landmarks, annotated = self.detector.detect_pose(frame)
+        for idx, landmarks in enumerate(landmark_sequence):
             results['frames_data'].append({
                 'frame_idx': idx,
                 'landmarks': landmarks,
-                'has_pose': landmarks is not None
+                'has_pose': landmarks is not None,
+                'interpolated': not inferred[idx]
             })
-            all_landmarks.append(landmarks)
-            annotated_frames.append(annotated)
+        
+        results['inferred_frames'] = np.flatnonzero(inferred).tolist()
+        
+        results['landmark_sequence'] = landmark_sequence
         
         # 计算轨迹
-        results['trajectories'] = self._calculate_trajectories(all_landmarks)
+        results['trajectories'] = self._calculate_trajectories(landmark_sequence)
         
         # 计算流畅度
-        results['smoothness_score'] = self._calculate_smoothness(all_landmarks)
+        results['smoothness_score'] = self._calculate_smoothness(landmark_sequence)
         
         # 计算完整性
-        results['completeness_score'] = self._calculate_completeness(all_landmarks)
+        results['completeness_score'] = self._calculate_completeness(landmark_sequence)
         
         # 计算一致性
-        results['consistency_score'] = self._calculate_consistency(all_landmarks)
+        results['consistency_score'] = self._calculate_consistency(landmark_sequence)
         
         # 找到最佳帧（用于主要评分）
-        results['best_frame_idx'] = self._find_best_frame(all_landmarks)
+        results['best_frame_idx'] = self._find_best_frame(landmark_sequence)
         
-        results['annotated_frames'] = annotated_frames
+        if annotated_frames is not None:
+            results['annotated_frames'] = annotated_frames
         results['success'] = True  # 添加成功标志
         
         return results
     
-    def _calculate_trajectories(self, landmarks_list):
-        """计算关键点的运动轨迹"""
-        trajectories = {}
+    @property
+    def min_parallel_frames(self):
+        """一次检测至少需要的帧数，达到时才走并行检测（串行模式为0）"""
+        workers = self.pose_workers or 0
+        return workers * self.MIN_FRAMES_PER_WORKER if workers > 1 else 0
+    
+    def detect_sequence(self, frames, detector_pool=None):
+        """
+        检测一段连续帧的关键点（按配置选择稀疏推理、并行或串行检测）
+        
+        Args:
+            frames: 帧列表
+            detector_pool: 使用的检测器池（None表示 self.detector_pool）
+        
+        Returns:
+            tuple: (LandmarkSequence, inferred)，inferred 标记每帧是否实际做了检测
+        """
+        if self.sparse_inference:
+            return self._detect_frames_sparse(frames, detector_pool)
+        detections = self._detect_frames(frames, detector_pool=detector_pool)
+        sequence = LandmarkSequence.from_frames([landmarks for landmarks, _ in detections])
+        return sequence, np.ones(len(sequence), dtype=bool)
+    
+    def _detect_frames(self, frames, annotate=False, detector_pool=None):
+        """
+        检测所有帧的姿态，按原顺序返回 [(landmarks, annotated_image), ...]
+        
+        开启并行模式时，帧序列被切成连续分片分发到进程池；
+        每个分片先用前面几帧重建跟踪状态，再合并回原顺序。
+        """
+        frames = list(frames)
+        detector_pool = detector_pool or self.detector_pool
+        if self.min_parallel_frames and len(frames) >= self.min_parallel_frames:
+            try:
+                return self._detect_frames_parallel(frames, self.pose_workers, annotate, detector_pool)
+            except (BrokenProcessPool, OSError) as e:
+                print(f"⚠️ 并行姿态检测失败，回退到串行: {str(e)}")
+                self.close()
+        
+        with detector_pool.detector() as detector:
+            return [detector.detect_pose(frame, annotate=annotate) for frame in frames]
+    
+    def _detect_frames_sparse(self, frames, detector_pool=None):
+        """
+        稀疏推理：按帧差挑选关键帧，只检测关键帧，中间帧线性插值
+        
+        Returns:
+            tuple: (LandmarkSequence, inferred)，inferred 标记每帧是否实际做了检测
+        """
+        frames = list(frames)
+        motion = self.video_processor.motion_signal(frames)
+        keyframes = select_keyframes(motion, self.keyframe_max_gap, self.keyframe_motion_step)
+        
+        detections = self._detect_frames([frames[idx] for idx in keyframes], detector_pool=detector_pool)
+        keyframe_landmarks = LandmarkSequence.from_frames([landmarks for landmarks, _ in detections])
+        sequence = interpolate_landmarks(keyframes, keyframe_landmarks, len(frames))
+        
+        inferred = np.zeros(len(frames), dtype=bool)
+        inferred[keyframes] = True
+        print(f"🎯 稀疏推理: {len(keyframes)}/{len(frames)} 帧做姿态检测，其余帧插值")
+        return sequence, inferred
+    
+    def _detect_frames_parallel(self, frames, workers, annotate=False, detector_pool=None):
+        """在进程池中分片检测姿态（工作进程的检测器参数与 detector_pool 一致）"""
+        detector_pool = detector_pool or self.detector_pool
+        detector_options = detector_pool.detector_options
+        pool_key = json.dumps(detector_options, sort_keys=True, default=str)
+        with self._pool_lock:
+            pool = self._pools.get(pool_key)
+            if pool is None:
+                # 使用spawn避免在已有线程的进程（如Streamlit）中fork出问题
+                pool = self._pools[pool_key] = ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_pose_worker,
+                    initargs=(detector_options,)
+                )
+        
+        shard_size = -(-len(frames) // workers)
+        futures = []
+        for start in range(0, len(frames), shard_size):
+            warmup_start = max(0, start - self.shard_warmup_frames)
+            futures.append(pool.submit(
+                _detect_shard,
+                frames[warmup_start:start],
+                frames[start:start + shard_size],
+                annotate
+            ))
+        
+        detections = []
+        for future in futures:
+            shard_detections, inference_stats = future.result()
+            detections.extend(shard_detections)
+            # 工作进程中的推理不经过检测器池，在这里计入统计
+            detector_pool.record(*inference_stats)
+        return detections
+    
+    def close(self):
+        """关闭姿态检测进程池"""
+        with self._pool_lock:
+            pools, self._pools = list(self._pools.values()), {}
+        for pool in pools:
+            pool.shutdown(wait=True, cancel_futures=True)
+    
+    @staticmethod
+    def _masked_joints(landmark_sequence, joint_names):
+        """
+        取出若干关节在所有帧上的数据
         
+        Returns:
+            np.ma.MaskedArray: (帧数, 关节数, 4) 的float64数组，未检测到人体的帧被屏蔽
+        """
+        rows = [JOINT_INDEX[name] for name in joint_names]
+        data = landmark_sequence.data[:, rows].astype(np.float64)
+        mask = np.broadcast_to(~landmark_sequence.present[:, None, None], data.shape)
+        return np.ma.masked_array(data, mask=mask)
+    
+    def _calculate_trajectories(self, landmark_sequence):
+        """计算关键点的运动轨迹"""
         # 关键点列表
         key_points = ['left_wrist', 'right_wrist', 'left_elbow', 'right_elbow',
                      'left_shoulder', 'right_shoulder', 'left_hip', 'right_hip',
                      'left_knee', 'right_knee']
         
-        for point in key_points:
-            trajectory = {
-                'x': [],
-                'y': [],
-                'visibility': []
+        joints = self._masked_joints(landmark_sequence, key_points)
+        # 缺失帧的坐标为None、可见度为0
+        missing = np.ma.getmaskarray(joints[..., 0])
+        xs = np.where(missing, None, joints[..., 0].data)
+        ys = np.where(missing, None, joints[..., 1].data)
+        visibilities = np.where(missing, 0, joints[..., 3].data)
+        
+        trajectories = {}
+        for col, point in enumerate(key_points):
+            trajectories[point] = {
+                'x': xs[:, col].tolist(),
+                'y': ys[:, col].tolist(),
+                'visibility': visibilities[:, col].tolist()
             }
-            
-            for landmarks in landmarks_list:
-                if landmarks and point in landmarks:
-                    trajectory['x'].append(landmarks[point]['x'])
-                    trajectory['y'].append(landmarks[point]['y'])
-                    trajectory['visibility'].append(landmarks[point].get('visibility', 0))
-                else:
-                    trajectory['x'].append(None)
-                    trajectory['y'].append(None)
-                    trajectory['visibility'].append(0)
-            
-            trajectories[point] = trajectory
         
         return trajectories
     
-    def _calculate_smoothness(self, landmarks_list):
+    def _calculate_smoothness(self, landmark_sequence):
         """
         计算动作流畅度
         基于关键点移动的平滑程度
         """
-        if len(landmarks_list) < 3:
+        if len(landmark_sequence) < 3:
             return 50.0  # 帧数太少，给个中等分
         
-        # 计算手腕的加速度变化（衡量流畅度）
-        smoothness_scores = []
+        # 计算手腕的加速度变化（衡量流畅度），跳过未检测到人体的帧
+        wrists = self._masked_joints(landmark_sequence, ['left_wrist', 'right_wrist'])
+        positions = np.ma.compress_rows(wrists[..., :2].reshape(len(wrists), -1)).reshape(-1, 2, 2)
         
-        for point in ['left_wrist', 'right_wrist']:
-            positions = []
-            for landmarks in landmarks_list:
-                if landmarks and point in landmarks:
-                    positions.append([landmarks[point]['x'], landmarks[point]['y']])
-                else:
-                    positions.append(None)
-            
-            # 过滤None值
-            valid_positions = [p for p in positions if p is not None]
-            
-            if len(valid_positions) < 3:
-                continue
-            
-            # 计算速度变化
-            velocities = []
-            for i in range(1, len(valid_positions)):
-                dx = valid_positions[i][0] - valid_positions[i-1][0]
-                dy = valid_positions[i][1] - valid_positions[i-1][1]
-                velocity = np.sqrt(dx**2 + dy**2)
-                velocities.append(velocity)
-            
-            if len(velocities) < 2:
-                continue
-            
-            # 计算加速度变化（越小越流畅）
-            accelerations = []
-            for i in range(1, len(velocities)):
-                acc = abs(velocities[i] - velocities[i-1])
-                accelerations.append(acc)
-            
-            # 标准差越小越流畅
-            if len(accelerations) > 0:
-                std = np.std(accelerations)
-                # 转换为0-100分（标准差越小分数越高）
-                score = max(0, 100 - std * 1000)
-                smoothness_scores.append(score)
-        
-        if len(smoothness_scores) == 0:
+        if len(positions) < 3:
             return 50.0
         
+        # 速度 (有效帧数-1, 2)，加速度变化 (有效帧数-2, 2)，每列对应一只手腕
+        velocities = np.sqrt((np.diff(positions, axis=0) ** 2).sum(axis=2))
+        accelerations = np.abs(np.diff(velocities, axis=0))
+        
+        # 标准差越小越流畅，转换为0-100分
+        std = np.ascontiguousarray(accelerations.T).std(axis=1)
+        smoothness_scores = np.maximum(0, 100 - std * 1000)
+        
         return np.mean(smoothness_scores)
     
-    def _calculate_completeness(self, landmarks_list):
+    def _calculate_completeness(self, landmark_sequence):
         """
         计算动作完整性
         检查是否有完整的动作序列
         """
-        if len(landmarks_list) == 0:
+        if len(landmark_sequence) == 0:
             return 0.0
         
         # 统计有效帧的比例
-        valid_frames = sum(1 for lm in landmarks_list if lm is not None)
-        completeness = (valid_frames / len(landmarks_list)) * 100
+        valid_frames = int(landmark_sequence.present.sum())
+        completeness = (valid_frames / len(landmark_sequence)) * 100
         
-        # 检查关键点的可见度
+        # 检查关键点的可见度（有效帧上4个关键点的平均可见度）
         if valid_frames > 0:
-            avg_visibility = []
-            for landmarks in landmarks_list:
-                if landmarks:
-                    visibilities = [landmarks[point].get('visibility', 0) 
-                                  for point in ['left_wrist', 'right_wrist', 'left_shoulder', 'right_shoulder']
-                                  if point in landmarks]
-                    if visibilities:
-                        avg_visibility.append(np.mean(visibilities))
-            
-            if avg_visibility:
-                visibility_score = np.mean(avg_visibility) * 100
-                completeness = (completeness + visibility_score) / 2
+            joints = self._masked_joints(
+                landmark_sequence, ['left_wrist', 'right_wrist', 'left_shoulder', 'right_shoulder']
+            )
+            avg_visibility = np.ma.compressed(joints[..., 3].mean(axis=1))
+            visibility_score = np.mean(avg_visibility) * 100
+            completeness = (completeness + visibility_score) / 2
         
         return completeness
     
-    def _calculate_consistency(self, landmarks_list):
+    def _calculate_consistency(self, landmark_sequence):
         """
         计算动作一致性
         检查整个动作过程中姿态的一致性
         """
-        if len(landmarks_list) < 2:
+        if len(landmark_sequence) < 2:
             return 50.0
         
         # 计算双臂对称性（左右手腕的相对位置）
-        symmetry_scores = []
-        
-        for landmarks in landmarks_list:
-            if not landmarks:
-                continue
-            
-            if 'left_wrist' in landmarks and 'right_wrist' in landmarks:
-                # 计算双手高度差
-                height_diff = abs(landmarks['left_wrist']['y'] - landmarks['right_wrist']['y'])
-                # 转换为分数（差异越小越好）
-                score = max(0, 100 - height_diff * 200)
-                symmetry_scores.append(score)
+        wrists = self._masked_joints(landmark_sequence, ['left_wrist', 'right_wrist'])
+        height_diff = np.abs(wrists[:, 0, 1] - wrists[:, 1, 1])
+        # 转换为分数（差异越小越好），只保留有效帧
+        symmetry_scores = np.ma.compressed(np.ma.maximum(0, 100 - height_diff * 200))
         
         if len(symmetry_scores) == 0:
             return 50.0
@@ -224,40 +410,26 @@ class SequenceAnalyzer:
         
         return max(0, min(100, consistency))
     
-    def _find_best_frame(self, landmarks_list):
+    def _find_best_frame(self, landmark_sequence):
         """
         找到最佳帧（用于主要评分）
         选择姿态最标准、最清晰的一帧
         """
-        if len(landmarks_list) == 0:
+        total = len(landmark_sequence)
+        if total == 0 or not landmark_sequence.present.any():
             return 0
         
-        best_score = -1
-        best_idx = 0
+        # 评估标准：关键点可见度
+        key_points = ['left_wrist', 'right_wrist', 'left_elbow', 'right_elbow',
+                     'left_shoulder', 'right_shoulder', 'left_knee', 'right_knee']
+        scores = self._masked_joints(landmark_sequence, key_points)[..., 3].mean(axis=1)
         
-        for idx, landmarks in enumerate(landmarks_list):
-            if landmarks is None:
-                continue
-            
-            # 评估标准：关键点可见度
-            key_points = ['left_wrist', 'right_wrist', 'left_elbow', 'right_elbow',
-                         'left_shoulder', 'right_shoulder', 'left_knee', 'right_knee']
-            
-            visibilities = [landmarks[point].get('visibility', 0) 
-                          for point in key_points if point in landmarks]
-            
-            if len(visibilities) > 0:
-                score = np.mean(visibilities)
-                
-                # 偏好中间帧（避免开始和结束的不稳定帧）
-                middle_bonus = 1.0 - abs(idx - len(landmarks_list) / 2) / (len(landmarks_list) / 2) * 0.2
-                score *= middle_bonus
-                
-                if score > best_score:
-                    best_score = score
-                    best_idx = idx
-        
-        return best_idx
+        # 偏好中间帧（避免开始和结束的不稳定帧）
+        middle_bonus = 1.0 - np.abs(np.arange(total) - total / 2) / (total / 2) * 0.2
+        scores = scores * middle_bonus
+        
+        # 并列时取最靠前的一帧
+        return int(np.ma.argmax(scores, fill_value=-np.inf))
     
     def get_sequence_summary(self, sequence_result):
         """
@@ -329,24 +501,11 @@ class SequenceAnalyzer:
             if not cap.isOpened():
                 return None
             
-            frames = []
             fps = cap.get(cv2.CAP_PROP_FPS)
             
-            # 每秒提取2帧
-            frame_interval = max(1, int(fps / 2))
-            frame_count = 0
-            
-            while cap.isOpened():
-                ret, frame = cap.read()
-                if not ret:
-                    break
-                
-                if frame_count % frame_interval == 0:
-                    # 确保帧是有效的numpy数组
-                    if frame is not None and isinstance(frame, np.ndarray):
-                        frames.append(frame)
-                
-                frame_count += 1
+            # 每秒提取2帧（跳过的帧只grab不解码）
+            frame_interval = max(1, int(fps / self.SAMPLE_FPS))
+            frames = list(iter_sampled_frames(cap, frame_interval))
             
             cap.release()
             return frames
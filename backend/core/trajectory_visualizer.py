@@ -1,6 +1,8 @@
 """
 轨迹可视化模块 - 绘制动作轨迹
 """
+import threading
+
 import cv2
 import numpy as np
 from matplotlib import pyplot as plt
@@ -9,6 +11,10 @@ import io
 from PIL import Image
 
 
+# pyplot 的"当前图"是进程级全局状态，多个线程同时绘图需要串行
+_pyplot_lock = threading.Lock()
+
+
 class TrajectoryVisualizer:
     """可视化关键点运动轨迹"""
     
@@ -70,7 +76,7 @@ class TrajectoryVisualizer:
     
     def create_trajectory_plot(self, trajectories, frame_width=640, frame_height=480):
         """
-        创建2D轨迹图
+        创建2D轨迹图（可在多个线程中同时调用）
         
         Args:
             trajectories: 轨迹数据
@@ -80,6 +86,11 @@ class TrajectoryVisualizer:
         Returns:
             PIL Image对象
         """
+        with _pyplot_lock:
+            return self._create_trajectory_plot(trajectories, frame_width, frame_height)
+    
+    def _create_trajectory_plot(self, trajectories, frame_width, frame_height):
+        """绘制轨迹图（调用方持有 _pyplot_lock）"""
         fig, ax = plt.subplots(figsize=(10, 8))
         
         # 设置坐标轴
@@ -154,8 +165,8 @@ class TrajectoryVisualizer:
         angles_left = []
         angles_right = []
         
+        # calculate_angle 是静态方法，不需要加载MediaPipe图
         from .pose_detector import PoseDetector
-        detector = PoseDetector()
         
         for landmarks in landmarks_list:
             if landmarks is None:
@@ -166,24 +177,24 @@ class TrajectoryVisualizer:
             try:
                 if angle_type == 'arm':
                     # 手臂角度（肩-肘-腕）
-                    left_angle = detector.calculate_angle(
+                    left_angle = PoseDetector.calculate_angle(
                         landmarks['left_shoulder'],
                         landmarks['left_elbow'],
                         landmarks['left_wrist']
                     )
-                    right_angle = detector.calculate_angle(
+                    right_angle = PoseDetector.calculate_angle(
                         landmarks['right_shoulder'],
                         landmarks['right_elbow'],
                         landmarks['right_wrist']
                     )
                 else:  # knee
                     # 膝盖角度（髋-膝-踝）
-                    left_angle = detector.calculate_angle(
+                    left_angle = PoseDetector.calculate_angle(
                         landmarks['left_hip'],
                         landmarks['left_knee'],
                         landmarks['left_ankle']
                     )
-                    right_angle = detector.calculate_angle(
+                    right_angle = PoseDetector.calculate_angle(
                         landmarks['right_hip'],
                         landmarks['right_knee'],
                         landmarks['right_ankle']
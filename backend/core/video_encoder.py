@@ -0,0 +1,193 @@
+"""
+视频编码模块 - 通过管道把原始帧直接送入FFmpeg
+"""
+import os
+import shutil
+import subprocess
+import threading
+
+import cv2
+import numpy as np
+
+
+class VideoEncoder:
+    """
+    流式视频编码器
+
+    启动一个常驻FFmpeg进程，通过stdin以rawvideo(bgr24)格式逐帧写入，
+    不落地任何临时图片；FFmpeg不可用时回退到cv2.VideoWriter。
+    """
+
+    # 依次尝试的编码方案（浏览器兼容性优先）
+    CODECS = [
+        ('h264_hq', ['-c:v', 'h264', '-pix_fmt', 'yuv420p', '-b:v', '5M']),  # H.264高码率
+        ('h264', ['-c:v', 'h264', '-pix_fmt', 'yuv420p']),  # H.264标准
+        ('mpeg4_hq', ['-c:v', 'mpeg4', '-q:v', '2', '-pix_fmt', 'yuv420p']),  # MPEG4高质量
+        ('mpeg4', ['-c:v', 'mpeg4', '-q:v', '5'])  # MPEG4标准
+    ]
+
+    # yuv420p要求宽高为偶数，奇数尺寸的帧在右侧/下方补一行像素
+    EVEN_SIZE_FILTER = ['-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2']
+
+    # 进程内按帧尺寸缓存探测结果，避免每个视频都重新探测编码器；
+    # 探测期间持有锁，并发任务等待同一次探测的结果
+    _probed_codecs = {}
+    _probe_lock = threading.Lock()
+
+    def __init__(self, output_path, fps):
+        """
+        Args:
+            output_path: 输出视频路径
+            fps: 输出视频帧率
+        """
+        self.output_path = str(output_path)
+        self.fps = fps
+        self.width = None
+        self.height = None
+        self.frame_count = 0
+        self.backend = None  # 'ffmpeg' 或 'opencv'
+        self._process = None
+        self._writer = None
+
+    @classmethod
+    def probe_codec(cls, width=64, height=64):
+        """
+        探测指定帧尺寸下可用的FFmpeg编码方案（结果在进程内缓存）
+
+        Args:
+            width, height: 实际要编码的帧尺寸
+
+        Returns:
+            tuple: (codec_name, codec_args)，FFmpeg不可用时返回None
+        """
+        size = (width, height)
+        with cls._probe_lock:
+            if size not in cls._probed_codecs:
+                cls._probed_codecs[size] = cls._probe(width, height)
+            return cls._probed_codecs[size]
+
+    @classmethod
+    def _probe(cls, width, height):
+        """按优先级试编码一帧与实际输入相同格式、相同尺寸的黑帧，返回第一个成功的方案"""
+        if shutil.which('ffmpeg') is None:
+            return None
+
+        blank = bytes(width * height * 3)
+        for codec_name, codec_args in cls.CODECS:
+            cmd = [
+                'ffmpeg', '-hide_banner', '-loglevel', 'error',
+                '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-s', f'{width}x{height}', '-i', '-'
+            ] + cls.EVEN_SIZE_FILTER + codec_args + ['-f', 'null', '-']
+            try:
+                result = subprocess.run(cmd, input=blank, capture_output=True, timeout=10)
+            except (OSError, subprocess.TimeoutExpired):
+                continue
+            if result.returncode == 0:
+                return (codec_name, codec_args)
+
+        return None
+
+    def _open(self, frame):
+        """根据第一帧的尺寸打开编码器"""
+        self.height, self.width = frame.shape[:2]
+
+        codec = self.probe_codec(self.width, self.height)
+        if codec is not None:
+            codec_name, codec_args = codec
+            cmd = [
+                'ffmpeg', '-y', '-hide_banner', '-loglevel', 'error',
+                '-f', 'rawvideo',
+                '-pix_fmt', 'bgr24',
+                '-s', f'{self.width}x{self.height}',
+                '-r', str(self.fps),
+                '-i', '-'
+            ] + self.EVEN_SIZE_FILTER + codec_args + [self.output_path]
+
+            print(f"🎬 使用FFmpeg管道编码: {codec_name}")
+            self._process = subprocess.Popen(
+                cmd,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.PIPE
+            )
+            self.backend = 'ffmpeg'
+            return
+
+        # 降级方案：OpenCV
+        print("⚠️ FFmpeg不可用，回退到OpenCV，视频可能无法在浏览器播放")
+        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+        self._writer = cv2.VideoWriter(self.output_path, fourcc, self.fps, (self.width, self.height))
+        if not self._writer.isOpened():
+            raise RuntimeError("无法创建视频写入器")
+        self.backend = 'opencv'
+
+    def write(self, frame):
+        """写入一帧（BGR, uint8）"""
+        if frame is None:
+            return
+
+        if self.backend is None:
+            self._open(frame)
+
+        if frame.shape[0] != self.height or frame.shape[1] != self.width:
+            raise ValueError(
+                f"帧尺寸不一致: 期望 {self.width}x{self.height}，实际 {frame.shape[1]}x{frame.shape[0]}"
+            )
+
+        if self.backend == 'ffmpeg':
+            data = np.ascontiguousarray(frame, dtype=np.uint8)
+            try:
+                self._process.stdin.write(memoryview(data))
+            except BrokenPipeError:
+                stderr = self._process.stderr.read().decode('utf-8', errors='ignore')
+                self._process.wait()
+                raise RuntimeError(f"FFmpeg编码中断: {stderr[:300]}")
+        else:
+            self._writer.write(frame)
+
+        self.frame_count += 1
+
+    def close(self):
+        """
+        结束编码并等待输出文件写完
+
+        Returns:
+            str: 输出视频路径
+        """
+        if self.backend is None:
+            raise ValueError("没有帧可以写入")
+
+        if self.backend == 'ffmpeg':
+            process, self._process = self._process, None
+            if process is not None:
+                _, stderr = process.communicate()
+                if process.returncode != 0:
+                    stderr = stderr.decode('utf-8', errors='ignore') if stderr else "无错误输出"
+                    raise RuntimeError(f"FFmpeg失败 (代码{process.returncode}): {stderr[:300]}")
+        else:
+            writer, self._writer = self._writer, None
+            if writer is not None:
+                writer.release()
+
+        if not os.path.exists(self.output_path) or os.path.getsize(self.output_path) == 0:
+            raise RuntimeError("视频生成失败")
+
+        return self.output_path
+
+    def abort(self):
+        """异常时终止编码进程并释放资源"""
+        if self._process is not None:
+            self._process.kill()
+            self._process.communicate()
+            self._process = None
+        if self._writer is not None:
+            self._writer.release()
+            self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.abort()
+        return False
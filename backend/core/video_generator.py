@@ -3,16 +3,69 @@
 """
 import cv2
 import numpy as np
-import tempfile
 import os
-from .pose_detector import PoseDetector
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from .detector_pool import get_default_pool
+from .video_encoder import VideoEncoder
+from .frame_reader import iter_sampled_frames
+from .landmarks import LandmarkFrame, JOINT_INDEX
+
+
+class TrailLayer:
+    """
+    常驻的轨迹图层
+    
+    轨迹线段只在图层上画一次，之后每帧只追加新线段并合成到当前帧，
+    不必每帧从头重画整条轨迹；设置衰减系数时旧的轨迹逐帧淡出。
+    """
+    
+    def __init__(self, height, width, fade=None):
+        """
+        Args:
+            height, width: 图层尺寸（与视频帧一致）
+            fade: 每帧的衰减系数（0~1），None表示轨迹不淡出
+        """
+        self.color = np.zeros((height, width, 3), dtype=np.uint8)
+        self.alpha = np.zeros((height, width), dtype=np.uint8)  # 不透明度（0~255）
+        self.fade = fade
+    
+    def add_segment(self, start, end, color, thickness=2):
+        """追加一段轨迹线"""
+        cv2.line(self.color, start, end, color, thickness)
+        cv2.line(self.alpha, start, end, 255, thickness)
+    
+    def decay(self):
+        """按衰减系数淡化已有的轨迹（未设置衰减时不做任何事）"""
+        if self.fade is not None:
+            cv2.convertScaleAbs(self.alpha, self.alpha, alpha=self.fade)
+    
+    def apply(self, frame):
+        """
+        把轨迹图层合成到帧上（直接修改并返回该帧）
+        """
+        if self.fade is None:
+            # 不淡出时轨迹完全不透明，直接按掩码覆盖
+            cv2.copyTo(self.color, self.alpha, frame)
+            return frame
+        
+        weight = self.alpha.astype(np.float32)[..., None] * (1.0 / 255)
+        blended = frame * (1.0 - weight) + self.color * weight
+        np.copyto(frame, blended, casting='unsafe')
+        return frame
 
 
 class VideoGenerator:
     """生成骨架视频的类"""
     
-    def __init__(self):
-        self.detector = PoseDetector()
+    def __init__(self, detector_pool=None, render_workers=0):
+        """
+        Args:
+            detector_pool: 共享的检测器池（默认使用进程级共享池）
+            render_workers: 渲染线程数（0或1表示在当前线程逐帧渲染）
+        """
+        self.detector_pool = detector_pool or get_default_pool()
+        self.render_workers = render_workers
         # MediaPipe 骨架连接定义
         self.connections = [
             # 躯干
@@ -53,11 +106,24 @@ class VideoGenerator:
             'left_ankle': 27,
             'right_ankle': 28,
         }
+        
+        # landmark_map 中各关键点在关键点数组中的行号（用于数组快速路径）
+        self._joint_rows = [JOINT_INDEX[name] for name in self.landmark_map]
+        self._joint_mp_indices = list(self.landmark_map.values())
+    
+    # 所有支持的可视化类型
+    VIDEO_TYPES = ("overlay", "skeleton", "comparison", "trajectory")
+    
+    # 直接在输入帧上绘制的类型（同一帧要分给多个输出时需要各自拷贝）
+    IN_PLACE_TYPES = ("overlay", "trajectory")
     
     def generate_video(self, video_path, output_path, video_type="overlay", max_frames=300):
         """
         统一的视频生成接口
         
+        采用流式管线：解码 → 姿态检测 → 渲染 → 编码，每一帧处理完即释放，
+        只保留每帧的关键点数据，峰值内存与视频长度无关。
+        
         Args:
             video_path: 输入视频路径
             output_path: 输出视频路径
@@ -71,259 +137,271 @@ class VideoGenerator:
         Returns:
             str: 输出视频路径
         """
-        from .sequence_analyzer import SequenceAnalyzer
-        import subprocess
-        import tempfile
+        return self.generate_videos(video_path, {video_type: output_path}, max_frames)[video_type]
+    
+    def generate_videos(self, video_path, outputs, max_frames=300):
+        """
+        一次遍历生成多种可视化视频
+        
+        解码和姿态检测只做一次，每一帧分发给各个渲染器，
+        每个输出各自有一个编码进程，与渲染并行进行。
+        
+        Args:
+            video_path: 输入视频路径
+            outputs: {视频类型: 输出路径}
+            max_frames: 最大处理帧数
+        
+        Returns:
+            dict: {视频类型: 输出视频路径}
+        """
+        self._check_video_types(outputs)
         
-        print(f"🎬 开始生成视频: {video_type}")
+        print(f"🎬 开始生成视频: {', '.join(outputs)}")
         
         # 读取视频
         cap = cv2.VideoCapture(video_path)
         if not cap.isOpened():
             raise ValueError(f"无法打开视频: {video_path}")
         
-        # 获取视频信息
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        fps = cap.get(cv2.CAP_PROP_FPS) or 10
-        
-        print(f"📹 视频信息: {total_frames} 帧, {fps:.1f} FPS")
-        
-        # 提取帧（限制数量以提高速度）
-        frames = []
-        frame_count = 0
-        
-        # 如果帧数太多，进行采样
-        if total_frames > max_frames:
-            frame_interval = total_frames // max_frames
-            print(f"⚡ 帧数过多，每 {frame_interval} 帧采样一次")
-        else:
-            frame_interval = 1
-        
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
+        try:
+            # 获取视频信息
+            total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            fps = cap.get(cv2.CAP_PROP_FPS) or 10
             
-            if frame_count % frame_interval == 0:
-                frames.append(frame)
-                if len(frames) >= max_frames:
-                    print(f"⏸️ 已达到最大帧数限制: {max_frames}")
-                    break
+            print(f"📹 视频信息: {total_frames} 帧, {fps:.1f} FPS")
             
-            frame_count += 1
-        
-        cap.release()
+            # 如果帧数太多，进行采样
+            if total_frames > max_frames:
+                frame_interval = total_frames // max_frames
+                print(f"⚡ 帧数过多，每 {frame_interval} 帧采样一次")
+            else:
+                frame_interval = 1
+            
+            # 预估输出帧数（用于帧编号显示）
+            if total_frames > 0:
+                expected_frames = min(max_frames, -(-total_frames // frame_interval))
+            else:
+                expected_frames = max_frames
+            
+            print(f"🎨 开始渲染（流式处理）...")
+            
+            frames = iter_sampled_frames(cap, frame_interval, max_frames)
+            pose_frames = self._iter_pose_frames(frames)
+            
+            # 直接用FFmpeg或OpenCV写入浏览器兼容格式
+            results = self._render_outputs(pose_frames, outputs, expected_frames, fps)
+        finally:
+            cap.release()
         
-        if len(frames) == 0:
-            raise ValueError("视频中没有有效帧")
+        print(f"🎉 视频生成完成: {', '.join(results.values())}")
+        return results
+    
+    def generate_video_from_source(self, source, output_path, video_type="overlay", progress=None):
+        """
+        从已解码的 FrameSource 生成视频（不再解码和检测姿态）
         
-        print(f"✅ 提取了 {len(frames)} 帧")
+        Args:
+            source: FrameSource（帧和关键点都已就绪）
+            output_path: 输出视频路径
+            video_type: 视频类型，同 generate_video
+            progress: 渲染进度回调 progress(fraction)（0~1）
         
-        # 分析序列（这是最耗时的部分）
-        print("🔍 开始姿态分析...")
-        analyzer = SequenceAnalyzer()
-        sequence_result = analyzer.analyze_sequence(frames)
+        Returns:
+            str: 输出视频路径
+        """
+        return self.generate_videos_from_source(source, {video_type: output_path}, progress)[video_type]
+    
+    def generate_videos_from_source(self, source, outputs, progress=None):
+        """
+        从 FrameSource 一次遍历生成多种可视化视频
         
-        if not sequence_result.get("success", False):
-            raise RuntimeError("序列分析失败")
+        Args:
+            source: FrameSource
+            outputs: {视频类型: 输出路径}
+            progress: 渲染进度回调 progress(fraction)（0~1，每写完一帧调用一次）
         
-        print("✅ 姿态分析完成")
+        Returns:
+            dict: {视频类型: 输出视频路径}
+        """
+        self._check_video_types(outputs)
         
-        # 生成处理后的帧
-        print(f"🎨 开始生成 {video_type} 视频...")
+        print(f"🎬 从帧存储生成视频: {', '.join(outputs)}（{len(source)} 帧）")
         
-        if video_type == "overlay":
-            processed_frames = self._generate_overlay_frames(frames, sequence_result)
-        elif video_type == "skeleton":
-            processed_frames = self._generate_skeleton_frames(sequence_result)
-        elif video_type == "comparison":
-            processed_frames = self._generate_comparison_frames(frames, sequence_result)
-        elif video_type == "trajectory":
-            processed_frames = self._generate_trajectory_frames(frames, sequence_result)
-        else:
-            raise ValueError(f"未知的视频类型: {video_type}")
+        # 帧从存储中逐帧解码，关键点需已由调用方补齐（FrameSource.ensure_landmarks）
+        pose_frames = source.iter_pose_frames()
+        results = self._render_outputs(pose_frames, outputs, len(source), source.fps, progress)
         
-        # 直接用FFmpeg或OpenCV写入浏览器兼容格式
-        final_result = self._write_web_compatible_video(processed_frames, output_path, fps)
+        print(f"🎉 视频生成完成: {', '.join(results.values())}")
+        return results
+    
+    def annotate_frame(self, frame, landmarks):
+        """
+        返回标注了骨架的帧拷贝（用于展示单帧姿态）
         
-        print(f"🎉 视频生成完成: {final_result}")
-        return final_result
+        Args:
+            frame: BGR帧（不会被修改）
+            landmarks: 关键点
+        """
+        annotated = np.array(frame)
+        if landmarks:
+            self._draw_skeleton(annotated, landmarks)
+        return annotated
     
-    def _generate_overlay_frames(self, frames, sequence_result):
-        """生成骨架叠加帧"""
-        processed_frames = []
-        for idx, frame in enumerate(frames):
-            frame_data = sequence_result['frames_data'][idx]
-            landmarks = frame_data['landmarks']
-            overlay_frame = frame.copy()
-            
-            if landmarks:
-                overlay_frame = self._draw_skeleton(overlay_frame, landmarks)
-                cv2.putText(overlay_frame, f"Frame {idx + 1}/{len(frames)}", 
-                           (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0), 2)
-            else:
-                cv2.putText(overlay_frame, f"Frame {idx + 1}/{len(frames)} - No Pose", 
-                           (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 255), 2)
-            
-            processed_frames.append(overlay_frame)
-        return processed_frames
+    def _check_video_types(self, outputs):
+        if not outputs:
+            raise ValueError("没有指定要生成的视频")
+        for video_type in outputs:
+            if video_type not in self.VIDEO_TYPES:
+                raise ValueError(f"未知的视频类型: {video_type}")
     
-    def _generate_skeleton_frames(self, sequence_result, width=640, height=480):
-        """生成纯骨架帧"""
-        processed_frames = []
-        frames_data = sequence_result['frames_data']
+    def _get_renderer(self, video_type):
+        """
+        按视频类型取出逐帧渲染函数
         
-        for idx, frame_data in enumerate(frames_data):
-            skeleton_frame = np.ones((height, width, 3), dtype=np.uint8) * 255
-            landmarks = frame_data['landmarks']
-            
-            if landmarks:
-                skeleton_frame = self._draw_skeleton(
-                    skeleton_frame, landmarks,
-                    point_color=(0, 0, 255), line_color=(0, 0, 0),
-                    point_radius=8, line_thickness=3
-                )
-            
-            processed_frames.append(skeleton_frame)
-        return processed_frames
+        Returns:
+            callable: render(frame, landmarks, idx, total) -> 输出帧
+        """
+        renderers = {
+            "overlay": self._render_overlay_frame,
+            "skeleton": self._render_skeleton_frame,
+            "comparison": self._render_comparison_frame,
+            "trajectory": self._render_trajectory_frame,
+        }
+        return renderers[video_type]
     
-    def _generate_comparison_frames(self, frames, sequence_result):
-        """生成左右对比帧"""
-        processed_frames = []
-        height, width = frames[0].shape[:2]
-        
-        for idx, frame in enumerate(frames):
-            # 左侧：原视频
-            left = frame.copy()
-            
-            # 右侧：纯骨架
-            right = np.ones((height, width, 3), dtype=np.uint8) * 255
-            frame_data = sequence_result['frames_data'][idx]
-            landmarks = frame_data['landmarks']
-            
-            if landmarks:
-                right = self._draw_skeleton(right, landmarks,
-                    point_color=(0, 0, 255), line_color=(0, 0, 0),
-                    point_radius=6, line_thickness=2)
-            
-            # 拼接
-            comparison = np.hstack([left, right])
-            processed_frames.append(comparison)
-        return processed_frames
+    def _iter_pose_frames(self, frames):
+        """逐帧检测姿态（生成器），产出 (帧, 关键点)；整段视频借用同一个检测器"""
+        with self.detector_pool.detector() as detector:
+            for frame in frames:
+                # 渲染器自己绘制骨架，这里只需要关键点
+                yield frame, detector.detect_landmarks(frame)
     
-    def _generate_trajectory_frames(self, frames, sequence_result):
-        """生成轨迹追踪帧"""
-        return self._generate_overlay_frames(frames, sequence_result)  # 简化版
+    def _render_overlay_frame(self, frame, landmarks, idx, total):
+        """骨架叠加帧（直接在输入帧上绘制）"""
+        if landmarks:
+            frame = self._draw_skeleton(frame, landmarks)
+            cv2.putText(frame, f"Frame {idx + 1}/{total}", 
+                       (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0), 2)
+        else:
+            cv2.putText(frame, f"Frame {idx + 1}/{total} - No Pose", 
+                       (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 255), 2)
+        return frame
     
-    def _write_web_compatible_video(self, frames, output_path, fps):
-        """写入浏览器兼容的视频"""
-        import subprocess
-        import tempfile
-        import shutil
+    def _render_skeleton_frame(self, frame, landmarks, idx, total, width=640, height=480):
+        """纯骨架帧"""
+        skeleton_frame = np.full((height, width, 3), 255, dtype=np.uint8)
+        
+        if landmarks:
+            skeleton_frame = self._draw_skeleton(
+                skeleton_frame, landmarks,
+                point_color=(0, 0, 255), line_color=(0, 0, 0),
+                point_radius=8, line_thickness=3
+            )
+        
+        return skeleton_frame
+    
+    def _render_comparison_frame(self, frame, landmarks, idx, total):
+        """左右对比帧"""
+        height, width = frame.shape[:2]
         
-        if len(frames) == 0:
-            raise ValueError("没有帧可以写入")
+        # 右侧：纯骨架
+        right = np.full((height, width, 3), 255, dtype=np.uint8)
         
-        height, width = frames[0].shape[:2]
+        if landmarks:
+            right = self._draw_skeleton(right, landmarks,
+                point_color=(0, 0, 255), line_color=(0, 0, 0),
+                point_radius=6, line_thickness=2)
         
-        # 方法1: 使用FFmpeg（图片序列方式，更稳定）
-        try:
-            # 检查FFmpeg
-            result = subprocess.run(['ffmpeg', '-version'], capture_output=True, text=True, timeout=5)
-            if result.returncode != 0:
-                raise Exception("FFmpeg不可用")
-            
-            print("🔄 使用FFmpeg生成浏览器兼容视频...")
-            
-            # 创建临时目录保存帧
-            temp_dir = tempfile.mkdtemp()
-            print(f"📁 临时目录: {temp_dir}")
-            
-            try:
-                # 保存所有帧为图片（高质量）
-                print(f"💾 保存 {len(frames)} 帧为高质量图片...")
-                for i, frame in enumerate(frames):
-                    if frame is None:
-                        print(f"⚠️ 第{i}帧为None，跳过")
-                        continue
-                    frame_path = os.path.join(temp_dir, f'frame_{i:06d}.png')
-                    # 使用PNG压缩等级0（无压缩，最高质量）
-                    success = cv2.imwrite(frame_path, frame, [cv2.IMWRITE_PNG_COMPRESSION, 0])
-                    if not success:
-                        print(f"⚠️ 第{i}帧保存失败")
-                
-                print("✅ 帧保存完成，开始FFmpeg合成...")
-                
-                # 尝试多种编码方案（高质量）
-                codecs = [
-                    ('h264_hq', ['-c:v', 'h264', '-pix_fmt', 'yuv420p', '-b:v', '5M']),  # H.264高码率
-                    ('h264', ['-c:v', 'h264', '-pix_fmt', 'yuv420p']),  # H.264标准
-                    ('mpeg4_hq', ['-c:v', 'mpeg4', '-q:v', '2', '-pix_fmt', 'yuv420p']),  # MPEG4高质量
-                    ('mpeg4', ['-c:v', 'mpeg4', '-q:v', '5'])  # MPEG4标准
-                ]
-                
-                result = None
-                for codec_name, codec_args in codecs:
-                    cmd = [
-                        'ffmpeg', '-y',
-                        '-framerate', str(fps),
-                        '-i', os.path.join(temp_dir, 'frame_%06d.png')
-                    ] + codec_args + [output_path]
-                    
-                    print(f"🎬 尝试编码器: {codec_name}")
-                    result = subprocess.run(cmd, capture_output=True, text=True, timeout=60)
-                    
-                    if result.returncode == 0 and os.path.exists(output_path):
-                        print(f"✅ 使用 {codec_name} 编码成功")
-                        break
-                    else:
-                        print(f"⚠️ {codec_name} 失败，尝试下一个...")
-                        if os.path.exists(output_path):
-                            os.remove(output_path)
-                
-                # 清理临时文件
-                print("🗑️ 清理临时文件...")
-                shutil.rmtree(temp_dir)
-                
-                if result.returncode == 0 and os.path.exists(output_path):
-                    print("✅ FFmpeg生成成功（H.264编码）")
-                    return output_path
-                else:
-                    stderr = result.stderr if result.stderr else "无错误输出"
-                    print(f"⚠️ FFmpeg失败 (代码{result.returncode}): {stderr[:300]}")
-                    
-            except subprocess.TimeoutExpired:
-                print("⚠️ FFmpeg执行超时")
-                if os.path.exists(temp_dir):
-                    shutil.rmtree(temp_dir)
-                raise Exception("FFmpeg超时")
-            except Exception as e:
-                # 清理临时文件
-                if os.path.exists(temp_dir):
-                    shutil.rmtree(temp_dir)
-                raise e
-                
-        except Exception as e:
-            print(f"ℹ️ FFmpeg方案失败: {str(e)}")
+        # 拼接（左侧：原视频）
+        return np.hstack([frame, right])
+    
+    def _render_trajectory_frame(self, frame, landmarks, idx, total):
+        """轨迹追踪帧"""
+        return self._render_overlay_frame(frame, landmarks, idx, total)  # 简化版
+    
+    def _render_outputs(self, pose_frames, outputs, total, fps, progress=None):
+        """
+        把每一帧分发给各个输出的渲染器，并写入各自的编码器
         
-        # 方法2: 使用OpenCV（降级方案）
-        print("⚠️ 回退到OpenCV，视频可能无法在浏览器播放")
-        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-        out = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
+        帧通过管道直接送入FFmpeg编码，不再落地临时图片；
+        FFmpeg不可用时由VideoEncoder回退到OpenCV。
         
-        if not out.isOpened():
-            raise RuntimeError("无法创建视频写入器")
+        Returns:
+            dict: {视频类型: 输出视频路径}
+        """
+        renderers = {video_type: self._get_renderer(video_type) for video_type in outputs}
+        encoders = {video_type: VideoEncoder(path, fps) for video_type, path in outputs.items()}
+        shared = len(renderers) > 1
+        written = 0
+        
+        def render_frame(idx, frame, landmarks):
+            rendered = {}
+            for video_type, render in renderers.items():
+                # 会在帧上绘制的渲染器，在帧被共享或只读时先拷贝
+                source = frame
+                if video_type in self.IN_PLACE_TYPES and (shared or not frame.flags.writeable):
+                    source = frame.copy()
+                rendered[video_type] = render(source, landmarks, idx, total)
+            return rendered
+        
+        def write_frame(rendered):
+            nonlocal written
+            for video_type, output_frame in rendered.items():
+                encoders[video_type].write(output_frame)
+            written += 1
+            if progress is not None and total:
+                progress(min(1.0, written / total))
+        
+        def valid_frames():
+            for idx, (frame, landmarks) in enumerate(pose_frames):
+                if frame is None:
+                    print(f"⚠️ 第{idx}帧为None，跳过")
+                    continue
+                yield idx, frame, landmarks
         
-        for frame in frames:
-            out.write(frame)
+        try:
+            if self.render_workers and self.render_workers > 1:
+                self._render_parallel(valid_frames(), render_frame, write_frame)
+            else:
+                for idx, frame, landmarks in valid_frames():
+                    write_frame(render_frame(idx, frame, landmarks))
+            
+            results = {video_type: encoder.close() for video_type, encoder in encoders.items()}
+        except Exception:
+            for encoder in encoders.values():
+                encoder.abort()
+            raise
+        
+        for video_type, encoder in encoders.items():
+            if encoder.backend == 'opencv':
+                print(f"⚠️ {video_type} 使用OpenCV生成，浏览器可能无法播放，请下载查看")
+            else:
+                print(f"✅ {video_type} FFmpeg生成成功（{encoder.frame_count} 帧）")
+        return results
+    
+    def _render_parallel(self, frames, render_frame, write_frame):
+        """
+        在线程池中渲染帧，按原顺序交给编码器
         
-        out.release()
+        OpenCV的绘制函数会释放GIL，多个帧可以真正并行渲染；
+        同时在途的帧数有上限，内存占用不随视频长度增长。
+        """
+        max_pending = self.render_workers * 2
+        pending = deque()
         
-        if os.path.exists(output_path) and os.path.getsize(output_path) > 0:
-            print("⚠️ 使用OpenCV生成，浏览器可能无法播放，请下载查看")
-            return output_path
-        else:
-            raise RuntimeError("视频生成失败")
+        with ThreadPoolExecutor(max_workers=self.render_workers, thread_name_prefix="render") as pool:
+            try:
+                for idx, frame, landmarks in frames:
+                    pending.append(pool.submit(render_frame, idx, frame, landmarks))
+                    if len(pending) >= max_pending:
+                        write_frame(pending.popleft().result())
+                
+                while pending:
+                    write_frame(pending.popleft().result())
+            except Exception:
+                for future in pending:
+                    future.cancel()
+                raise
     
     def _convert_to_web_compatible(self, input_path, output_path):
         """
@@ -709,16 +787,26 @@ class VideoGenerator:
         
         # 创建关键点位置数组（用于连线）
         points = {}
-        for name, idx in self.landmark_map.items():
-            if name in landmarks:
-                lm = landmarks[name]
-                x = int(lm['x'] * width)
-                y = int(lm['y'] * height)
-                visibility = lm.get('visibility', 1.0)
-                
+        if isinstance(landmarks, LandmarkFrame):
+            # 数组快速路径：一次性换算所有关键点的像素坐标
+            coords = landmarks.array[self._joint_rows].astype(np.float64)
+            xs = (coords[:, 0] * width).astype(int)
+            ys = (coords[:, 1] * height).astype(int)
+            for idx, x, y, visibility in zip(self._joint_mp_indices, xs, ys, coords[:, 3]):
                 # 只绘制可见度高的点
                 if visibility > 0.5:
-                    points[idx] = (x, y)
+                    points[idx] = (int(x), int(y))
+        else:
+            for name, idx in self.landmark_map.items():
+                if name in landmarks:
+                    lm = landmarks[name]
+                    x = int(lm['x'] * width)
+                    y = int(lm['y'] * height)
+                    visibility = lm.get('visibility', 1.0)
+                    
+                    # 只绘制可见度高的点
+                    if visibility > 0.5:
+                        points[idx] = (x, y)
         
         # 绘制连接线
         for connection in self.connections:
@@ -735,15 +823,18 @@ class VideoGenerator:
         
         return frame
     
-    def create_trajectory_video(self, frames, sequence_result, output_path=None, fps=10):
+    def create_trajectory_video(self, frames, sequence_result, output_path=None, fps=10, fade=None):
         """
         创建轨迹追踪视频：显示关键点的运动轨迹
         
+        轨迹画在常驻的轨迹图层上，每帧只追加一段新线段，单帧开销与视频长度无关。
+        
         Args:
             frames: 原始视频帧列表
             sequence_result: 序列分析结果
             output_path: 输出视频路径
             fps: 输出视频帧率
+            fade: 轨迹每帧的衰减系数（0~1，如0.95），None表示轨迹不淡出
             
         Returns:
             output_path: 生成的视频文件路径
@@ -777,40 +868,40 @@ class VideoGenerator:
         # 收集轨迹点
         trajectories = sequence_result['trajectories']
         
+        # 每个关键点一个轨迹图层（按顺序合成，右手腕的轨迹在上层）
+        trails = {point_name: TrailLayer(height, width, fade=fade)
+                  for point_name in ['left_wrist', 'right_wrist']}
+        last_points = {}  # 每个关键点最近一次可见的位置
+        
         # 处理每一帧
         for idx, frame in enumerate(frames):
             trajectory_frame = frame.copy()
             
-            # 绘制当前帧之前的轨迹
-            for point_name in ['left_wrist', 'right_wrist']:
+            # 轨迹图层上只追加本帧新增的一段
+            for point_name, trail in trails.items():
                 if point_name not in trajectories:
                     continue
                 
                 traj = trajectories[point_name]
                 color = (255, 0, 0) if 'left' in point_name else (0, 0, 255)
                 
-                # 绘制轨迹线
-                points_to_draw = []
-                for i in range(min(idx + 1, len(traj['x']))):
-                    x = traj['x'][i]
-                    y = traj['y'][i]
-                    vis = traj['visibility'][i]
+                trail.decay()
+                if idx < len(traj['x']):
+                    x = traj['x'][idx]
+                    y = traj['y'][idx]
+                    vis = traj['visibility'][idx]
                     
                     if x is not None and y is not None and vis > 0.5:
-                        px = int(x * width)
-                        py = int(y * height)
-                        points_to_draw.append((px, py))
+                        point = (int(x * width), int(y * height))
+                        if point_name in last_points:
+                            trail.add_segment(last_points[point_name], point, color, 2)
+                        last_points[point_name] = point
                 
-                # 绘制轨迹点和连线
-                for i in range(1, len(points_to_draw)):
-                    # 线条透明度渐变
-                    alpha = 0.3 + 0.7 * (i / max(1, len(points_to_draw) - 1))
-                    cv2.line(trajectory_frame, points_to_draw[i-1], points_to_draw[i], 
-                            color, 2)
+                trail.apply(trajectory_frame)
                 
                 # 当前点加粗显示
-                if len(points_to_draw) > 0:
-                    cv2.circle(trajectory_frame, points_to_draw[-1], 8, color, -1)
+                if point_name in last_points:
+                    cv2.circle(trajectory_frame, last_points[point_name], 8, color, -1)
             
             # 绘制当前骨架
             landmarks = sequence_result['frames_data'][idx]['landmarks']
@@ -5,9 +5,17 @@ import cv2
 import numpy as np
 import tempfile
 import os
+import shutil
+from .frame_reader import iter_sampled_frames
 
 
 class VideoProcessor:
+    # 计算运动帧差时先把帧缩小到该宽度
+    MOTION_DIFF_WIDTH = 320
+    
+    # 保存上传文件时每次拷贝的字节数
+    UPLOAD_CHUNK_SIZE = 1024 * 1024
+    
     def __init__(self):
         pass
     
@@ -48,53 +56,42 @@ class VideoProcessor:
         
         elif method == 'motion':
             # 提取运动最剧烈的帧
-            frames = []
-            frame_diffs = []
-            prev_frame = None
+            # 只保留当前最佳帧，帧差在缩小后的灰度图上计算，内存占用与视频长度无关
+            best_frame = None
+            best_diff = -1
+            prev_gray = None
             
             while cap.isOpened():
                 ret, frame = cap.read()
                 if not ret:
                     break
                 
-                frames.append(frame)
+                gray = self._motion_gray(frame)
                 
-                # 计算帧差
-                if prev_frame is not None:
-                    diff = cv2.absdiff(
-                        cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY),
-                        cv2.cvtColor(prev_frame, cv2.COLOR_BGR2GRAY)
-                    )
-                    frame_diffs.append(np.sum(diff))
+                # 计算帧差（复用上一帧的灰度图）
+                if prev_gray is not None:
+                    frame_diff = int(np.sum(cv2.absdiff(gray, prev_gray)))
                 else:
-                    frame_diffs.append(0)
+                    frame_diff = 0
+                
+                if frame_diff > best_diff:
+                    best_diff = frame_diff
+                    best_frame = frame
                 
-                prev_frame = frame
+                prev_gray = gray
             
             cap.release()
             
-            if len(frames) == 0:
+            if best_frame is None:
                 raise ValueError("视频中没有有效帧")
             
-            # 找到运动最剧烈的帧
-            max_diff_idx = np.argmax(frame_diffs)
-            return frames[max_diff_idx]
+            # 运动最剧烈的帧
+            return best_frame
         
         elif method == 'all':
-            # 提取所有帧（每秒取2帧）
-            frames = []
+            # 提取所有帧（每秒取2帧，跳过的帧只grab不解码）
             frame_interval = max(1, int(fps / 2))
-            frame_count = 0
-            
-            while cap.isOpened():
-                ret, frame = cap.read()
-                if not ret:
-                    break
-                
-                if frame_count % frame_interval == 0:
-                    frames.append(frame)
-                
-                frame_count += 1
+            frames = list(iter_sampled_frames(cap, frame_interval))
             
             cap.release()
             return frames
@@ -103,25 +100,64 @@ class VideoProcessor:
             cap.release()
             raise ValueError(f"未知的提取方法: {method}")
     
-    def save_uploaded_file(self, uploaded_file):
+    def motion_signal(self, frames):
         """
-        保存Streamlit上传的文件到临时目录
+        计算每帧与前一帧的帧差（缩小后灰度图的平均绝对差，0~255）
         
         Args:
-            uploaded_file: Streamlit的UploadedFile对象
+            frames: 帧序列（列表或 (帧数, 高, 宽, 3) 数组）
+        
+        Returns:
+            np.ndarray: 形状 (帧数,)，第一帧为0
+        """
+        motion = np.zeros(len(frames), dtype=np.float64)
+        prev_gray = None
+        for idx, frame in enumerate(frames):
+            gray = self._motion_gray(frame)
+            if prev_gray is not None:
+                motion[idx] = cv2.absdiff(gray, prev_gray).mean()
+            prev_gray = gray
+        return motion
+    
+    def _motion_gray(self, frame):
+        """缩小并转为灰度图（用于计算帧差）"""
+        height, width = frame.shape[:2]
+        if width > self.MOTION_DIFF_WIDTH:
+            scale = self.MOTION_DIFF_WIDTH / width
+            frame = cv2.resize(frame, (self.MOTION_DIFF_WIDTH, max(1, int(height * scale))),
+                               interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    
+    @staticmethod
+    def save_uploaded_file(uploaded_file, path=None):
+        """
+        保存上传的文件（不在内存中构造整份bytes拷贝）
+        
+        内存缓冲区直接以memoryview交给文件写入，其他文件对象按固定大小分块拷贝；
+        未指定路径时在临时目录中创建唯一文件，同名上传不会互相覆盖
+        
+        Args:
+            uploaded_file: Streamlit的UploadedFile对象或任意可读文件对象
+            path: 目标路径（None表示新建临时文件）
             
         Returns:
-            temp_path: 临时文件路径
+            temp_path: 文件路径，由调用方负责删除
         """
-        # 创建临时文件
-        temp_dir = tempfile.gettempdir()
-        temp_path = os.path.join(temp_dir, uploaded_file.name)
+        if path is None:
+            ext = os.path.splitext(getattr(uploaded_file, 'name', ''))[1].lower() or '.mp4'
+            fd, path = tempfile.mkstemp(suffix=ext, prefix='upload_')
+            os.close(fd)
         
-        # 保存文件
-        with open(temp_path, 'wb') as f:
-            f.write(uploaded_file.read())
+        with open(path, 'wb') as f:
+            if hasattr(uploaded_file, 'getbuffer'):
+                f.write(uploaded_file.getbuffer())
+            else:
+                position = uploaded_file.tell()
+                uploaded_file.seek(0)
+                shutil.copyfileobj(uploaded_file, f, VideoProcessor.UPLOAD_CHUNK_SIZE)
+                uploaded_file.seek(position)
         
-        return temp_path
+        return path
     
     def get_video_info(self, video_path):
         """获取视频信息"""
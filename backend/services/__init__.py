@@ -1,5 +1,39 @@
-"""业务逻辑服务层"""
-from .volleyball_service import VolleyballService
+"""业务逻辑服务层
 
-__all__ = ['VolleyballService']
+与 backend.core 一样按需导入子模块，只用到任务队列或上传存储时不会加载
+分析服务及其依赖的姿态检测、绘图模块。
+"""
+import importlib
 
+# 导出名称 -> 所在子模块
+_EXPORTS = {
+    'VolleyballService': '.volleyball_service',
+    'AnalysisCache': '.analysis_cache',
+    'JobQueue': '.job_queue',
+    'get_job_queue': '.job_queue',
+    'scale_progress': '.job_queue',
+    'UploadStore': '.upload_store',
+    'get_upload_store': '.upload_store'
+}
+
+__all__ = [
+    'VolleyballService',
+    'AnalysisCache',
+    'JobQueue',
+    'get_job_queue',
+    'scale_progress',
+    'UploadStore',
+    'get_upload_store'
+]
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,192 @@
+"""
+分析结果缓存
+按上传视频的内容哈希 + 检测/评分配置缓存分析结果和可视化视频，
+重复上传同一段视频时直接复用，无需重新解码和姿态检测
+"""
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+
+from .upload_store import hash_upload
+
+
+class AnalysisCache:
+    """基于内容寻址的磁盘缓存，按总大小做LRU淘汰"""
+    
+    # 分析算法有不兼容的改动时递增，使旧缓存失效
+    CACHE_VERSION = 2
+    
+    def __init__(self, cache_dir, max_size_mb=500, config=None):
+        """
+        Args:
+            cache_dir: 缓存目录
+            max_size_mb: 缓存总大小上限（MB），超出后淘汰最久未使用的条目
+            config: 影响分析结果的配置（检测器/评分器参数），参与缓存键计算
+        """
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_size_bytes = int(max_size_mb * 1024 * 1024)
+        self._config_digest = hashlib.sha256(
+            json.dumps({'version': self.CACHE_VERSION, 'config': config or {}},
+                       sort_keys=True, default=str).encode('utf-8')
+        ).hexdigest()
+        self._lock = threading.Lock()
+    
+    def make_key(self, uploaded_file):
+        """
+        计算上传文件的缓存键（内容哈希 + 配置哈希）
+        
+        Args:
+            uploaded_file: 文件对象（Streamlit UploadedFile 或任意可读文件对象）
+        
+        Returns:
+            str: 缓存键
+        """
+        return self.key_for(hash_upload(uploaded_file))
+    
+    def key_for(self, content_hash):
+        """由已算好的内容哈希得到缓存键"""
+        digest = hashlib.sha256(content_hash.encode('ascii'))
+        digest.update(self._config_digest.encode('ascii'))
+        return digest.hexdigest()
+    
+    def _entry_dir(self, key):
+        return self.cache_dir / key
+    
+    def _touch(self, entry_dir):
+        """更新条目的访问时间（用于LRU）"""
+        try:
+            os.utime(entry_dir, None)
+        except OSError:
+            pass
+    
+    def get(self, key, name):
+        """
+        读取缓存的对象
+        
+        Args:
+            key: 缓存键
+            name: 条目内的对象名（如 "analysis_sequence"）
+        
+        Returns:
+            缓存的对象，未命中时返回None
+        """
+        entry_dir = self._entry_dir(key)
+        path = entry_dir / f"{name}.pkl"
+        try:
+            with open(path, 'rb') as f:
+                value = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            return None
+        
+        self._touch(entry_dir)
+        return value
+    
+    def put(self, key, name, value):
+        """写入对象到缓存"""
+        entry_dir = self._entry_dir(key)
+        entry_dir.mkdir(parents=True, exist_ok=True)
+        
+        # 先写临时文件再原子替换，避免并发读到半个文件
+        fd, temp_path = tempfile.mkstemp(dir=entry_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, entry_dir / f"{name}.pkl")
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        
+        self._touch(entry_dir)
+        self._evict(keep=key)
+    
+    def get_file(self, key, filename):
+        """
+        获取缓存的文件路径
+        
+        Returns:
+            Path: 文件路径，未命中时返回None
+        """
+        entry_dir = self._entry_dir(key)
+        path = entry_dir / filename
+        if not path.exists():
+            return None
+        
+        self._touch(entry_dir)
+        return path
+    
+    def put_file(self, key, filename, source_path):
+        """把文件复制到缓存"""
+        entry_dir = self._entry_dir(key)
+        entry_dir.mkdir(parents=True, exist_ok=True)
+        
+        fd, temp_path = tempfile.mkstemp(dir=entry_dir, suffix='.tmp')
+        os.close(fd)
+        try:
+            shutil.copyfile(source_path, temp_path)
+            os.replace(temp_path, entry_dir / filename)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        
+        self._touch(entry_dir)
+        self._evict(keep=key)
+    
+    def _evict(self, keep=None):
+        """总大小超过上限时，按最近访问时间淘汰旧条目"""
+        with self._lock:
+            entries = []
+            total_size = 0
+            for entry_dir in self.cache_dir.iterdir():
+                if not entry_dir.is_dir():
+                    continue
+                try:
+                    size = sum(f.stat().st_size for f in entry_dir.iterdir() if f.is_file())
+                    last_used = entry_dir.stat().st_mtime
+                except OSError:
+                    continue
+                entries.append((last_used, size, entry_dir))
+                total_size += size
+            
+            if total_size <= self.max_size_bytes:
+                return
+            
+            entries.sort(key=lambda entry: entry[0])
+            for _, size, entry_dir in entries:
+                if total_size <= self.max_size_bytes:
+                    break
+                if entry_dir.name == keep:
+                    continue
+                shutil.rmtree(entry_dir, ignore_errors=True)
+                total_size -= size
+    
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            for entry_dir in self.cache_dir.iterdir():
+                if entry_dir.is_dir():
+                    shutil.rmtree(entry_dir, ignore_errors=True)
+    
+    def stats(self):
+        """
+        缓存统计
+        
+        Returns:
+            dict: 条目数与总大小（MB）
+        """
+        entries = [d for d in self.cache_dir.iterdir() if d.is_dir()]
+        total_size = sum(
+            f.stat().st_size for d in entries for f in d.iterdir() if f.is_file()
+        )
+        return {
+            'entries': len(entries),
+            'size_mb': total_size / (1024 * 1024),
+            'max_size_mb': self.max_size_bytes / (1024 * 1024)
+        }
@@ -0,0 +1,273 @@
+"""
+后台任务队列
+把视频分析、可视化等耗时请求放到有界的工作线程池中执行，
+任务状态、进度和结果持久化到磁盘，页面刷新后可以凭任务ID重新获取
+"""
+import json
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+
+def scale_progress(progress, start, end, message=None):
+    """
+    把某个阶段内的进度（0~1）映射到整体进度的 [start, end] 区间
+    
+    Args:
+        progress: 上层的进度回调 progress(fraction, message)，可为None
+        start, end: 该阶段在整体进度中的起止位置
+        message: 阶段内没有给出消息时使用的默认消息
+    
+    Returns:
+        callable: 阶段进度回调 report(fraction, message=None)；progress为None时返回None
+    """
+    if progress is None:
+        return None
+    
+    def report(fraction, stage_message=None):
+        fraction = min(max(fraction, 0.0), 1.0)
+        progress(start + (end - start) * fraction, stage_message or message)
+    
+    return report
+
+
+class JobQueue:
+    """有界并发的后台任务队列"""
+    
+    # 任务状态
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    
+    # 进度变化小于该值且消息不变时不写盘（逐帧上报进度时避免频繁写状态文件）
+    PROGRESS_STEP = 0.01
+    
+    # 清理过期任务目录的最小间隔（秒）
+    CLEANUP_INTERVAL = 3600
+    
+    def __init__(self, jobs_dir, max_workers=2, retention_hours=24):
+        """
+        Args:
+            jobs_dir: 任务状态与结果的存放目录
+            max_workers: 同时执行的任务数上限（其余任务排队等待）
+            retention_hours: 已结束任务的保留时长，超时的任务目录在启动时和之后提交任务时定期清理
+        """
+        self.jobs_dir = Path(jobs_dir)
+        self.jobs_dir.mkdir(parents=True, exist_ok=True)
+        self.max_workers = max_workers
+        self.retention_seconds = retention_hours * 3600
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._last_cleanup = 0.0
+        
+        self._cleanup()
+    
+    def submit(self, job_type, func, *args, **kwargs):
+        """
+        提交任务
+        
+        Args:
+            job_type: 任务类型（如 "analysis"、"visualization"）
+            func: 任务函数，调用方式为 func(progress, *args, **kwargs)，
+                  progress(fraction, message) 用于上报进度（0~1）
+        
+        Returns:
+            str: 任务ID
+        """
+        if time.time() - self._last_cleanup >= self.CLEANUP_INTERVAL:
+            self._cleanup()
+        
+        job_id = uuid.uuid4().hex
+        status = {
+            "job_id": job_id,
+            "job_type": job_type,
+            "status": self.QUEUED,
+            "progress": 0.0,
+            "message": "排队中",
+            "error": None,
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None
+        }
+        (self.jobs_dir / job_id).mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            self._jobs[job_id] = status
+        self._write_status(job_id, status)
+        
+        self._executor.submit(self._run, job_id, func, args, kwargs)
+        return job_id
+    
+    def _run(self, job_id, func, args, kwargs):
+        """在工作线程中执行任务并记录结果"""
+        self._update(job_id, status=self.RUNNING, started_at=time.time(), message="处理中")
+        
+        def progress(fraction, message=None):
+            fraction = float(min(max(fraction, 0.0), 1.0))
+            with self._lock:
+                status = self._jobs[job_id]
+                if abs(fraction - status["progress"]) < self.PROGRESS_STEP \
+                        and message in (None, status["message"]):
+                    return
+            fields = {"progress": fraction}
+            if message is not None:
+                fields["message"] = message
+            self._update(job_id, **fields)
+        
+        try:
+            result = func(progress, *args, **kwargs)
+            self._write_result(job_id, result)
+        except Exception as e:
+            print(f"❌ 后台任务失败 [{job_id}]: {str(e)}")
+            self._update(job_id, status=self.FAILED, error=str(e),
+                         message="失败", finished_at=time.time())
+            return
+        
+        self._update(job_id, status=self.DONE, progress=1.0,
+                     message="完成", finished_at=time.time())
+    
+    def get_status(self, job_id):
+        """
+        查询任务状态
+        
+        Returns:
+            dict: 状态字典（job_id、job_type、status、progress、message、error 及时间戳），
+                  任务不存在时返回None
+        """
+        with self._lock:
+            status = self._jobs.get(job_id)
+            if status is not None:
+                return dict(status)
+        
+        # 不在内存中：已结束的任务，或服务重启前未执行完的任务
+        status = self._read_status(job_id)
+        if status is not None and status["status"] in (self.QUEUED, self.RUNNING):
+            status["status"] = self.FAILED
+            status["error"] = "任务已中断（服务重启）"
+        return status
+    
+    def get_result(self, job_id):
+        """
+        读取已完成任务的结果
+        
+        Returns:
+            任务函数的返回值，任务未完成或结果不存在时返回None
+        """
+        path = self._job_file(job_id, "result.pkl")
+        if path is None:
+            return None
+        try:
+            with open(path, 'rb') as f:
+                return pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            return None
+    
+    def stats(self):
+        """
+        队列统计
+        
+        Returns:
+            dict: max_workers、queued、running（当前进程内）
+        """
+        with self._lock:
+            states = [status["status"] for status in self._jobs.values()]
+        return {
+            "max_workers": self.max_workers,
+            "queued": states.count(self.QUEUED),
+            "running": states.count(self.RUNNING)
+        }
+    
+    def shutdown(self, wait=True):
+        """停止接收新任务"""
+        self._executor.shutdown(wait=wait)
+    
+    def _update(self, job_id, **fields):
+        with self._lock:
+            status = self._jobs[job_id]
+            status.update(fields)
+            self._write_status(job_id, status)
+            # 结束的任务只保留磁盘记录
+            if status["status"] in (self.DONE, self.FAILED):
+                del self._jobs[job_id]
+    
+    def _job_file(self, job_id, filename):
+        """任务目录内的文件路径（任务ID不合法时返回None）"""
+        try:
+            uuid.UUID(hex=job_id)
+        except (TypeError, ValueError):
+            return None
+        return self.jobs_dir / job_id / filename
+    
+    def _write_status(self, job_id, status):
+        self._atomic_write(job_id, "status.json",
+                           json.dumps(status, ensure_ascii=False).encode('utf-8'))
+    
+    def _read_status(self, job_id):
+        path = self._job_file(job_id, "status.json")
+        if path is None:
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+    
+    def _write_result(self, job_id, result):
+        self._atomic_write(job_id, "result.pkl",
+                           pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL))
+    
+    def _atomic_write(self, job_id, filename, data):
+        """先写临时文件再原子替换，避免轮询读到半个文件"""
+        job_dir = self.jobs_dir / job_id
+        fd, temp_path = tempfile.mkstemp(dir=job_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, job_dir / filename)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+    
+    def _cleanup(self):
+        """删除超过保留时长的任务目录（排队中和执行中的任务除外）"""
+        self._last_cleanup = time.time()
+        deadline = self._last_cleanup - self.retention_seconds
+        with self._lock:
+            active = set(self._jobs)
+        for job_dir in self.jobs_dir.iterdir():
+            if job_dir.name in active:
+                continue
+            try:
+                if job_dir.is_dir() and job_dir.stat().st_mtime < deadline:
+                    shutil.rmtree(job_dir, ignore_errors=True)
+            except OSError:
+                continue
+
+
+_default_queue = None
+_default_queue_lock = threading.Lock()
+
+
+def get_job_queue(jobs_dir, max_workers=2, retention_hours=24):
+    """
+    获取进程级共享的任务队列
+    
+    所有会话共用同一个队列，才能限制整机的并发任务数，并在刷新页面后找回任务
+    
+    Args:
+        jobs_dir, max_workers, retention_hours: 仅在第一次创建时生效
+    """
+    global _default_queue
+    with _default_queue_lock:
+        if _default_queue is None:
+            _default_queue = JobQueue(jobs_dir, max_workers=max_workers,
+                                      retention_hours=retention_hours)
+        return _default_queue
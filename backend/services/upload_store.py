@@ -0,0 +1,173 @@
+"""
+上传文件存储
+把上传的视频分块落盘到唯一路径，按内容哈希去重，
+同一段上传视频在分析和可视化之间共用一个文件
+"""
+import hashlib
+import os
+import sys
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+
+# 计算哈希时每次读取的字节数
+CHUNK_SIZE = 1024 * 1024
+
+
+def hash_upload(uploaded_file):
+    """
+    计算上传文件的内容哈希（不改变文件指针位置）
+    
+    Args:
+        uploaded_file: 文件对象（Streamlit UploadedFile 或任意可读文件对象）
+    
+    Returns:
+        str: sha256十六进制摘要
+    """
+    digest = hashlib.sha256()
+    if hasattr(uploaded_file, 'getbuffer'):
+        # BytesIO类对象直接对内存缓冲区做哈希，不产生拷贝
+        digest.update(uploaded_file.getbuffer())
+    else:
+        position = uploaded_file.tell()
+        uploaded_file.seek(0)
+        for chunk in iter(lambda: uploaded_file.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+        uploaded_file.seek(position)
+    return digest.hexdigest()
+
+
+class UploadStore:
+    """按内容哈希去重的上传文件目录，空闲文件超出数量上限后按LRU删除"""
+    
+    def __init__(self, upload_dir, max_files=8):
+        """
+        Args:
+            upload_dir: 存放上传文件的目录
+            max_files: 最多保留的空闲文件数（正在使用的文件不会被删除）
+        """
+        self.upload_dir = Path(upload_dir)
+        self.upload_dir.mkdir(parents=True, exist_ok=True)
+        self.max_files = max_files
+        self._files = {}   # 内容哈希 -> 文件路径（按最近使用排序）
+        self._in_use = {}  # 内容哈希 -> 引用计数
+        self._lock = threading.Lock()
+        
+        # 上次运行遗留的文件无法确认是否完整，直接清理
+        for path in self.upload_dir.iterdir():
+            if path.is_file():
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
+    
+    @contextmanager
+    def open(self, uploaded_file, content_hash=None):
+        """
+        获取上传文件在磁盘上的路径（同一内容只落盘一次）
+        
+        用法:
+            with store.open(uploaded_file) as video_path:
+                service.analyze_video(video_path)
+        
+        Args:
+            uploaded_file: 上传的文件对象
+            content_hash: 已经算好的内容哈希（省去重复计算）
+        """
+        content_hash, path = self.acquire(uploaded_file, content_hash)
+        try:
+            yield path
+        finally:
+            self.release(content_hash)
+    
+    def acquire(self, uploaded_file, content_hash=None):
+        """
+        落盘上传文件并占用它，直到调用 release 之前都不会被删除
+        
+        供后台任务使用：提交时落盘，任务结束后释放，任务期间不在内存里保留上传内容。
+        
+        Args:
+            uploaded_file: 上传的文件对象
+            content_hash: 已经算好的内容哈希（省去重复计算）
+        
+        Returns:
+            tuple: (内容哈希, 文件路径)
+        """
+        content_hash = content_hash or hash_upload(uploaded_file)
+        
+        with self._lock:
+            self._in_use[content_hash] = self._in_use.get(content_hash, 0) + 1
+            path = self._files.pop(content_hash, None)
+            if path is not None:
+                self._files[content_hash] = path
+        
+        try:
+            if path is None or not path.exists():
+                path = self._save(uploaded_file, content_hash)
+        except Exception:
+            self.release(content_hash)
+            raise
+        return content_hash, str(path)
+    
+    def release(self, content_hash):
+        """释放 acquire 占用的文件（空闲文件超出上限时按LRU删除）"""
+        with self._lock:
+            self._in_use[content_hash] -= 1
+            if not self._in_use[content_hash]:
+                del self._in_use[content_hash]
+            self._evict()
+    
+    def _save(self, uploaded_file, content_hash):
+        """写到唯一的临时文件后原子改名，并发保存同一内容也不会互相覆盖"""
+        # 视频处理模块依赖OpenCV，只在真正落盘时导入
+        from backend.core import VideoProcessor
+        
+        ext = os.path.splitext(getattr(uploaded_file, 'name', ''))[1].lower() or '.mp4'
+        path = self.upload_dir / f"{content_hash}{ext}"
+        
+        fd, temp_path = tempfile.mkstemp(dir=self.upload_dir, suffix='.tmp')
+        os.close(fd)
+        try:
+            VideoProcessor.save_uploaded_file(uploaded_file, temp_path)
+            os.replace(temp_path, path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        
+        with self._lock:
+            self._files[content_hash] = path
+        return path
+    
+    def _evict(self):
+        """删除超出数量上限的最久未使用的空闲文件（调用方持有锁）"""
+        idle = [key for key in self._files if key not in self._in_use]
+        for key in idle[:max(0, len(idle) - self.max_files)]:
+            path = self._files.pop(key)
+            try:
+                path.unlink()
+            except OSError:
+                pass
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_upload_store(upload_dir, max_files=8):
+    """
+    获取进程级共享的上传文件存储
+    
+    Args:
+        upload_dir, max_files: 仅在第一次创建时生效
+    """
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = UploadStore(upload_dir, max_files=max_files)
+        return _default_store
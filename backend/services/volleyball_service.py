@@ -4,33 +4,43 @@
 """
 import os
 import sys
+import time
 from pathlib import Path
 
 # 添加项目根目录到路径
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
 
 from backend.core import (
-    PoseDetector, 
     VideoProcessor, 
     VolleyballScorer,
     SequenceAnalyzer,
     TrajectoryVisualizer,
-    VideoGenerator
+    VideoGenerator,
+    FrameSource,
+    get_default_pool,
+    record_inference
 )
 from backend.core.scorer_v2 import VolleyballScorerV2
-from config.settings import TEMPLATES_DIR, DEFAULT_TEMPLATE
+from backend.services.job_queue import scale_progress
+from config.settings import (
+    TEMPLATES_DIR, DEFAULT_TEMPLATE, SEQUENCE_CONFIG, DETECTOR_POOL_CONFIG, FRAME_STORE_CONFIG,
+    RENDER_CONFIG, POSE_INPUT_CONFIG, MEDIAPIPE_CONFIG, MEDIAPIPE_PROFILES, DEFAULT_MEDIAPIPE_PROFILE
+)
 
 
 class VolleyballService:
     """排球动作识别服务类"""
     
-    def __init__(self, use_v2_scorer=True):
+    def __init__(self, use_v2_scorer=True, detector_pool=None):
         """初始化服务
         
         Args:
             use_v2_scorer: 是否使用优化版评分器（默认True）
+            detector_pool: 默认配置档位使用的检测器池（默认使用进程级共享池）
         """
-        self.pose_detector = PoseDetector()
+        # 所有核心模块共用一个检测器池，避免各自加载MediaPipe图
+        self.default_profile = DEFAULT_MEDIAPIPE_PROFILE
+        self.detector_pool = detector_pool or self._profile_pool(self.default_profile)
         self.video_processor = VideoProcessor()
         
         # 使用新的模板路径
@@ -46,17 +56,88 @@ class VolleyballService:
         else:
             self.scorer = VolleyballScorer(template_path=str(template_path))
         
-        self.sequence_analyzer = SequenceAnalyzer()
+        self.sequence_analyzer = SequenceAnalyzer(
+            pose_workers=SEQUENCE_CONFIG["pose_workers"],
+            shard_warmup_frames=SEQUENCE_CONFIG["shard_warmup_frames"],
+            detector_pool=self.detector_pool,
+            sparse_inference=SEQUENCE_CONFIG["sparse_inference"],
+            keyframe_max_gap=SEQUENCE_CONFIG["keyframe_max_gap"],
+            keyframe_motion_step=SEQUENCE_CONFIG["keyframe_motion_step"]
+        )
         self.trajectory_visualizer = TrajectoryVisualizer()
-        self.video_generator = VideoGenerator()
+        self.video_generator = VideoGenerator(
+            detector_pool=self.detector_pool,
+            render_workers=RENDER_CONFIG["render_workers"]
+        )
         self.use_v2_scorer = use_v2_scorer
     
-    def analyze_single_frame(self, image):
+    def resolve_profile(self, profile=None):
+        """
+        检查MediaPipe配置档位名称（None表示默认档位）
+        
+        Returns:
+            str: 档位名称
+        """
+        profile = profile or self.default_profile
+        if profile not in MEDIAPIPE_PROFILES:
+            raise ValueError(f"未知的MediaPipe配置档位: {profile}")
+        return profile
+    
+    def get_detector_pool(self, profile=None):
+        """
+        获取某个MediaPipe配置档位的检测器池
+        
+        Args:
+            profile: 配置档位（"preview" / "standard" / "final"，None表示默认档位）
+        """
+        profile = self.resolve_profile(profile)
+        if profile == self.default_profile:
+            return self.detector_pool
+        return self._profile_pool(profile)
+    
+    @staticmethod
+    def _profile_pool(profile):
+        """进程级共享的检测器池，每个配置档位一个"""
+        return get_default_pool(
+            max_size=DETECTOR_POOL_CONFIG["max_size"],
+            detector_options={
+                **POSE_INPUT_CONFIG,
+                "pose_options": {**MEDIAPIPE_CONFIG, **MEDIAPIPE_PROFILES[profile]}
+            },
+            name=profile
+        )
+    
+    def _inference_report(self, profile, started, stats):
+        """
+        本次请求的推理信息
+        
+        Args:
+            stats: 本次请求的推理统计（record_inference 的结果）
+        
+        Returns:
+            dict: profile、model_complexity、elapsed_ms(本次请求总耗时)、
+                  inference_count(本次请求的推理次数，复用帧存储中的关键点时为0)、
+                  avg_inference_ms(本次请求的平均单帧推理耗时，没有推理时为0)、
+                  cached(是否命中API层的分析缓存，这里始终为False)
+        """
+        pose_options = self.get_detector_pool(profile).detector_options.get("pose_options", {})
+        count = stats["inference_count"]
+        return {
+            "profile": profile,
+            "model_complexity": pose_options.get("model_complexity"),
+            "elapsed_ms": (time.perf_counter() - started) * 1000,
+            "avg_inference_ms": stats["inference_seconds"] / count * 1000 if count else 0.0,
+            "inference_count": count,
+            "cached": False
+        }
+    
+    def analyze_single_frame(self, image, profile=None):
         """
         分析单帧图像
         
         Args:
             image: 图像数据（numpy array）
+            profile: MediaPipe配置档位（None表示默认档位）
             
         Returns:
             dict: 分析结果，包含：
@@ -66,7 +147,8 @@ class VolleyballService:
         """
         try:
             # 检测姿态（返回tuple: landmarks, annotated_image）
-            landmarks, pose_image = self.pose_detector.detect_pose(image)
+            with self.get_detector_pool(profile).detector() as detector:
+                landmarks, pose_image = detector.detect_pose(image)
             
             if landmarks is None:
                 return {
@@ -95,7 +177,7 @@ class VolleyballService:
                 "pose_image": image
             }
     
-    def analyze_video(self, video_path, mode="single"):
+    def analyze_video(self, video_path, mode="single", profile=None, content_hash=None, progress=None):
         """
         分析视频
         
@@ -104,31 +186,56 @@ class VolleyballService:
             mode: 分析模式
                 - "single": 单帧分析（提取关键帧）
                 - "sequence": 序列分析（连续帧）
+            profile: MediaPipe配置档位
+                - "preview": 轻量模型，快速预览
+                - "standard": 默认
+                - "final": 高精度模型，用于最终报告
+                - None: 默认档位
+            content_hash: 视频内容哈希（给出时同一内容的视频共用帧存储）
+            progress: 进度回调 progress(fraction, message)（0~1，按解码、姿态检测、评分各阶段上报）
                 
         Returns:
-            dict: 分析结果
+            dict: 分析结果，inference 字段给出所用档位和推理耗时
         """
-        if mode == "single":
-            return self._analyze_video_single_frame(video_path)
-        elif mode == "sequence":
-            return self._analyze_video_sequence(video_path)
-        else:
+        try:
+            profile = self.resolve_profile(profile)
+        except ValueError as e:
+            return {
+                "success": False,
+                "error": str(e)
+            }
+        
+        if mode not in ("single", "sequence"):
             return {
                 "success": False,
                 "error": f"未知的分析模式: {mode}"
             }
+        
+        started = time.perf_counter()
+        with record_inference() as stats:
+            if mode == "single":
+                result = self._analyze_video_single_frame(video_path, profile, progress)
+            else:
+                result = self._analyze_video_sequence(video_path, profile, content_hash, progress)
+        
+        result["inference"] = self._inference_report(profile, started, stats)
+        return result
     
-    def _analyze_video_single_frame(self, video_path):
+    def _analyze_video_single_frame(self, video_path, profile=None, progress=None):
         """单帧模式分析视频"""
         try:
             # 提取关键帧
+            if progress is not None:
+                progress(0.0, "🎞️ 正在提取关键帧")
             key_frame = self.video_processor.extract_key_frame(
                 video_path, 
                 method='motion'
             )
             
             # 分析关键帧
-            result = self.analyze_single_frame(key_frame)
+            if progress is not None:
+                progress(0.6, "🔍 正在检测姿态")
+            result = self.analyze_single_frame(key_frame, profile=profile)
             result["video_info"] = self.video_processor.get_video_info(video_path)
             result["analysis_mode"] = "single_frame"
             
@@ -140,37 +247,47 @@ class VolleyballService:
                 "error": f"视频分析失败: {str(e)}"
             }
     
-    def _analyze_video_sequence(self, video_path):
+    def _analyze_video_sequence(self, video_path, profile=None, content_hash=None, progress=None):
         """序列模式分析视频"""
         try:
+            # 视频只解码一次；这里只检测采样帧，之后生成可视化时再补齐其余帧
+            frame_source = self.get_frame_source(
+                video_path, profile=profile, content_hash=content_hash,
+                progress=scale_progress(progress, 0.0, 0.4, "📦 正在解码视频")
+            )
+            
             # 使用序列分析器
-            analysis_result = self.sequence_analyzer.analyze_sequence(video_path)
+            analysis_result = self.sequence_analyzer.analyze_sequence(
+                frame_source, detector_pool=self.get_detector_pool(profile),
+                progress=scale_progress(progress, 0.4, 0.85, "🔍 正在检测姿态")
+            )
+            if progress is not None:
+                progress(0.85, "📊 正在评分")
             
             if not analysis_result.get("success", False):
                 return analysis_result
             
-            # 获取关键点序列
+            # 获取关键点序列（只含检测到人体的帧），valid_indices 记录它们在分析帧中的位置
             frames_data = analysis_result.get("frames_data", [])
-            landmarks_sequence = [frame.get("landmarks") for frame in frames_data if frame.get("landmarks")]
+            valid_indices = [idx for idx, frame in enumerate(frames_data) if frame.get("landmarks")]
+            landmarks_sequence = [frames_data[idx]["landmarks"] for idx in valid_indices]
             
             # 如果使用V2评分器，进行序列评分
             if self.use_v2_scorer and len(landmarks_sequence) > 0:
                 # 使用V2的序列评分功能
                 sequence_score_result = self.scorer.score_sequence(landmarks_sequence)
                 
-                # 获取最佳帧的分项得分
-                best_frame_idx = sequence_score_result.get('best_frame_idx', 0)
-                if best_frame_idx < len(landmarks_sequence):
-                    best_landmarks = landmarks_sequence[best_frame_idx]
-                    if best_landmarks:
-                        # 获取最佳帧的详细分项得分
-                        best_frame_detail = self.scorer.score_pose(best_landmarks)
-                        arm_score = best_frame_detail.get('arm_score', 0)
-                        body_score = best_frame_detail.get('body_score', 0)
-                        position_score = best_frame_detail.get('position_score', 0)
-                        stability_score = best_frame_detail.get('stability_score', 0)
-                    else:
-                        arm_score = body_score = position_score = stability_score = 0
+                # score_sequence 的最佳帧索引针对有效帧，换算回分析帧索引
+                best_frame_idx = valid_indices[sequence_score_result.get('best_frame_idx', 0)]
+                analysis_result["best_frame_idx"] = best_frame_idx
+                
+                # 获取最佳帧的分项得分（score_sequence 已经算好，无需再次评分）
+                best_frame_detail = sequence_score_result.get('best_frame_detail')
+                if best_frame_detail:
+                    arm_score = best_frame_detail.get('arm_score', 0)
+                    body_score = best_frame_detail.get('body_score', 0)
+                    position_score = best_frame_detail.get('position_score', 0)
+                    stability_score = best_frame_detail.get('stability_score', 0)
                 else:
                     arm_score = body_score = position_score = stability_score = 0
                 
@@ -200,10 +317,14 @@ class VolleyballService:
                         score_result = self.scorer.score_pose(landmarks)
                         analysis_result["score"] = score_result
             
-            # 获取姿态图像
-            annotated_frames = analysis_result.get("annotated_frames", [])
-            if annotated_frames and best_frame_idx < len(annotated_frames):
-                analysis_result["pose_image"] = annotated_frames[best_frame_idx]
+            # 获取姿态图像：评分完成后只给需要展示的那一帧画骨架
+            frame_indices = analysis_result.get("frame_indices", [])
+            if best_frame_idx < len(frame_indices):
+                source_idx = frame_indices[best_frame_idx]
+                analysis_result["pose_image"] = self.video_generator.annotate_frame(
+                    frame_source.frame(source_idx),
+                    frame_source.landmarks[source_idx]
+                )
             
             # 生成轨迹可视化
             trajectories = analysis_result.get("trajectories", {})
@@ -232,7 +353,8 @@ class VolleyballService:
                 "error": f"序列分析失败: {str(e)}"
             }
     
-    def generate_visualization_video(self, video_path, output_path, vis_type="overlay"):
+    def generate_visualization_video(self, video_path, output_path, vis_type="overlay", content_hash=None,
+                                     progress=None):
         """
         生成可视化视频
         
@@ -244,15 +366,22 @@ class VolleyballService:
                 - "skeleton": 纯骨架
                 - "comparison": 对比视频
                 - "trajectory": 轨迹追踪
+            content_hash: 视频内容哈希（给出时同一内容的视频共用帧存储）
+            progress: 进度回调 progress(fraction, message)（0~1）
                 
         Returns:
             dict: 生成结果
         """
         try:
-            self.video_generator.generate_video(
-                video_path=video_path,
+            # 复用序列分析时已解码的帧和关键点（没有则解码一次并保存）
+            frame_source = self.get_visualization_source(
+                video_path, content_hash, progress=scale_progress(progress, 0.0, 0.5)
+            )
+            self.video_generator.generate_video_from_source(
+                frame_source,
                 output_path=output_path,
-                video_type=vis_type
+                video_type=vis_type,
+                progress=scale_progress(progress, 0.5, 1.0, "🎬 正在渲染视频")
             )
             
             return {
@@ -267,6 +396,113 @@ class VolleyballService:
                 "error": f"视频生成失败: {str(e)}"
             }
     
+    def generate_visualization_videos(self, video_path, output_paths, content_hash=None, progress=None):
+        """
+        一次遍历生成多种可视化视频（解码和姿态检测只做一次）
+        
+        Args:
+            video_path: 原始视频路径
+            output_paths: {可视化类型: 输出视频路径}
+            content_hash: 视频内容哈希（给出时同一内容的视频共用帧存储）
+            progress: 进度回调 progress(fraction, message)（0~1）
+                
+        Returns:
+            dict: 生成结果，成功时 outputs 为 {可视化类型: 输出视频路径}
+        """
+        try:
+            frame_source = self.get_visualization_source(
+                video_path, content_hash, progress=scale_progress(progress, 0.0, 0.5)
+            )
+            outputs = self.video_generator.generate_videos_from_source(
+                frame_source, output_paths,
+                progress=scale_progress(progress, 0.5, 1.0, "🎬 正在渲染视频")
+            )
+            
+            return {
+                "success": True,
+                "outputs": outputs
+            }
+            
+        except Exception as e:
+            return {
+                "success": False,
+                "error": f"视频生成失败: {str(e)}"
+            }
+    
+    def get_frame_source(self, video_path, profile=None, content_hash=None, progress=None):
+        """
+        获取视频的帧存储（解码一次，序列分析和各类可视化共用）
+        
+        关键点按需检测，见 FrameSource.ensure_landmarks。
+        
+        Args:
+            video_path: 视频文件路径
+            profile: MediaPipe配置档位（不同档位的关键点分别存储）
+            content_hash: 视频内容哈希（None时按文件路径、大小和修改时间识别视频）
+            progress: 解码进度回调 progress(fraction)（0~1）
+            
+        Returns:
+            FrameSource: 帧与关键点
+        """
+        keyframe_options = None
+        if SEQUENCE_CONFIG["sparse_inference"]:
+            keyframe_options = {
+                "max_gap": SEQUENCE_CONFIG["keyframe_max_gap"],
+                "motion_step": SEQUENCE_CONFIG["keyframe_motion_step"]
+            }
+        
+        return FrameSource.load_or_build(
+            video_path,
+            FRAME_STORE_CONFIG["store_dir"],
+            max_frames=FRAME_STORE_CONFIG["max_frames"],
+            max_long_edge=FRAME_STORE_CONFIG["max_long_edge"],
+            max_stores=FRAME_STORE_CONFIG["max_stores"],
+            jpeg_quality=FRAME_STORE_CONFIG["jpeg_quality"],
+            content_hash=content_hash,
+            landmarks_key={
+                "detector": self.get_detector_pool(profile).detector_options,
+                "keyframes": keyframe_options
+            },
+            progress=progress
+        )
+    
+    def get_visualization_source(self, video_path, content_hash=None, profile=None, progress=None):
+        """
+        获取关键点齐全的帧存储（可视化需要每一帧的关键点，缺少的帧在这里补齐）
+        
+        Args:
+            progress: 进度回调 progress(fraction, message)（0~1，解码和补齐关键点两个阶段）
+        
+        Returns:
+            FrameSource: 帧与关键点
+        """
+        frame_source = self.get_frame_source(
+            video_path, profile=profile, content_hash=content_hash,
+            progress=scale_progress(progress, 0.0, 0.4, "📦 正在解码视频")
+        )
+        detector_pool = self.get_detector_pool(profile)
+        detected = frame_source.ensure_landmarks(
+            range(len(frame_source)),
+            lambda frames: self.sequence_analyzer.detect_sequence(frames, detector_pool),
+            scale_progress(progress, 0.4, 1.0, "🔍 正在检测姿态"),
+            min_chunk_frames=self.sequence_analyzer.min_parallel_frames
+        )
+        if detected:
+            print(f"🔍 补齐可视化所需的关键点: {detected}/{len(frame_source)} 帧")
+        return frame_source
+    
+    def get_detector_stats(self, profile=None):
+        """
+        获取检测器池指标（已加载的MediaPipe图数量、平均推理耗时等）
+        
+        Args:
+            profile: MediaPipe配置档位（None表示默认档位）
+        
+        Returns:
+            dict: 检测器池统计
+        """
+        return self.get_detector_pool(profile).stats()
+    
     def get_feedback_messages(self, score_result):
         """
         根据评分结果生成反馈消息
@@ -0,0 +1,80 @@
+"""
+导入耗时基准测试：统计页面冷启动时各后端模块的导入时间，以及哪些重量级依赖被加载
+
+每次导入都在新的Python进程中进行，结果不受已导入模块的影响：
+    python benchmark_import.py
+    python benchmark_import.py --repeat 10 backend.api backend.core.pose_detector
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# 冷启动时希望推迟加载的依赖
+HEAVY_MODULES = ["mediapipe", "cv2", "matplotlib", "PIL"]
+
+# 默认测量的导入语句：app.py 启动时的路径，以及首次分析时才需要的完整服务
+DEFAULT_TARGETS = [
+    "backend.api",
+    "backend.api:VolleyballAPI",
+    "backend.services.volleyball_service",
+]
+
+PROBE = """
+import json, sys, time, importlib
+sys.path.insert(0, {root!r})
+module, _, attr = {target!r}.partition(':')
+start = time.perf_counter()
+value = importlib.import_module(module)
+if attr:
+    getattr(value, attr)
+elapsed = time.perf_counter() - start
+print(json.dumps({{
+    'seconds': elapsed,
+    'loaded': [name for name in {heavy!r} if name in sys.modules]
+}}))
+"""
+
+
+def measure(target):
+    """在新进程中导入一次，返回 (耗时秒数, 已加载的重量级依赖)"""
+    code = PROBE.format(root=ROOT, target=target, heavy=HEAVY_MODULES)
+    output = subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True, text=True, check=True, cwd=ROOT
+    ).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    return result["seconds"], result["loaded"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="后端模块导入耗时基准测试")
+    parser.add_argument("targets", nargs="*", default=DEFAULT_TARGETS,
+                        help="要导入的模块（module 或 module:属性）")
+    parser.add_argument("--repeat", type=int, default=5, help="每个模块重复次数（取中位数）")
+    args = parser.parse_args()
+    
+    print("=" * 70)
+    print(f"[BENCH] 导入耗时基准（每项 {args.repeat} 次，新进程，取中位数）")
+    print("=" * 70)
+    
+    for target in args.targets:
+        timings = []
+        loaded = []
+        for _ in range(args.repeat):
+            seconds, loaded = measure(target)
+            timings.append(seconds)
+        
+        heavy = ", ".join(loaded) if loaded else "无"
+        print(f"[RESULT] {target:<40s} {statistics.median(timings) * 1000:8.1f} ms  重量级依赖: {heavy}")
+    
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+渲染基准测试：对比不同渲染线程数下生成四种可视化视频的耗时
+
+用合成的帧和关键点，不依赖姿态检测和测试视频：
+    python benchmark_render.py
+    python benchmark_render.py --frames 300 --width 1280 --height 720 --workers 0 2 4 8
+"""
+
+import argparse
+import hashlib
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from backend.core.video_generator import VideoGenerator
+from backend.core.landmarks import LandmarkSequence, JOINT_NAMES
+
+
+def make_frames(count, width, height):
+    """合成带渐变和噪声的帧（纯色帧编码过快，不具代表性）"""
+    rng = np.random.default_rng(0)
+    base = np.zeros((height, width, 3), dtype=np.uint8)
+    base[..., 0] = np.linspace(0, 255, width, dtype=np.uint8)[None, :]
+    base[..., 1] = np.linspace(0, 255, height, dtype=np.uint8)[:, None]
+    frames = []
+    for idx in range(count):
+        frame = np.roll(base, idx * 4, axis=1)
+        noise = rng.integers(0, 24, size=frame.shape, dtype=np.uint8)
+        frames.append(frame + noise)
+    return frames
+
+
+def make_landmarks(count):
+    """合成缓慢摆动的关键点序列"""
+    rng = np.random.default_rng(1)
+    anchor = rng.uniform(0.3, 0.7, size=(len(JOINT_NAMES), 2))
+    t = np.arange(count)[:, None]
+    data = np.zeros((count, len(JOINT_NAMES), 4), dtype=np.float32)
+    data[..., 0] = anchor[:, 0] + 0.1 * np.sin(t / 10 + np.arange(len(JOINT_NAMES)))
+    data[..., 1] = anchor[:, 1] + 0.1 * np.cos(t / 12 + np.arange(len(JOINT_NAMES)))
+    data[..., 3] = 0.9
+    return LandmarkSequence(data, np.ones(count, dtype=bool))
+
+
+def file_digest(path):
+    with open(path, 'rb') as f:
+        return hashlib.md5(f.read()).hexdigest()
+
+
+def run_once(workers, frames, landmarks, output_dir, fps):
+    generator = VideoGenerator(render_workers=workers)
+    outputs = {
+        video_type: os.path.join(output_dir, f"{video_type}_{workers}.mp4")
+        for video_type in VideoGenerator.VIDEO_TYPES
+    }
+    pose_frames = ((frame.copy(), landmarks[idx]) for idx, frame in enumerate(frames))
+    
+    start = time.perf_counter()
+    results = generator._render_outputs(pose_frames, outputs, len(frames), fps)
+    elapsed = time.perf_counter() - start
+    return elapsed, {video_type: file_digest(path) for video_type, path in results.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="可视化渲染线程数基准测试")
+    parser.add_argument("--frames", type=int, default=150)
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--fps", type=float, default=30)
+    parser.add_argument("--repeat", type=int, default=2, help="每个线程数重复次数（取最快一次）")
+    parser.add_argument("--workers", type=int, nargs="+", default=[0, 1, 2, 4, 8])
+    args = parser.parse_args()
+    
+    print("=" * 70)
+    print(f"[BENCH] 渲染基准: {args.frames} 帧, {args.width}x{args.height}, "
+          f"四种视频, CPU {os.cpu_count()} 核")
+    print("=" * 70)
+    
+    frames = make_frames(args.frames, args.width, args.height)
+    landmarks = make_landmarks(args.frames)
+    
+    baseline_time = None
+    baseline_digests = None
+    
+    with tempfile.TemporaryDirectory() as output_dir:
+        for workers in args.workers:
+            timings = []
+            for _ in range(args.repeat):
+                elapsed, digests = run_once(workers, frames, landmarks, output_dir, args.fps)
+                timings.append(elapsed)
+            best = min(timings)
+            
+            if baseline_time is None:
+                baseline_time, baseline_digests = best, digests
+            identical = "一致" if digests == baseline_digests else "不一致!"
+            
+            print(f"[RESULT] workers={workers:<2d}  {best:6.2f}s  "
+                  f"{args.frames / best:6.1f} 帧/秒  加速比 {baseline_time / best:4.2f}x  输出{identical}")
+    
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    main()
@@ -28,6 +28,32 @@ MEDIAPIPE_CONFIG = {
     "min_tracking_confidence": 0.5
 }
 
+# MediaPipe 配置档位（在 MEDIAPIPE_CONFIG 基础上覆盖的参数）
+# model_complexity: 0=lite / 1=full / 2=heavy；static_image_mode=True 关闭跨帧跟踪；
+# smooth_landmarks 控制跨帧平滑
+MEDIAPIPE_PROFILES = {
+    "preview": {                # 快速预览：轻量模型
+        "model_complexity": 0
+    },
+    "standard": {},             # 与 MEDIAPIPE_CONFIG 相同
+    "final": {                  # 最终报告：高精度模型
+        "model_complexity": 2
+    }
+}
+DEFAULT_MEDIAPIPE_PROFILE = "standard"
+
+# 检测器池配置（所有核心模块共享预热好的MediaPipe图）
+DETECTOR_POOL_CONFIG = {
+    "max_size": 4               # 进程内最多同时加载的检测器数量，None表示不限制
+}
+
+# 姿态检测输入配置（送入MediaPipe前的预处理）
+POSE_INPUT_CONFIG = {
+    "max_long_edge": 960,       # 输入长边上限（像素），手机拍摄的1080p/4K视频先缩小再检测；None表示不缩放
+    "roi_crop": False,          # 检测到人体后只把其周围区域送入MediaPipe（跟丢时恢复整帧）
+    "roi_padding": 0.3          # 裁剪区域相对人体包围框长边的外扩比例
+}
+
 # 视频处理配置
 VIDEO_CONFIG = {
     "max_file_size_mb": 50,
@@ -36,6 +62,54 @@ VIDEO_CONFIG = {
     "max_duration_seconds": 30
 }
 
+# 序列分析配置
+SEQUENCE_CONFIG = {
+    "pose_workers": 0,          # 姿态检测进程数（0/1 = 串行，>1 开启多进程并行）
+    "shard_warmup_frames": 2,   # 每个分片开头用于重建跟踪状态的前序帧数
+    "sparse_inference": False,  # 只在按帧差挑选的关键帧上做姿态检测，其余帧插值（长视频吞吐量随动作多少而非时长变化）
+    "keyframe_max_gap": 6,      # 相邻关键帧的最大间隔（帧）
+    "keyframe_motion_step": 8.0 # 相邻关键帧之间允许累计的帧差（灰度平均绝对差，0~255）
+}
+
+# 可视化渲染配置
+RENDER_CONFIG = {
+    "render_workers": 0         # 渲染线程数（0/1 = 串行，>1 在线程池中并行绘制，按顺序写入编码器）
+}
+
+# 帧存储配置（视频解码一次，分析和各类可视化共用帧与关键点）
+FRAME_STORE_CONFIG = {
+    "store_dir": OUTPUT_DIR / "frames",
+    "max_frames": 300,          # 每个视频最多存储的帧数，超出时按间隔采样
+    "max_long_edge": 1280,      # 存储帧的长边上限（像素），None表示保持原分辨率
+    "jpeg_quality": 90,         # 存储帧的JPEG质量（帧编码后存储，体积远小于原始像素）
+    "max_stores": 4             # 最多保留的视频帧存储数，超出后删除最久未使用的
+}
+
+# 分析结果缓存配置
+CACHE_CONFIG = {
+    "enabled": True,
+    "cache_dir": OUTPUT_DIR / "cache",
+    "max_size_mb": 500          # 缓存总大小上限，超出后按LRU淘汰
+}
+
+# 上传文件存储配置（同一视频的分析和可视化共用一个落盘文件）
+UPLOAD_CONFIG = {
+    "upload_dir": OUTPUT_DIR / "uploads",
+    "max_files": 8              # 最多保留的空闲上传文件数，超出后按LRU删除
+}
+
+# 后台任务队列配置
+JOB_CONFIG = {
+    "max_workers": 2,           # 整机同时执行的分析/可视化任务数，其余任务排队
+    "jobs_dir": OUTPUT_DIR / "jobs",
+    "retention_hours": 24       # 已结束任务的状态和结果保留时长
+}
+
+# 推理并发配置（所有会话共用一个API实例）
+INFERENCE_CONFIG = {
+    "max_concurrent": 2         # 同时进行姿态检测/视频生成的调用数上限，包括后台任务和同步调用
+}
+
 # 评分配置
 SCORING_CONFIG = {
     "weights": {
@@ -82,7 +156,8 @@ API_CONFIG = {
     "host": "localhost",
     "port": 8000,
     "debug": True,
-    "cors_origins": ["*"]
+    "cors_origins": ["*"],
+    "workers": 2                # HTTP服务的工作进程数，每个进程各持有一个预热好的检测器
 }
 
 # Streamlit 配置
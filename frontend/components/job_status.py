@@ -0,0 +1,79 @@
+"""
+后台任务状态组件
+任务ID同时保存在session state和URL参数中，刷新页面后仍能找回正在执行的任务
+"""
+import time
+
+import streamlit as st
+
+
+# 任务进行中时的页面刷新间隔（秒）
+POLL_INTERVAL_SECONDS = 1.0
+
+
+def _get_query_param(key):
+    if hasattr(st, "query_params"):
+        return st.query_params.get(key)
+    values = st.experimental_get_query_params().get(key)
+    return values[0] if values else None
+
+
+def _set_query_param(key, value):
+    if hasattr(st, "query_params"):
+        st.query_params[key] = value
+    else:
+        params = st.experimental_get_query_params()
+        params[key] = value
+        st.experimental_set_query_params(**params)
+
+
+def track_job(job_key, job_id):
+    """
+    记录新提交的任务
+    
+    Args:
+        job_key: 任务ID在session state / URL参数中的键名
+        job_id: 任务ID
+    """
+    st.session_state[job_key] = job_id
+    _set_query_param(job_key, job_id)
+
+
+def poll_job(api, job_key):
+    """
+    跟踪后台任务：进行中时显示进度条
+    
+    Args:
+        api: VolleyballAPI 实例
+        job_key: 任务ID的键名
+    
+    Returns:
+        tuple: (job_id, status)，任务已结束时返回其状态字典；
+               没有任务或任务仍在进行时返回 (None, None)
+    """
+    job_id = st.session_state.get(job_key) or _get_query_param(job_key)
+    if not job_id:
+        return None, None
+    
+    status = api.get_job(job_id)
+    if status is None:
+        return None, None
+    st.session_state[job_key] = job_id
+    
+    if status["status"] in ("queued", "running"):
+        if status["status"] == "queued":
+            text = "⏳ 排队中，前面还有其他任务..."
+        else:
+            text = status.get("message") or "处理中..."
+        st.progress(status["progress"], text=text)
+        st.session_state._jobs_pending = True
+        return None, None
+    
+    return job_id, status
+
+
+def rerun_while_jobs_running():
+    """页面渲染完成后，如果还有进行中的任务，稍等片刻再刷新一次"""
+    if st.session_state.pop('_jobs_pending', False):
+        time.sleep(POLL_INTERVAL_SECONDS)
+        st.rerun()
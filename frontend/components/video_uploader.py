@@ -82,6 +82,36 @@ def render_analysis_mode_selector():
     return mode
 
 
+PROFILE_LABELS = {
+    "preview": "⚡ 快速预览",
+    "standard": "⚖️ 标准",
+    "final": "📋 完整报告",
+}
+
+
+def render_profile_selector():
+    """
+    渲染检测精度（MediaPipe配置档位）选择器
+    
+    Returns:
+        str: 选择的配置档位
+    """
+    profile = st.radio(
+        "检测精度",
+        options=list(PROFILE_LABELS),
+        index=1,
+        format_func=lambda x: PROFILE_LABELS[x],
+        horizontal=True
+    )
+    
+    if profile == "preview":
+        st.caption("轻量模型，速度最快，适合先快速看一遍动作")
+    elif profile == "final":
+        st.caption("高精度模型，耗时较长，适合生成最终报告")
+    
+    return profile
+
+
 def render_visualization_selector():
     """
     渲染可视化类型选择器
@@ -93,12 +123,13 @@ def render_visualization_selector():
     
     vis_type = st.selectbox(
         "选择可视化类型",
-        options=["overlay", "skeleton", "comparison", "trajectory"],
+        options=["overlay", "skeleton", "comparison", "trajectory", "all"],
         format_func=lambda x: {
             "overlay": "🎥 骨架叠加（推荐）",
             "skeleton": "🦴 纯骨架动画",
             "comparison": "📊 左右对比",
-            "trajectory": "📈 轨迹追踪"
+            "trajectory": "📈 轨迹追踪",
+            "all": "🧩 全部四种"
         }[x],
         label_visibility="collapsed"
     )
@@ -107,7 +138,8 @@ def render_visualization_selector():
         "overlay": "在原视频上叠加姿态骨架，最直观",
         "skeleton": "白色背景上的抽象骨架，最清晰",
         "comparison": "原视频与骨架并排对比，最专业",
-        "trajectory": "实时绘制关键点运动路径，最动感"
+        "trajectory": "实时绘制关键点运动路径，最动感",
+        "all": "一次处理同时生成以上四种视频，比逐个生成快得多"
     }
     
     st.caption(descriptions[vis_type])
@@ -0,0 +1,24 @@
+"""测试公共配置：把项目根目录加入导入路径，提供测试视频"""
+import sys
+from pathlib import Path
+
+import cv2
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+@pytest.fixture
+def make_video(tmp_path):
+    """写一段每帧亮度不同的小视频，返回路径"""
+    def write(total_frames, fps=30, size=(32, 24)):
+        path = tmp_path / f"clip_{total_frames}.mp4"
+        writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*'mp4v'), fps, size)
+        if not writer.isOpened():
+            pytest.skip("OpenCV 不支持写入 mp4v 视频")
+        for idx in range(total_frames):
+            writer.write(np.full((size[1], size[0], 3), idx % 256, dtype=np.uint8))
+        writer.release()
+        return path
+    return write
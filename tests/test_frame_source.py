@@ -0,0 +1,59 @@
+"""
+帧存储测试
+"""
+import numpy as np
+
+from backend.core.frame_source import FrameSource
+from backend.core.landmarks import LandmarkSequence
+
+
+def test_store_spans_whole_clip_when_frames_exceed_limit(tmp_path, make_video):
+    """max_frames < 总帧数 < 2 * max_frames 时，存储的帧仍覆盖到视频末尾"""
+    total_frames = 450
+    video_path = make_video(total_frames)
+    
+    source = FrameSource.load_or_build(video_path, tmp_path / "store", max_frames=300)
+    
+    assert source.total_frames == total_frames
+    assert len(source) <= 300
+    last_frame = (len(source) - 1) * source.frame_interval
+    assert last_frame >= total_frames - source.frame_interval
+    
+    # 序列分析的采样帧同样要覆盖到视频末尾
+    last_sample = source.sample_indices(2)[-1] * source.frame_interval
+    assert last_sample >= total_frames - 30
+
+
+def _recording_detect(calls):
+    """记录每次收到的帧号，返回全部检测成功的结果"""
+    def detect(frames):
+        calls.append([int(frame[0, 0, 0]) for frame in frames])
+        sequence = LandmarkSequence.empty(len(frames))
+        sequence.present[:] = True
+        return sequence, np.ones(len(frames), dtype=bool)
+    return detect
+
+
+def test_missing_landmarks_are_detected_in_contiguous_chunks(tmp_path, make_video):
+    """补齐关键点时每批是连续的一段，且不少于要求的最少帧数"""
+    video_path = make_video(120)
+    source = FrameSource.load_or_build(video_path, tmp_path / "store", max_frames=300)
+    # 帧内容换成帧号，便于检查每批收到的是哪些帧
+    source.frame = lambda idx: np.full((1, 1, 1), idx, dtype=np.int64)
+    
+    # 先检测采样帧，再补齐全部帧
+    calls = []
+    samples = source.sample_indices(2)
+    assert source.ensure_landmarks(samples, _recording_detect(calls)) == len(samples)
+    assert calls == [samples]
+    
+    calls.clear()
+    missing = len(source) - len(samples)
+    assert source.ensure_landmarks(range(len(source)), _recording_detect(calls),
+                                   min_chunk_frames=48) == missing
+    assert source.detected.all()
+    for frames in calls:
+        assert len(frames) >= 48
+        assert frames == list(range(frames[0], frames[0] + len(frames)))
+    # 已检测的采样帧夹在待检测帧中间时一起送检，保持跟踪连续；第0帧是采样帧，不再送检
+    assert sum(calls, []) == list(range(1, len(source)))
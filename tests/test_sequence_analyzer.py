@@ -0,0 +1,37 @@
+"""
+序列分析测试
+"""
+import pytest
+
+pytest.importorskip("mediapipe")
+
+from backend.core.frame_source import FrameSource
+from backend.core.sequence_analyzer import SequenceAnalyzer
+
+
+@pytest.mark.parametrize("workers", [5, 6, 8])
+def test_frame_store_detection_uses_process_pool(tmp_path, monkeypatch, make_video, workers):
+    """补齐帧存储关键点时，工作进程数超过4也走并行检测"""
+    video_path = make_video(150)
+    source = FrameSource.load_or_build(video_path, tmp_path / "store", max_frames=300)
+    analyzer = SequenceAnalyzer(pose_workers=workers)
+    
+    parallel_calls = []
+    
+    def fake_parallel(frames, workers, annotate=False, detector_pool=None):
+        parallel_calls.append(len(frames))
+        return [(None, None) for _ in frames]
+    
+    def fail_serial():
+        raise AssertionError("不应回退到串行检测")
+    
+    monkeypatch.setattr(analyzer, "_detect_frames_parallel", fake_parallel)
+    monkeypatch.setattr(analyzer.detector_pool, "detector", fail_serial)
+    
+    source.ensure_landmarks(
+        range(len(source)), analyzer.detect_sequence,
+        min_chunk_frames=analyzer.min_parallel_frames
+    )
+    
+    assert sum(parallel_calls) == len(source)
+    assert all(count >= workers * SequenceAnalyzer.MIN_FRAMES_PER_WORKER for count in parallel_calls)